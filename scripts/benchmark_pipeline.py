@@ -0,0 +1,483 @@
+# scripts/benchmark_pipeline.py
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from compare_taxonomies import EdgeIndex, SOURCE_ID_COLUMNS, compare_taxonomies, load_lineage_edges
+from download_neonhq_taxonomy import NEONHQ_VERBOSE_FIELDNAMES, create_session, download_taxonomy
+from filter_biorepo_accepted import load_taxstatus, select_biorepo_accepted
+from filter_neonhq_accepted import select_neonhq_accepted
+from generate_biorepo_taxonomy import (build_lineage, generate_second_taxonomy, load_csv_to_dict,
+                                       load_reference_tables)
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), 'data')
+
+# Approximate number of taxa in the NEON PLANT checklist; synthetic scale 1 matches it
+PLANT_CHECKLIST_SIZE = 30000
+SYNTHETIC_GROUP = 'SYNTHETIC'
+
+# Synthetic tree shape: species per genus, genera per family, and so on up to the kingdom
+SYNTHETIC_BRANCHING = [('genus', 8), ('family', 10), ('order', 10), ('class', 10), ('phylum', 5)]
+SYNTHETIC_RANK_IDS = {'kingdom': 10, 'phylum': 30, 'class': 60, 'order': 100, 'family': 140,
+                      'genus': 180, 'species': 220}
+
+# --- Synthetic data ---
+
+def _synthetic_ancestors(species_number):
+    """Returns [(rank, name)] of a synthetic species' ancestors, from the kingdom down."""
+    ancestors = []
+    number = species_number
+    for rank, branching in SYNTHETIC_BRANCHING:
+        number //= branching
+        ancestors.append((rank, f"{rank.capitalize()}{number}"))
+    ancestors.append(('kingdom', 'Plantae'))
+    return ancestors[::-1]
+
+def generate_synthetic_dataset(output_dir, scale=1.0, seed=0, taxon_units_path=None):
+    """
+    Writes a synthetic NEON HQ checklist and matching Biorepo reference tables with
+    scale * PLANT_CHECKLIST_SIZE species to `output_dir`, and returns the dataset paths.
+    About 5% of the NEON taxa are synonyms, 2% are 'SPP' forms with a matching 'SP' form,
+    2% are mapped to an outdated Biorepo name whose accepted taxon has no NEON record of its
+    own, and 3% of the Biorepo lineages disagree with NEON HQ, so every stage has work to do.
+    """
+    rng = random.Random(seed)
+    species_count = max(1, int(PLANT_CHECKLIST_SIZE * scale))
+    os.makedirs(output_dir, exist_ok=True)
+    paths = dataset_paths(output_dir, SYNTHETIC_GROUP)
+
+    tids = {} # {(rank, name): tid}
+    def tid_of(rank, name):
+        if (rank, name) not in tids:
+            tids[(rank, name)] = str(len(tids) + 1)
+        return tids[(rank, name)]
+
+    with open(paths['neonhq'], 'w', encoding='utf-8', newline='') as neon_file, \
+         open(paths['biorepo_taxa'], 'w', encoding='utf-8', newline='') as taxa_file, \
+         open(paths['biorepo_enum_tree'], 'w', encoding='utf-8', newline='') as enum_file, \
+         open(paths['biorepo_neon_taxonomy'], 'w', encoding='utf-8', newline='') as map_file, \
+         open(paths['biorepo_taxstatus'], 'w', encoding='utf-8', newline='') as status_file:
+        neon_writer = csv.DictWriter(neon_file, fieldnames=NEONHQ_VERBOSE_FIELDNAMES)
+        taxa_writer = csv.writer(taxa_file)
+        enum_writer = csv.writer(enum_file)
+        map_writer = csv.writer(map_file)
+        status_writer = csv.writer(status_file)
+        neon_writer.writeheader()
+        taxa_writer.writerow(['tid', 'kingdomName', 'sciName', 'rankID'])
+        enum_writer.writerow(['tid', 'taxauthid', 'parenttid'])
+        map_writer.writerow(['taxonGroup', 'taxonCode', 'tid', 'verbatimScientificName'])
+        status_writer.writerow(['tid', 'tidaccepted', 'taxauthid'])
+
+        written_tids = set()
+        def write_taxon(tid, name, rank, ancestor_tids):
+            if tid in written_tids:
+                return
+            written_tids.add(tid)
+            taxa_writer.writerow([tid, 'Plantae', name, SYNTHETIC_RANK_IDS[rank]])
+            enum_writer.writerows([tid, 1, parent_tid] for parent_tid in ancestor_tids)
+            status_writer.writerow([tid, tid, 1])
+
+        for species_number in range(species_count):
+            ancestors = _synthetic_ancestors(species_number)
+            ancestor_tids = []
+            for rank, name in ancestors:
+                tid = tid_of(rank, name)
+                write_taxon(tid, name, rank, ancestor_tids)
+                ancestor_tids = ancestor_tids + [tid]
+
+            genus = ancestors[-1][1]
+            epithet = f"epithet{species_number}"
+            scientific_name = f"{genus} {epithet}"
+            taxon_code = f"SYN{species_number}"
+            lineage = dict(ancestors)
+            neon_writer.writerow({
+                'taxonID': taxon_code,
+                'acceptedTaxonID': taxon_code,
+                'dwc:kingdom': lineage['kingdom'],
+                'dwc:phylum': lineage['phylum'],
+                'dwc:class': lineage['class'],
+                'dwc:order': lineage['order'],
+                'dwc:family': lineage['family'],
+                'dwc:genus': genus,
+                'dwc:specificEpithet': epithet,
+                'dwc:scientificName': scientific_name,
+                'dwc:taxonRank': 'species'
+            })
+
+            # Biorepo species; a few are filed under another genus than in NEON HQ
+            biorepo_ancestor_tids = ancestor_tids
+            if rng.random() < 0.03:
+                other_ancestors = _synthetic_ancestors(rng.randrange(species_count))
+                biorepo_ancestor_tids = [tid_of(rank, name) for rank, name in other_ancestors]
+            species_tid = tid_of('species', scientific_name)
+            write_taxon(species_tid, scientific_name, 'species', biorepo_ancestor_tids)
+
+            roll = rng.random()
+            if 0.07 <= roll < 0.09:
+                # Mapped to an outdated Biorepo name, which only a synonym resolves to this species
+                prior_name = f"{genus} prior{species_number}"
+                prior_tid = tid_of('species', prior_name)
+                taxa_writer.writerow([prior_tid, 'Plantae', prior_name, SYNTHETIC_RANK_IDS['species']])
+                enum_writer.writerows([prior_tid, 1, parent_tid] for parent_tid in biorepo_ancestor_tids)
+                status_writer.writerow([prior_tid, species_tid, 1])
+                map_writer.writerow([SYNTHETIC_GROUP, taxon_code, prior_tid, prior_name])
+            else:
+                map_writer.writerow([SYNTHETIC_GROUP, taxon_code, species_tid, scientific_name])
+
+            if roll < 0.05:
+                # A NEON synonym of this species, and a Biorepo synonym accepted as it
+                synonym_code = f"{taxon_code}SYN"
+                neon_writer.writerow({'taxonID': synonym_code, 'acceptedTaxonID': taxon_code,
+                                      'dwc:genus': genus, 'dwc:specificEpithet': f"old{species_number}",
+                                      'dwc:scientificName': f"{genus} old{species_number}", 'dwc:taxonRank': 'species'})
+                synonym_tid = tid_of('species', f"{genus} old{species_number}")
+                taxa_writer.writerow([synonym_tid, 'Plantae', f"{genus} old{species_number}", SYNTHETIC_RANK_IDS['species']])
+                enum_writer.writerows([synonym_tid, 1, parent_tid] for parent_tid in biorepo_ancestor_tids)
+                status_writer.writerow([synonym_tid, species_tid, 1])
+                map_writer.writerow([SYNTHETIC_GROUP, synonym_code, synonym_tid, f"{genus} old{species_number}"])
+            elif roll < 0.07:
+                # 'SP' and 'SPP' genus-level forms, of which only 'SP' is kept
+                genus_code = f"GEN{species_number}"
+                for suffix, epithet_form in (('SP', 'sp.'), ('SPP', 'spp.')):
+                    neon_writer.writerow({'taxonID': f"{genus_code}{suffix}", 'acceptedTaxonID': f"{genus_code}{suffix}",
+                                          'dwc:kingdom': lineage['kingdom'], 'dwc:family': lineage['family'],
+                                          'dwc:genus': genus, 'dwc:specificEpithet': epithet_form,
+                                          'dwc:scientificName': f"{genus} {epithet_form}", 'dwc:taxonRank': 'genus'})
+
+    if taxon_units_path is None:
+        taxon_units_path = os.path.join(DEFAULT_DATA_DIR, '00_uploaded_data', 'biorepo_taxonunits.csv')
+    shutil.copyfile(taxon_units_path, paths['biorepo_taxon_units'])
+    return paths
+
+def dataset_paths(data_dir, group_code, layout='flat'):
+    """
+    Returns the input and output paths of one benchmark dataset: the 'flat' layout of
+    generate_synthetic_dataset, or the 'pipeline' layout of the shipped data/ directory.
+    """
+    if layout == 'pipeline':
+        uploaded_dir = os.path.join(data_dir, '00_uploaded_data')
+        return {
+            'group_code': group_code,
+            'neonhq': os.path.join(data_dir, '01_downloaded_neonhq', f"{group_code}.neonhq.csv"),
+            'biorepo': os.path.join(data_dir, '02_generated_neonbiorepo', f"{group_code}.biorepo.csv"),
+            'neonhq_accepted': os.path.join(data_dir, '03_accepted_taxonomies', f"{group_code}.neonhq.accepted.csv"),
+            'biorepo_accepted': os.path.join(data_dir, '03_accepted_taxonomies', f"{group_code}.biorepo.accepted.csv"),
+            'biorepo_neon_taxonomy': os.path.join(uploaded_dir, 'biorepo_neon_taxonomy.csv'),
+            'biorepo_taxa': os.path.join(uploaded_dir, 'biorepo_taxa.csv'),
+            'biorepo_enum_tree': os.path.join(uploaded_dir, 'biorepo_taxaenumtree.csv'),
+            'biorepo_taxon_units': os.path.join(uploaded_dir, 'biorepo_taxonunits.csv'),
+            'biorepo_taxstatus': os.path.join(uploaded_dir, 'biorepo_taxstatus.csv'),
+        }
+    return {
+        'group_code': group_code,
+        'neonhq': os.path.join(data_dir, f"{group_code}.neonhq.csv"),
+        'biorepo': os.path.join(data_dir, f"{group_code}.biorepo.csv"),
+        'neonhq_accepted': os.path.join(data_dir, f"{group_code}.neonhq.accepted.csv"),
+        'biorepo_accepted': os.path.join(data_dir, f"{group_code}.biorepo.accepted.csv"),
+        'biorepo_neon_taxonomy': os.path.join(data_dir, 'biorepo_neon_taxonomy.csv'),
+        'biorepo_taxa': os.path.join(data_dir, 'biorepo_taxa.csv'),
+        'biorepo_enum_tree': os.path.join(data_dir, 'biorepo_taxaenumtree.csv'),
+        'biorepo_taxon_units': os.path.join(data_dir, 'biorepo_taxonunits.csv'),
+        'biorepo_taxstatus': os.path.join(data_dir, 'biorepo_taxstatus.csv'),
+    }
+
+# --- Local NEON API stub ---
+
+def start_stub_server(neonhq_path, group_code):
+    """
+    Serves the records of a NEON HQ CSV file like the NEON taxonomy API (paged JSON
+    with 'next' links) on a local port. Returns (server, api_base_url); call
+    server.shutdown() when done.
+    """
+    with open(neonhq_path, 'r', encoding='utf-8', newline='') as f:
+        records = [{key: (value if value != '' else None) for key, value in row.items()} for row in csv.DictReader(f)]
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            limit = int(query.get('limit', ['100'])[0])
+            offset = int(query.get('offset', ['0'])[0])
+            group_records = records if query.get('taxonTypeCode', [None])[0] == group_code else []
+            next_url = None
+            if offset + limit < len(group_records):
+                next_query = urlencode({'taxonTypeCode': group_code, 'verbose': 'true', 'limit': limit, 'offset': offset + limit})
+                next_url = f"http://{self.headers['Host']}{url.path}?{next_query}"
+            page = group_records[offset:offset + limit]
+            body = json.dumps({'count': len(page), 'next': next_url, 'data': page}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v0/taxonomy"
+
+# --- Measurements ---
+
+def measure(stage, func, *args, repeat=1, memory=True, **kwargs):
+    """
+    Runs func(*args, **kwargs) `repeat` times and returns the best wall time, plus the
+    peak traced memory of one extra run under tracemalloc (which slows the run down,
+    so it is not timed). The stages' own output is discarded.
+    """
+    timings = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(*args, **kwargs)
+            timings.append(time.perf_counter() - started)
+        peak_memory = None
+        if memory:
+            tracemalloc.start()
+            try:
+                func(*args, **kwargs)
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    result = {'stage': stage, 'seconds': min(timings), 'peak_memory_bytes': peak_memory}
+    print(f"  {stage}: {result['seconds']:.3f}s" +
+          (f", peak {peak_memory / (1024 * 1024):.1f} MiB" if peak_memory is not None else ''))
+    return result
+
+def benchmark_dataset(dataset_name, paths, work_dir, repeat=1, memory=True):
+    """
+    Benchmarks every stage whose inputs exist in `paths` (see dataset_paths). Stage
+    outputs that later stages need are produced in `work_dir` when the dataset lacks them.
+    Returns a list of results tagged with `dataset_name`.
+    """
+    group_code = paths['group_code']
+    os.makedirs(work_dir, exist_ok=True)
+    exists = lambda *keys: all(os.path.exists(paths[key]) for key in keys)
+    work_path = lambda filename: os.path.join(work_dir, filename)
+    reference_keys = ('biorepo_neon_taxonomy', 'biorepo_taxa', 'biorepo_enum_tree', 'biorepo_taxon_units')
+    results = []
+    print(f"Benchmarking {dataset_name} ({group_code}):")
+
+    if exists('neonhq'):
+        server, api_url = start_stub_server(paths['neonhq'], group_code)
+        try:
+            def download():
+                download_taxonomy(group_code, work_path(f"{group_code}.neonhq.csv"), api_url,
+                                  session=create_session(), resume=False)
+            results.append(measure('download_taxonomy', download, repeat=repeat, memory=memory))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    if exists('biorepo_taxa'):
+        results.append(measure('load_csv_to_dict', load_csv_to_dict, paths['biorepo_taxa'], 'tid',
+                               repeat=repeat, memory=memory))
+    elif exists('neonhq'):
+        results.append(measure('load_csv_to_dict', load_csv_to_dict, paths['neonhq'], 'taxonID',
+                               repeat=repeat, memory=memory))
+
+    if exists(*reference_keys):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            reference_tables = load_reference_tables(*(paths[key] for key in reference_keys), use_cache=False)
+        mapped_tids = [entry['tid'] for (map_group, _), entry in reference_tables['neon_biorepo_map'].items()
+                       if map_group == group_code and entry.get('tid') in reference_tables['taxa_data']]
+        def build_lineages():
+            lineage_cache = {}
+            for tid in mapped_tids:
+                build_lineage(tid, reference_tables['taxa_data'], reference_tables['rank_ids'],
+                              reference_tables['parent_index'], reference_tables['rank_schema'], lineage_cache)
+        results.append(measure('build_lineage', build_lineages, repeat=repeat, memory=memory))
+
+        if exists('neonhq'):
+            biorepo_path = work_path(f"{group_code}.biorepo.csv")
+            reference_tables['lineage_cache'] = {}
+            results.append(measure('generate_second_taxonomy', generate_second_taxonomy, group_code, paths['neonhq'],
+                                   *(paths[key] for key in reference_keys), biorepo_path,
+                                   reference_tables=reference_tables, repeat=repeat, memory=memory))
+            paths = dict(paths, biorepo=biorepo_path)
+
+            if exists('biorepo_taxstatus'):
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    accepted_tids = load_taxstatus(paths['biorepo_taxstatus'], use_cache=False)
+                def generate_accepted():
+                    reference_tables['lineage_cache'] = {}
+                    generate_second_taxonomy(group_code, paths['neonhq'], *(paths[key] for key in reference_keys),
+                                             work_path(f"{group_code}.biorepo.fused.accepted.csv"),
+                                             reference_tables=reference_tables, accepted_tids=accepted_tids)
+                results.append(measure('generate_accepted_taxonomy', generate_accepted, repeat=repeat, memory=memory))
+
+    if exists('neonhq'):
+        neonhq_accepted_path = work_path(f"{group_code}.neonhq.accepted.csv")
+        results.append(measure('select_neonhq_accepted', select_neonhq_accepted, paths['neonhq'], neonhq_accepted_path,
+                               repeat=repeat, memory=memory))
+        if not exists('neonhq_accepted'):
+            paths = dict(paths, neonhq_accepted=neonhq_accepted_path)
+
+    if exists('biorepo', 'biorepo_taxstatus'):
+        biorepo_accepted_path = work_path(f"{group_code}.biorepo.accepted.csv")
+        results.append(measure('select_biorepo_accepted', select_biorepo_accepted, paths['biorepo'],
+                               paths['biorepo_taxstatus'], biorepo_accepted_path, use_cache=False,
+                               repeat=repeat, memory=memory))
+        if not exists('biorepo_accepted'):
+            paths = dict(paths, biorepo_accepted=biorepo_accepted_path)
+
+    if exists('neonhq_accepted', 'biorepo_accepted'):
+        def extract_edges():
+            edge_index = EdgeIndex()
+            for source in ('neonhq', 'biorepo'):
+                load_lineage_edges(paths[f"{source}_accepted"], group_code, SOURCE_ID_COLUMNS[source], source, edge_index)
+        results.append(measure('extract_lineage_edges', extract_edges, repeat=repeat, memory=memory))
+        results.append(measure('compare_taxonomies', compare_taxonomies, group_code, paths['neonhq_accepted'],
+                               paths['biorepo_accepted'], work_path(f"{group_code}.comparison.txt"),
+                               repeat=repeat, memory=memory))
+
+    for result in results:
+        result['dataset'] = dataset_name
+        result['group_code'] = group_code
+    return results
+
+def git_commit():
+    """Returns the current git commit of the repository, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SCRIPTS_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_with_baseline(results, baseline_path, tolerance=0.2):
+    """Prints every stage that got more than `tolerance` slower (or bigger) than in a baseline results file."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(result['dataset'], result['stage']): result for result in json.load(f)['results']}
+    regressions = 0
+    print(f"Compared with {baseline_path}:")
+    for result in results:
+        previous = baseline.get((result['dataset'], result['stage']))
+        if previous is None:
+            continue
+        for metric in ('seconds', 'peak_memory_bytes'):
+            if result.get(metric) is None or not previous.get(metric):
+                continue
+            ratio = result[metric] / previous[metric]
+            flag = ''
+            if ratio > 1 + tolerance:
+                flag = '  <-- regression'
+                regressions += 1
+            print(f"  {result['dataset']} {result['stage']} {metric}: {ratio:.2f}x{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time and memory-profile the pipeline stages on the shipped data and on synthetic taxonomies "
+                    "scaled relative to the NEON PLANT checklist, recording the results as JSON."
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=DEFAULT_DATA_DIR,
+        help="Pipeline data directory whose files are benchmarked (default: the repository's data/ directory)."
+    )
+    parser.add_argument(
+        "--groups",
+        default='ALGAE',
+        help="Comma-separated groups of --data-dir to benchmark (default: ALGAE, the largest shipped group). "
+             "Stages whose input files are missing are skipped. Use '' to skip the shipped data."
+    )
+    parser.add_argument(
+        "--scales",
+        default='1',
+        help="Comma-separated sizes of the synthetic datasets, as multiples of the PLANT checklist "
+             f"(~{PLANT_CHECKLIST_SIZE} taxa), e.g. 1,10,100. Use '' to skip the synthetic data (default: 1)."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the synthetic data generator (default: 0)."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Timed runs per stage; the fastest is recorded (default: 1)."
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Skip the extra tracemalloc run of each stage that measures peak memory."
+    )
+    parser.add_argument(
+        "--work-dir",
+        help="Directory for the synthetic data and stage outputs (default: a temporary directory, removed afterwards)."
+    )
+    parser.add_argument(
+        "--output",
+        help="Optional: Path to a JSON file for the results."
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Optional: Results JSON of an earlier run (e.g., of the previous commit) to compare against."
+    )
+    args = parser.parse_args()
+
+    group_codes = [g.strip() for g in args.groups.split(',') if g.strip()]
+    try:
+        scales = [float(s) for s in args.scales.split(',') if s.strip()]
+    except ValueError:
+        parser.error("--scales must be a comma-separated list of numbers.")
+    if any(scale <= 0 for scale in scales):
+        parser.error("--scales must be positive.")
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1.")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='taxonomy_benchmark_')
+    results = []
+    try:
+        for group_code in group_codes:
+            paths = dataset_paths(args.data_dir, group_code, layout='pipeline')
+            results.extend(benchmark_dataset(f"shipped:{group_code}", paths,
+                                             os.path.join(work_dir, f"shipped_{group_code}"),
+                                             args.repeat, not args.no_memory))
+        for scale in scales:
+            dataset_dir = os.path.join(work_dir, f"synthetic_x{scale:g}")
+            print(f"Generating synthetic dataset at {scale:g}x PLANT size in {dataset_dir}...")
+            paths = generate_synthetic_dataset(dataset_dir, scale, args.seed)
+            results.extend(benchmark_dataset(f"synthetic:x{scale:g}", paths, os.path.join(dataset_dir, 'outputs'),
+                                             args.repeat, not args.no_memory))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results
+    }
+    if args.output:
+        output_dir = os.path.dirname(args.output)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Benchmark results saved to: {args.output}")
+
+    if args.baseline:
+        if compare_with_baseline(results, args.baseline):
+            sys.exit(1)
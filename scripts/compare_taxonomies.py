@@ -1,7 +1,16 @@
 import argparse
 import csv
+import glob
+import heapq
+import json
 import os
+import re
 import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 # --- Define standard taxonomic rank order and mapping ---
 # This list defines the order in which we'll try to build lineages.
@@ -44,321 +53,1223 @@ BIOREPO_COLUMN_MAP = {
     'form': 'biorepo_form'
 }
 
-def load_taxonomy(filepath, group_code, id_col):
+class EdgeIndex:
+    """
+    Interns lineage nodes, i.e. (canonical_rank, lowercase_name) pairs, as small
+    integer ids, and packs each (parent, child) edge into one 64-bit integer:
+    parent_id << 32 | child_id. Edge sets of both taxonomies of a comparison must
+    be encoded with the same EdgeIndex so their integers can be compared.
+    """
+    NODE_ID_BITS = 32
+    NODE_ID_MASK = (1 << NODE_ID_BITS) - 1
+
+    def __init__(self):
+        self.node_ids = {} # {(rank, name): node_id}
+        self.nodes = []    # [(rank, name)], indexed by node_id
+
+    def node_id(self, rank, name):
+        node = (rank, name)
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.node_ids[node] = node_id
+            self.nodes.append(node)
+        return node_id
+
+    def encode(self, parent_rank, parent_name, child_rank, child_name):
+        return (self.node_id(parent_rank, parent_name) << self.NODE_ID_BITS) | self.node_id(child_rank, child_name)
+
+    def encode_path(self, nodes):
+        """Returns the packed edges between consecutive (rank, name) nodes of a lineage."""
+        get_node_id = self.node_ids.get
+        ids = [get_node_id(node) for node in nodes]
+        if None in ids:
+            ids = [self.node_id(rank, name) for rank, name in nodes]
+        node_id_bits = self.NODE_ID_BITS
+        return [(parent << node_id_bits) | child for parent, child in zip(ids, ids[1:])]
+
+    def decode(self, edge):
+        """Returns the (parent_rank, parent_name, child_rank, child_name) tuple of a packed edge."""
+        return self.nodes[edge >> self.NODE_ID_BITS] + self.nodes[edge & self.NODE_ID_MASK]
+
+    def decode_sorted(self, edges):
+        """Returns the edge tuples of a set of packed edges, sorted as the edge files list them."""
+        return sorted(self.decode(edge) for edge in edges)
+
+def _find_sorted(sorted_edges, edges):
+    """
+    Returns the positions of `edges` in the sorted array `sorted_edges` and a mask of
+    those found there, for a whole array of edges at once.
+    """
+    if not len(sorted_edges):
+        return np.zeros(len(edges), dtype=np.intp), np.zeros(len(edges), dtype=bool)
+    positions = np.searchsorted(sorted_edges, edges)
+    positions[positions == len(sorted_edges)] = 0
+    return positions, sorted_edges[positions] == edges
+
+class EdgeSet:
     """
-    Loads a taxonomy CSV file into a dictionary, keyed by the specified ID column.
-    Returns the data dictionary and the list of fieldnames.
+    A set of packed edges (see EdgeIndex), stored as a sorted NumPy int64 array of
+    distinct integers, i.e. 8 bytes per edge rather than a hash table entry and an int
+    object. The set operations are NumPy's sorted-array routines, run over whole arrays.
+    `subtrees` optionally holds the SimilarityBreakdown subtree id of each edge, as a
+    parallel int32 array; the sets returned by the set operations have none.
     """
-    data = {}
+    __slots__ = ('edges', 'subtrees')
+
+    def __init__(self, edges=(), subtrees=None):
+        """`edges` must be sorted and distinct; use EdgeSetBuilder to collect edges in any order."""
+        self.edges = np.asarray(edges, dtype=np.int64)
+        self.subtrees = subtrees
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __iter__(self):
+        return iter(self.edges.tolist())
+
+    def __contains__(self, edge):
+        return self.find(edge) >= 0
+
+    def find(self, edge):
+        """Returns the position of `edge` in the sorted array, or -1 if it is not in the set."""
+        edges = self.edges
+        i = int(np.searchsorted(edges, edge))
+        return i if i < len(edges) and edges[i] == edge else -1
+
+    def contains(self, edges):
+        """Returns a boolean mask of which of the packed `edges` (an array) are in the set."""
+        return _find_sorted(self.edges, edges)[1]
+
+    def intersection(self, other):
+        return EdgeSet(np.intersect1d(self.edges, other.edges, assume_unique=True))
+
+    def difference(self, other):
+        return EdgeSet(np.setdiff1d(self.edges, other.edges, assume_unique=True))
+
+    def union(self, other):
+        return EdgeSet(np.union1d(self.edges, other.edges))
+
+class EdgeSetBuilder:
+    """
+    Collects packed edges, in any order and with repeats, into an EdgeSet. Edges are
+    buffered in a list; every FLUSH_SIZE edges, the buffer is deduplicated with
+    np.unique and its edges not seen in earlier chunks are kept as a sorted chunk.
+    build() merges the chunks once. With `track_subtrees`, the subtree id each edge was
+    first added with is kept too. `count_new_edges`, if given, is called with the
+    (edges, rank pair ids, subtree ids) arrays of the new edges of each chunk, each
+    with the rank pair and subtree it was first added with.
+    """
+    FLUSH_SIZE = 1 << 16
+
+    def __init__(self, track_subtrees=False, count_new_edges=None):
+        self.chunks = []          # [sorted edges array], disjoint
+        self.subtree_chunks = []  # [subtree ids array], parallel to chunks
+        self.track_subtrees = track_subtrees
+        self.count_new_edges = count_new_edges
+        self.tagged = track_subtrees or count_new_edges is not None
+        self.pending = []         # Edges added since the last flush, at most about FLUSH_SIZE
+        self.pending_rank_pairs = []
+        self.pending_subtrees = []
+
+    def add(self, edge, rank_pair=0, subtree=0):
+        """Adds a packed edge, first seen under rank pair id `rank_pair` and subtree id `subtree`."""
+        self.extend((edge,), (rank_pair,), (subtree,))
+
+    def extend(self, edges, rank_pairs=None, subtrees=None):
+        """Adds a list of packed edges, with their rank pair and subtree ids when those are kept."""
+        self.pending.extend(edges)
+        if self.tagged:
+            self.pending_rank_pairs.extend(rank_pairs)
+            self.pending_subtrees.extend(subtrees)
+        if len(self.pending) >= self.FLUSH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        edges, first = np.unique(np.array(self.pending, dtype=np.int64), return_index=True)
+        is_new = np.ones(len(edges), dtype=bool)
+        for chunk in self.chunks:
+            is_new &= ~_find_sorted(chunk, edges)[1]
+        edges, first = edges[is_new], first[is_new]
+        self.chunks.append(edges)
+        if self.tagged:
+            subtrees = np.array(self.pending_subtrees, dtype=np.int32)[first]
+            if self.track_subtrees:
+                self.subtree_chunks.append(subtrees)
+            if self.count_new_edges is not None:
+                self.count_new_edges(edges, np.array(self.pending_rank_pairs, dtype=np.int16)[first], subtrees)
+        self.pending = []
+        self.pending_rank_pairs = []
+        self.pending_subtrees = []
+
+    def build(self):
+        self._flush()
+        if not self.chunks:
+            return EdgeSet(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32) if self.track_subtrees else None)
+        edges = np.concatenate(self.chunks)
+        order = np.argsort(edges, kind='stable')
+        subtrees = np.concatenate(self.subtree_chunks)[order] if self.track_subtrees else None
+        return EdgeSet(edges[order], subtrees)
+
+# ID column of the records of each taxonomy source
+SOURCE_ID_COLUMNS = {
+    'neonhq': 'taxonID',
+    'biorepo': 'biorepo_tid'
+}
+
+# Columns of the jaccard_summary.csv written by --summary-output and run_pipeline.py
+SUMMARY_FIELDNAMES = ['group_code', 'jaccard_index', 'neonhq_match_rate', 'biorepo_match_rate']
+
+# Edge sets written for each comparison, as "<report base>_<name>_edges.txt" files.
+# Each set is also a view over the edge table, selected by its membership flags.
+EDGE_SET_VIEWS = {
+    'union': lambda in_neonhq, in_biorepo: True,
+    'intersection': lambda in_neonhq, in_biorepo: in_neonhq and in_biorepo,
+    'neonhq': lambda in_neonhq, in_biorepo: in_neonhq,
+    'biorepo': lambda in_neonhq, in_biorepo: in_biorepo,
+    'unique_to_neonhq': lambda in_neonhq, in_biorepo: in_neonhq and not in_biorepo,
+    'unique_to_biorepo': lambda in_neonhq, in_biorepo: in_biorepo and not in_neonhq
+}
+
+# Columns of the "<report base>_edges.tsv" edge table written with --edge-format tsv/both
+EDGE_TABLE_FIELDNAMES = ['parent_rank', 'parent_name', 'child_rank', 'child_name', 'in_neonhq', 'in_biorepo']
+
+# 'txt': the six edge set files; 'tsv': the single edge table; 'both': all of them
+EDGE_FORMATS = ['txt', 'tsv', 'both']
+
+# Rank whose taxa define the subtrees of the per-subtree similarity breakdown
+DEFAULT_BREAKDOWN_RANK = 'order'
+
+# Columns of the "<report base>_breakdown.csv" per rank pair / per subtree similarity breakdown
+BREAKDOWN_FIELDNAMES = ['breakdown', 'key', 'neonhq_edges', 'biorepo_edges', 'common_edges', 'union_edges',
+                        'jaccard_index', 'neonhq_match_rate', 'biorepo_match_rate']
+
+def since_output_paths(output_path, since_run):
+    """Returns the change report and changed edges table written by a --since comparison."""
+    output_base = os.path.splitext(output_path)[0]
+    return f"{output_base}_since_{since_run}.txt", f"{output_base}_since_{since_run}_changes.tsv"
+
+def breakdown_output_path(output_path):
+    """Returns the breakdown CSV written alongside the report at `output_path`."""
+    return f"{os.path.splitext(output_path)[0]}_breakdown.csv"
+
+def edge_output_paths(output_path, edge_format='txt'):
+    """Returns the edge files written alongside the report at `output_path` for `edge_format`."""
+    output_base = os.path.splitext(output_path)[0]
+    paths = []
+    if edge_format in ('txt', 'both'):
+        paths.extend(f"{output_base}_{name}_edges.txt" for name in EDGE_SET_VIEWS)
+    if edge_format in ('tsv', 'both'):
+        paths.append(f"{output_base}_edges.tsv")
+    return paths
+
+def scan_taxonomy(filepath, group_code, id_col):
+    """
+    First streaming pass over a taxonomy CSV file: reads only the specified ID column
+    and marks, for each ID, the last row carrying it (later rows overwrite earlier
+    ones with the same ID, as keying the rows by ID would).
+    Returns the list of fieldnames, a bytearray flagging the rows to keep (indexed by
+    data row, blank lines excluded) and the number of unique IDs, or (None, None, None) on error.
+    """
+    last_row_of_id = {}
     fieldnames = []
     if not os.path.exists(filepath):
         print(f"Error: Taxonomy file for group '{group_code}' not found: {filepath}", file=sys.stderr)
-        return None, None
+        return None, None, None
     try:
         with open(filepath, 'r', encoding='utf-8', newline='') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
+            reader = csv.reader(f)
+            fieldnames = next(reader, None) or []
             if id_col not in fieldnames:
                 print(f"Error: Required ID column '{id_col}' not found in '{filepath}'. Found fields: {fieldnames}", file=sys.stderr)
-                return None, None
+                return None, None, None
+            id_index = _last_index(fieldnames, id_col)
+            row_number = 0
             for row in reader:
-                data[row[id_col]] = row
+                if not row: # csv.DictReader skips blank lines too
+                    continue
+                last_row_of_id[row[id_index] if id_index < len(row) else None] = row_number
+                row_number += 1
     except Exception as e:
         print(f"An error occurred loading {filepath}: {e}", file=sys.stderr)
+        return None, None, None
+
+    keep_rows = bytearray(row_number)
+    for kept_row_number in last_row_of_id.values():
+        keep_rows[kept_row_number] = 1
+    return fieldnames, keep_rows, len(last_row_of_id)
+
+def iter_taxonomy_rows(filepath, keep_rows):
+    """
+    Second streaming pass: yields, as csv.reader lists, the rows flagged in
+    `keep_rows` by scan_taxonomy, i.e. the last row of each ID.
+    """
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None) # Header
+        row_number = 0
+        for row in reader:
+            if not row:
+                continue
+            if keep_rows[row_number]:
+                yield row
+            row_number += 1
+
+def load_lineage_edges(filepath, group_code, id_col, taxonomy_type, edge_index, breakdown=None):
+    """
+    Streams a taxonomy CSV file row by row into its EdgeSet of packed lineage edges,
+    without holding the rows in memory. Duplicate IDs keep only their last row.
+    `breakdown` is passed to extract_lineage_edges.
+    Returns the edge set and the number of unique records, or (None, None) on error.
+    """
+    fieldnames, keep_rows, record_count = scan_taxonomy(filepath, group_code, id_col)
+    if fieldnames is None:
         return None, None
-    return data, fieldnames
+    try:
+        rows = iter_taxonomy_rows(filepath, keep_rows)
+        edges = extract_lineage_edges(rows, fieldnames, taxonomy_type, edge_index, group_code, breakdown)
+    except Exception as e:
+        print(f"An error occurred loading {filepath}: {e}", file=sys.stderr)
+        return None, None
+    return edges, record_count
+
+def _last_index(fieldnames, column_name):
+    """Index of the last `column_name` header, the one csv.DictReader would read."""
+    return len(fieldnames) - 1 - fieldnames[::-1].index(column_name)
+
+def _column_getter(taxonomy_fieldnames, column_name):
+    """
+    Returns a callable that reads the stripped value of `column_name` from a csv.reader
+    row, or '' when the column is absent from the file or the row is short.
+    """
+    if column_name not in taxonomy_fieldnames:
+        return lambda row: ''
+    index = _last_index(taxonomy_fieldnames, column_name)
+    def get(row):
+        return row[index].strip() if index < len(row) else ''
+    return get
 
-def extract_lineage_edges(taxonomy_data, taxonomy_fieldnames, taxonomy_type, group_code=None):
+def _compile_neonhq_rank_getters(taxonomy_fieldnames, group_code):
+    """Returns the [(canonical_rank, getter)] list for NEON HQ rows of `group_code`."""
+    group = group_code.upper() if group_code else ''
+    is_plant = group == 'PLANT'
+    parses_trinomials = group in ('HERPETOLOGY', 'SMALL_MAMMAL')
+
+    get_phylum = _column_getter(taxonomy_fieldnames, 'dwc:phylum')
+    get_division = _column_getter(taxonomy_fieldnames, 'dwc:division')
+    get_genus = _column_getter(taxonomy_fieldnames, 'dwc:genus')
+    get_raw_epithet = _column_getter(taxonomy_fieldnames, 'dwc:specificEpithet')
+    get_scientific_name = _column_getter(taxonomy_fieldnames, 'dwc:scientificName')
+    get_subspecies = _column_getter(taxonomy_fieldnames, 'dwc:subspecies')
+    get_variety = _column_getter(taxonomy_fieldnames, 'gbif:variety')
+    get_form = _column_getter(taxonomy_fieldnames, 'gbif:form')
+
+    # Helper to get cleaned specificEpithet for NEON HQ
+    def get_epithet(row):
+        epithet = get_raw_epithet(row)
+        if epithet.lower() in ['sp.', 'spp.']:
+            return '' # Treat "sp."/"spp." as empty
+        return epithet
+
+    def phylum(row):
+        # Try dwc:phylum first, then dwc:division
+        return get_phylum(row) or get_division(row)
+
+    def species(row):
+        genus = get_genus(row)
+        epithet = get_epithet(row)
+        if not (genus and epithet):
+            return None
+        # Default species name (no cross assumed initially)
+        value = f"{genus} {epithet}"
+
+        # Special handling for PLANT group to include hybrid cross
+        if is_plant:
+            scientific_name = get_scientific_name(row)
+            if '×' in scientific_name:
+                # Case 1: Intergeneric hybrid, e.g., "×Triticosecale L."
+                # Check if scientific_name starts with '×' followed immediately by genus (case-insensitive)
+                if scientific_name.lower().startswith(f"×{genus.lower()}"):
+                    value = f"×{genus} {epithet}"
+                else:
+                    # Case 2: Interspecific hybrid, e.g., "Quercus ×rosacea L."
+                    # Check if "Genus ×Epithet" pattern (with or without space after cross) exists in scientific_name
+                    # and always format the output value with a space after the cross.
+                    search_pattern_no_space = f"{genus} ×{epithet}"
+                    search_pattern_with_space = f"{genus} × {epithet}"
+                    if search_pattern_no_space.lower() in scientific_name.lower() or \
+                       search_pattern_with_space.lower() in scientific_name.lower():
+                        value = search_pattern_with_space # Assigns "Genus × Epithet"
+        return value
+
+    def subspecies(row):
+        genus = get_genus(row)
+        specific_epithet = get_epithet(row)
+        if not (genus and specific_epithet): # We need a valid species base first
+            return None
+        subspecies_epithet_from_field = get_subspecies(row)
+
+        # Case 1: dwc:subspecies field is filled
+        if subspecies_epithet_from_field:
+            base_subspecies_name = f"{genus} {specific_epithet} {subspecies_epithet_from_field}"
+            # Special handling for PLANT group if scientific_name indicates a cross
+            if is_plant:
+                scientific_name = get_scientific_name(row)
+                if '×' in scientific_name:
+                    # Check for pattern "Genus species ×subspecies" (with or without space after cross)
+                    # and always format the output value with a space after the cross.
+                    search_pattern_no_space = f"{genus} {specific_epithet} ×{subspecies_epithet_from_field}"
+                    search_pattern_with_space = f"{genus} {specific_epithet} × {subspecies_epithet_from_field}"
+                    if search_pattern_no_space.lower() in scientific_name.lower() or \
+                       search_pattern_with_space.lower() in scientific_name.lower():
+                        return search_pattern_with_space
+            return base_subspecies_name
+
+        # Case 2: dwc:subspecies field is empty, but for HERPETOLOGY or SMALL_MAMMAL, check dwc:scientificName for trinomial
+        if parses_trinomials:
+            parts = get_scientific_name(row).split()
+            # Check if it's a trinomial AND the first two parts match our derived genus and species
+            # This heuristic assumes scientific_name for these specific cases is strictly
+            # "Genus species subspecies" without an author.
+            if len(parts) == 3 and \
+               parts[0].lower() == genus.lower() and \
+               parts[1].lower() == specific_epithet.lower():
+                return f"{genus} {specific_epithet} {parts[2]}"
+        return None
+
+    def variety(row):
+        genus = get_genus(row)
+        specific_epithet = get_epithet(row)
+        variety_epithet = get_variety(row)
+        # Only proceed if we can form a base species name AND have a variety epithet
+        if genus and specific_epithet and variety_epithet:
+            return f"{genus} {specific_epithet} var. {variety_epithet}"
+        return None
+
+    def form(row):
+        genus = get_genus(row)
+        specific_epithet = get_epithet(row)
+        form_epithet = get_form(row)
+        # Only proceed if we can form a base species name AND have a form epithet
+        if genus and specific_epithet and form_epithet:
+            return f"{genus} {specific_epithet} f. {form_epithet}"
+        return None
+
+    special_getters = {
+        'phylum': phylum,
+        'species': species,
+        'subspecies': subspecies,
+        'variety': variety,
+        'form': form
+    }
+
+    rank_getters = []
+    for rank_name in STANDARD_RANK_ORDER:
+        if rank_name in special_getters:
+            rank_getters.append((rank_name, special_getters[rank_name]))
+        else: # Standard handling for other NEON HQ ranks not covered by special cases
+            col_name_in_map = NEONHQ_COLUMN_MAP.get(rank_name)
+            if col_name_in_map and col_name_in_map in taxonomy_fieldnames:
+                rank_getters.append((rank_name, _column_getter(taxonomy_fieldnames, col_name_in_map)))
+    return rank_getters
+
+def _compile_biorepo_rank_getters(taxonomy_fieldnames):
+    """Returns the [(canonical_rank, getter)] list for Biorepo rows."""
+    rank_getters = []
+    for rank_name in STANDARD_RANK_ORDER:
+        col_name_in_map = BIOREPO_COLUMN_MAP.get(rank_name)
+        if col_name_in_map and col_name_in_map in taxonomy_fieldnames:
+            rank_getters.append((rank_name, _column_getter(taxonomy_fieldnames, col_name_in_map)))
+    return rank_getters
+
+def compile_lineage_extractor(taxonomy_type, taxonomy_fieldnames, group_code=None):
     """
-    Extracts a set of unique (parent_rank, parent_name, child_rank, child_name) tuples (edges)
-    from the provided taxonomy data, using hardcoded rank order and specific column mappings.
+    Compiles the lineage rules of one (source, group) into a single callable, so
+    the per-source and per-group decisions are made once rather than per record.
+    The callable takes a csv.reader row and returns its lineage as a list of
+    (canonical_rank, lowercase_name) tuples in STANDARD_RANK_ORDER.
     `taxonomy_type` can be 'neonhq' or 'biorepo'.
-    `group_code` is used for group-specific parsing rules.
     """
-    all_edges = set()
+    if taxonomy_type == 'neonhq':
+        rank_getters = _compile_neonhq_rank_getters(taxonomy_fieldnames, group_code)
+    elif taxonomy_type == 'biorepo':
+        rank_getters = _compile_biorepo_rank_getters(taxonomy_fieldnames)
+    else:
+        raise ValueError(f"Unknown taxonomy_type: {taxonomy_type}. Expected 'neonhq' or 'biorepo'.")
 
-    for taxon_record in taxonomy_data.values():
-        current_lineage = [] # List of (canonical_rank, name.lower()) tuples for this record
-        
-        # Determine which column map to use
-        column_map = {}
-        if taxonomy_type == 'neonhq':
-            column_map = NEONHQ_COLUMN_MAP
-        elif taxonomy_type == 'biorepo':
-            column_map = BIOREPO_COLUMN_MAP
-        else:
-            raise ValueError(f"Unknown taxonomy_type: {taxonomy_type}. Expected 'neonhq' or 'biorepo'.")
-        
-        # Helper to get cleaned specificEpithet for NEON HQ
-        def get_neonhq_species_epithet(record):
-            epithet = record.get('dwc:specificEpithet', '').strip()
-            if epithet.lower() in ['sp.', 'spp.']:
-                return '' # Treat "sp."/"spp." as empty
-            return epithet
-
-        # Build the lineage for the current taxon_record based on STANDARD_RANK_ORDER
-        for rank_name in STANDARD_RANK_ORDER:
-            value = None
-            col_name_in_map = column_map.get(rank_name) # This is the preferred column name for the rank
-
-            # --- Special Handling for NEON HQ ranks ---
-            if taxonomy_type == 'neonhq':
-                if rank_name == 'phylum':
-                    # Try dwc:phylum first, then dwc:division
-                    value = taxon_record.get('dwc:phylum', '').strip()
-                    if not value:
-                        value = taxon_record.get('dwc:division', '').strip()
-                elif rank_name == 'species':
-                    genus = taxon_record.get('dwc:genus', '').strip()
-                    epithet = get_neonhq_species_epithet(taxon_record)
-                    scientific_name = taxon_record.get('dwc:scientificName', '').strip()
-
-                    if genus and epithet:
-                        # Default species name (no cross assumed initially)
-                        value = f"{genus} {epithet}"
-
-                        # Special handling for PLANT group to include hybrid cross
-                        if group_code and group_code.upper() == 'PLANT' and '×' in scientific_name:
-                            # Case 1: Intergeneric hybrid, e.g., "×Triticosecale L."
-                            # Check if scientific_name starts with '×' followed immediately by genus (case-insensitive)
-                            if scientific_name.lower().startswith(f"×{genus.lower()}"):
-                                # If genus is found, and epithet is also present, combine them with the leading cross
-                                if epithet:
-                                    value = f"×{genus} {epithet}"
-                                else: # If no specific epithet, it's just the hybrid genus itself
-                                    value = f"×{genus}"
-                            else:
-                                # Case 2: Interspecific hybrid, e.g., "Quercus ×rosacea L."
-                                # Check if "Genus ×Epithet" pattern (with or without space after cross) exists in scientific_name
-                                # and always format the output value with a space after the cross.
-                                search_pattern_no_space = f"{genus} ×{epithet}"
-                                search_pattern_with_space = f"{genus} × {epithet}"
-                                
-                                if search_pattern_no_space.lower() in scientific_name.lower() or \
-                                   search_pattern_with_space.lower() in scientific_name.lower():
-                                    value = search_pattern_with_space # Assigns "Genus × Epithet"
-                                # Else, keep default value (no cross found in expected pattern)
-                
-                elif rank_name == 'subspecies':
-                    genus = taxon_record.get('dwc:genus', '').strip()
-                    specific_epithet = get_neonhq_species_epithet(taxon_record)
-                    subspecies_epithet_from_field = taxon_record.get('dwc:subspecies', '').strip()
-                    scientific_name = taxon_record.get('dwc:scientificName', '').strip()
-                    
-                    subspecies_final_value = None
-
-                    if genus and specific_epithet: # We need a valid species base first
-                        # Case 1: dwc:subspecies field is filled
-                        if subspecies_epithet_from_field:
-                            base_subspecies_name = f"{genus} {specific_epithet} {subspecies_epithet_from_field}"
-                            
-                            # Special handling for PLANT group if dwc:subspecies has a cross or scientific_name indicates one
-                            if group_code and group_code.upper() == 'PLANT' and '×' in scientific_name:
-                                # Check for pattern "Genus species ×subspecies" (with or without space after cross)
-                                # and always format the output value with a space after the cross.
-                                search_pattern_no_space = f"{genus} {specific_epithet} ×{subspecies_epithet_from_field}"
-                                search_pattern_with_space = f"{genus} {specific_epithet} × {subspecies_epithet_from_field}"
-                                
-                                if search_pattern_no_space.lower() in scientific_name.lower() or \
-                                   search_pattern_with_space.lower() in scientific_name.lower():
-                                    subspecies_final_value = search_pattern_with_space
-                                else:
-                                    subspecies_final_value = base_subspecies_name
-                            else:
-                                subspecies_final_value = base_subspecies_name
-
-                        # Case 2: dwc:subspecies field is empty, but for HERPETOLOGY or SMALL_MAMMAL, check dwc:scientificName for trinomial
-                        elif group_code and (group_code.upper() == 'HERPETOLOGY' or group_code.upper() == 'SMALL_MAMMAL'):
-                            parts = scientific_name.split()
-                            # Check if it's a trinomial AND the first two parts match our derived genus and species
-                            # This heuristic assumes scientific_name for these specific cases is strictly
-                            # "Genus species subspecies" without an author.
-                            if len(parts) == 3 and \
-                               parts[0].lower() == genus.lower() and \
-                               parts[1].lower() == specific_epithet.lower():
-                                
-                                subspecies_epithet_from_sciname = parts[2]
-                                subspecies_final_value = f"{genus} {specific_epithet} {subspecies_epithet_from_sciname}"
-                                
-                    value = subspecies_final_value # Set the value for the 'subspecies' rank
-                elif rank_name == 'variety':
-                    genus = taxon_record.get('dwc:genus', '').strip()
-                    specific_epithet = get_neonhq_species_epithet(taxon_record)
-                    variety_epithet = taxon_record.get('gbif:variety', '').strip()
-
-                    # Only proceed if we can form a base species name AND have a variety epithet
-                    if genus and specific_epithet and variety_epithet:
-                        base_species_name = f"{genus} {specific_epithet}"
-                        value = f"{base_species_name} var. {variety_epithet}"
-                elif rank_name == 'form':
-                    genus = taxon_record.get('dwc:genus', '').strip()
-                    specific_epithet = get_neonhq_species_epithet(taxon_record)
-                    form_epithet = taxon_record.get('gbif:form', '').strip()
-
-                    # Only proceed if we can form a base species name AND have a form epithet
-                    if genus and specific_epithet and form_epithet:
-                        base_species_name = f"{genus} {specific_epithet}"
-                        value = f"{base_species_name} f. {form_epithet}"
-                else: # Standard handling for other NEON HQ ranks not covered by special cases
-                    if col_name_in_map and col_name_in_map in taxonomy_fieldnames:
-                        value = taxon_record.get(col_name_in_map, '').strip()
-            # --- End Special Handling for NEON HQ ranks ---
-
-            # --- Standard handling for Biorepo ranks ---
-            elif taxonomy_type == 'biorepo':
-                if col_name_in_map and col_name_in_map in taxonomy_fieldnames:
-                    value = taxon_record.get(col_name_in_map, '').strip()
-            # --- End Standard handling for Biorepo ranks ---
-            
+    def extract_lineage(row):
+        lineage = []
+        for rank_name, getter in rank_getters:
+            value = getter(row)
             if value: # Only add if a non-empty value exists for this rank in this record
-                current_lineage.append((rank_name, value.lower()))
-        
-        # Now, extract edges from the built lineage
-        for i in range(len(current_lineage) - 1):
-            parent_rank, parent_name = current_lineage[i]
-            child_rank, child_name = current_lineage[i+1]
-            if parent_name and child_name: # Ensure valid names exists for the edge
-                edge_tuple = (parent_rank, parent_name, child_rank, child_name)
-                all_edges.add(edge_tuple)
-                
-    return all_edges
+                lineage.append((rank_name, value.lower()))
+        return lineage
+    return extract_lineage
+
+def extract_lineage_edges(taxonomy_rows, taxonomy_fieldnames, taxonomy_type, edge_index, group_code=None,
+                          breakdown=None):
+    """
+    Extracts the set of unique (parent_rank, parent_name, child_rank, child_name) edges
+    from an iterable of csv.reader rows (e.g. iter_taxonomy_rows),
+    using hardcoded rank order and specific column mappings.
+    Edges are returned as an EdgeSet, packed as integers by `edge_index` (see EdgeIndex.decode).
+    `taxonomy_type` can be 'neonhq' or 'biorepo'.
+    `group_code` is used for group-specific parsing rules.
+    If a SimilarityBreakdown is given, each new edge is also counted in it (see collect_lineage_edges).
+    """
+    extract_lineage = compile_lineage_extractor(taxonomy_type, taxonomy_fieldnames, group_code)
+    return collect_lineage_edges(map(extract_lineage, taxonomy_rows), taxonomy_type, edge_index, breakdown)
+
+def collect_lineage_edges(lineages, taxonomy_type, edge_index, breakdown=None):
+    """
+    Returns the EdgeSet of the parent-child edges of `lineages`, an iterable of
+    [(canonical_rank, lowercase_name)] lists as compile_lineage_extractor returns them.
+    If a SimilarityBreakdown is given, each new edge is also counted in it, under its
+    rank pair and the subtree of the lineage it was first seen in.
+    """
+    encode_path = edge_index.encode_path
+    track_subtrees = breakdown is not None
+    if not track_subtrees:
+        all_edges = EdgeSetBuilder()
+    else:
+        all_edges = EdgeSetBuilder(breakdown.keeps_subtrees(taxonomy_type), breakdown.counter(taxonomy_type))
+        subtree_rank = breakdown.subtree_rank
+        subtree_position = STANDARD_RANK_ORDER.index(subtree_rank)
+        subtree_id = breakdown.subtree_id
+        above_subtree = subtree_id(edge_subtree_label(subtree_rank, above=True))
+        no_subtree = subtree_id(edge_subtree_label(subtree_rank))
+        rank_count = len(STANDARD_RANK_ORDER)
+        shapes = {} # {ranks of a lineage: (rank pair ids of its edges, position of subtree_rank, edges above it)}
+    add_edges = all_edges.extend
+
+    for current_lineage in lineages:
+        if len(current_lineage) < 2:
+            continue
+        # Now, extract edges from the built lineage, all at once
+        edges = encode_path(current_lineage)
+        if not track_subtrees:
+            add_edges(edges)
+            continue
+        ranks = tuple([rank for rank, _ in current_lineage])
+        shape = shapes.get(ranks)
+        if shape is None:
+            # Lineages list their ranks in STANDARD_RANK_ORDER, so the edges above the subtree come first
+            positions = [STANDARD_RANK_ORDER.index(rank) for rank in ranks]
+            rank_pairs = [parent * rank_count + child for parent, child in zip(positions, positions[1:])] # See SimilarityBreakdown
+            above_count = sum(1 for child in positions[1:] if child < subtree_position)
+            shape = shapes[ranks] = (rank_pairs, ranks.index(subtree_rank) if subtree_rank in ranks else None, above_count)
+        rank_pairs, subtree_index, above_count = shape
+        subtree = subtree_id(current_lineage[subtree_index][1]) if subtree_index is not None else no_subtree
+        add_edges(edges, rank_pairs, [above_subtree] * above_count + [subtree] * (len(edges) - above_count))
+
+    return all_edges.build()
+
+def edge_subtree_label(subtree_rank, above=False):
+    """
+    Label of the edges outside any `subtree_rank` subtree in the breakdown: those above
+    the subtree rank (e.g. class -> order is inside its order, phylum -> class is
+    "(above order)"), and those of lineages without that rank ("(no order)").
+    """
+    return f"(above {subtree_rank})" if above else f"(no {subtree_rank})"
 
 def calculate_jaccard_index(set1, set2):
     """Calculates the Jaccard index between two sets."""
     intersection = len(set1.intersection(set2))
-    union = len(set1.union(set2))
+    union = len(set1) + len(set2) - intersection
     
     if union == 0:
         return 1.0 # Both sets are empty, considered perfectly similar
     return intersection / union
 
-def write_edges_to_file(edges_set, filename):
-    """Writes a set of lineage edges to a specified file, one edge per line."""
+class EdgeComparison:
+    """
+    The result of comparing the NEON HQ and Biorepo EdgeSets.
+    Each set operation is computed exactly once: the intersection and the two
+    differences are stored (packed, and decoded in sorted order), while the union
+    and the per-taxonomy edge lists are derived from those three disjoint parts.
+    """
+    def __init__(self, neonhq_edges, biorepo_edges, edge_index):
+        self.edge_index = edge_index
+        self.intersection = neonhq_edges.intersection(biorepo_edges)
+        self.unique_to_neonhq = neonhq_edges.difference(self.intersection)
+        self.unique_to_biorepo = biorepo_edges.difference(self.intersection)
+
+        self.intersection_count = len(self.intersection)
+        self.neonhq_count = len(neonhq_edges)
+        self.biorepo_count = len(biorepo_edges)
+        self.union_count = self.neonhq_count + self.unique_to_biorepo_count
+
+        # Decoded edge tuples, sorted as the edge files and report list them
+        self.sorted_intersection = edge_index.decode_sorted(self.intersection)
+        self.sorted_unique_to_neonhq = edge_index.decode_sorted(self.unique_to_neonhq)
+        self.sorted_unique_to_biorepo = edge_index.decode_sorted(self.unique_to_biorepo)
+
+    @property
+    def unique_to_neonhq_count(self):
+        return self.neonhq_count - self.intersection_count
+
+    @property
+    def unique_to_biorepo_count(self):
+        return self.biorepo_count - self.intersection_count
+
+    @property
+    def jaccard_index(self):
+        if self.union_count == 0:
+            return 1.0 # Both sets are empty, considered perfectly similar
+        return self.intersection_count / self.union_count
+
+    @property
+    def neonhq_match_rate(self):
+        return self.intersection_count / self.neonhq_count if self.neonhq_count > 0 else 0.0
+
+    @property
+    def biorepo_match_rate(self):
+        return self.intersection_count / self.biorepo_count if self.biorepo_count > 0 else 0.0
+
+    def sorted_neonhq_edges(self):
+        return heapq.merge(self.sorted_intersection, self.sorted_unique_to_neonhq)
+
+    def sorted_biorepo_edges(self):
+        return heapq.merge(self.sorted_intersection, self.sorted_unique_to_biorepo)
+
+    def sorted_union_edges(self):
+        return heapq.merge(self.sorted_intersection, self.sorted_unique_to_neonhq, self.sorted_unique_to_biorepo)
+
+    def sorted_edge_set(self, name):
+        """Returns the sorted edge tuples of one of the EDGE_SET_VIEWS by name."""
+        return {
+            'union': self.sorted_union_edges,
+            'intersection': lambda: self.sorted_intersection,
+            'neonhq': self.sorted_neonhq_edges,
+            'biorepo': self.sorted_biorepo_edges,
+            'unique_to_neonhq': lambda: self.sorted_unique_to_neonhq,
+            'unique_to_biorepo': lambda: self.sorted_unique_to_biorepo
+        }[name]()
+
+    def sorted_flagged_edges(self):
+        """Yields (edge, in_neonhq, in_biorepo) for every edge of the union, sorted by edge."""
+        return heapq.merge(((edge, 1, 1) for edge in self.sorted_intersection),
+                           ((edge, 1, 0) for edge in self.sorted_unique_to_neonhq),
+                           ((edge, 0, 1) for edge in self.sorted_unique_to_biorepo))
+
+    def metrics(self):
+        """The metrics dictionary returned by compare_taxonomies (and read by the summary)."""
+        return {
+            'jaccard_index': self.jaccard_index,
+            'neonhq_match_rate': self.neonhq_match_rate,
+            'biorepo_match_rate': self.biorepo_match_rate
+        }
+
+def _count_values(counter, values):
+    """Adds the number of occurrences of each value of the integer array `values` to `counter`."""
+    values, counts = np.unique(values, return_counts=True)
+    counter.update(dict(zip(values.tolist(), counts.tolist())))
+
+class SimilarityBreakdown:
+    """
+    Similarity counts per canonical rank pair and per `subtree_rank` subtree, filled by
+    extract_lineage_edges as each chunk of new edges is found (see EdgeSetBuilder), so
+    no edge -> group map is kept. Rank pairs are counted by id, parent_position *
+    len(STANDARD_RANK_ORDER) + child_position.
+    NEON HQ is extracted first and keeps the subtree id of each of its edges (see
+    EdgeSet.subtrees); set `neonhq_edges` to its EdgeSet before extracting Biorepo.
+    Each Biorepo edge that NEON HQ also has is then counted as common, under the
+    NEON HQ subtree: common edges are attributed as in NEON HQ.
+    """
+    SOURCES = ('neonhq', 'biorepo', 'common')
+
+    def __init__(self, subtree_rank):
+        self.subtree_rank = subtree_rank
+        self.subtree_ids = {}     # {subtree label: subtree id}
+        self.subtree_labels = []  # [subtree label], indexed by subtree id
+        self.neonhq_edges = None
+        self.rank_pair_counts = {source: Counter() for source in self.SOURCES} # {rank pair id: edges}
+        self.subtree_counts = {source: Counter() for source in self.SOURCES}   # {subtree id: edges}
+
+    def subtree_id(self, label):
+        subtree_id = self.subtree_ids.get(label)
+        if subtree_id is None:
+            subtree_id = len(self.subtree_labels)
+            self.subtree_ids[label] = subtree_id
+            self.subtree_labels.append(label)
+        return subtree_id
+
+    def keeps_subtrees(self, taxonomy_type):
+        """Whether the edges of `taxonomy_type` keep their subtree id, for attributing common edges."""
+        return taxonomy_type == 'neonhq'
+
+    def counter(self, taxonomy_type):
+        """
+        Returns the callable counting the new (edges, rank pair ids, subtree ids) arrays
+        of `taxonomy_type`, as EdgeSetBuilder's `count_new_edges`.
+        """
+        rank_pair_counts = self.rank_pair_counts[taxonomy_type]
+        subtree_counts = self.subtree_counts[taxonomy_type]
+        if taxonomy_type == 'neonhq':
+            def count_edges(edges, rank_pairs, subtrees):
+                _count_values(rank_pair_counts, rank_pairs)
+                _count_values(subtree_counts, subtrees)
+            return count_edges
+
+        neonhq_edges = self.neonhq_edges if self.neonhq_edges is not None else EdgeSet()
+        common_rank_pair_counts = self.rank_pair_counts['common']
+        common_subtree_counts = self.subtree_counts['common']
+        def count_edges(edges, rank_pairs, subtrees):
+            positions, is_common = _find_sorted(neonhq_edges.edges, edges)
+            if is_common.any():
+                subtrees = np.where(is_common, neonhq_edges.subtrees[positions], subtrees)
+                _count_values(common_rank_pair_counts, rank_pairs[is_common])
+                _count_values(common_subtree_counts, subtrees[is_common])
+            _count_values(rank_pair_counts, rank_pairs)
+            _count_values(subtree_counts, subtrees)
+        return count_edges
+
+    def _counts(self, counters, key):
+        return tuple(counters[source][key] for source in self.SOURCES)
+
+    def rank_pairs(self):
+        """Returns {'parent -> child': (neonhq_edges, biorepo_edges, common_edges)}, in STANDARD_RANK_ORDER."""
+        pair_ids = set(self.rank_pair_counts['neonhq']) | set(self.rank_pair_counts['biorepo'])
+        rank_pairs = {}
+        for pair_id in sorted(pair_ids):
+            parent_position, child_position = divmod(pair_id, len(STANDARD_RANK_ORDER))
+            key = f"{STANDARD_RANK_ORDER[parent_position]} -> {STANDARD_RANK_ORDER[child_position]}"
+            rank_pairs[key] = self._counts(self.rank_pair_counts, pair_id)
+        return rank_pairs
+
+    def subtrees(self):
+        """Returns {subtree: (neonhq_edges, biorepo_edges, common_edges)}, sorted by subtree."""
+        subtree_ids = set(self.subtree_counts['neonhq']) | set(self.subtree_counts['biorepo'])
+        return {self.subtree_labels[subtree_id]: self._counts(self.subtree_counts, subtree_id)
+                for subtree_id in sorted(subtree_ids, key=self.subtree_labels.__getitem__)}
+
+def breakdown_metrics(neonhq_edges, biorepo_edges, common_edges):
+    """Returns (union_edges, jaccard_index, neonhq_match_rate, biorepo_match_rate) for breakdown counts."""
+    union_edges = neonhq_edges + biorepo_edges - common_edges
+    jaccard_index = common_edges / union_edges if union_edges > 0 else 1.0
+    neonhq_match_rate = common_edges / neonhq_edges if neonhq_edges > 0 else 0.0
+    biorepo_match_rate = common_edges / biorepo_edges if biorepo_edges > 0 else 0.0
+    return union_edges, jaccard_index, neonhq_match_rate, biorepo_match_rate
+
+def format_breakdown_line(key, counts):
+    """Formats one breakdown group as a report line."""
+    neonhq_edges, biorepo_edges, common_edges = counts
+    union_edges, jaccard_index, neonhq_match_rate, biorepo_match_rate = breakdown_metrics(*counts)
+    return (f"  {key}: Jaccard {jaccard_index:.4f} ({common_edges}/{union_edges}), "
+            f"NEON HQ matched {neonhq_match_rate:.4f} ({common_edges}/{neonhq_edges}), "
+            f"Biorepo matched {biorepo_match_rate:.4f} ({common_edges}/{biorepo_edges})\n")
+
+def write_breakdown(filename, breakdowns):
+    """
+    Writes the similarity breakdowns, a list of (breakdown name, {key: counts}) pairs,
+    to a CSV file with BREAKDOWN_FIELDNAMES columns.
+    """
+    try:
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=BREAKDOWN_FIELDNAMES)
+            writer.writeheader()
+            for breakdown, group_counts in breakdowns:
+                for key, (neonhq_edges, biorepo_edges, common_edges) in group_counts.items():
+                    union_edges, jaccard_index, neonhq_match_rate, biorepo_match_rate = \
+                        breakdown_metrics(neonhq_edges, biorepo_edges, common_edges)
+                    writer.writerow({
+                        'breakdown': breakdown,
+                        'key': key,
+                        'neonhq_edges': neonhq_edges,
+                        'biorepo_edges': biorepo_edges,
+                        'common_edges': common_edges,
+                        'union_edges': union_edges,
+                        'jaccard_index': f"{jaccard_index:.4f}",
+                        'neonhq_match_rate': f"{neonhq_match_rate:.4f}",
+                        'biorepo_match_rate': f"{biorepo_match_rate:.4f}"
+                    })
+        print(f"Similarity breakdown written to: {filename}")
+    except Exception as e:
+        print(f"Error writing similarity breakdown to {filename}: {e}", file=sys.stderr)
+
+def write_edges_to_file(sorted_edges, filename):
+    """
+    Writes lineage edge tuples to a specified file, one edge per line.
+    Edges are written in the order given; pass them sorted for consistent output.
+    """
     try:
         with open(filename, 'w', encoding='utf-8') as f:
-            for edge in sorted(list(edges_set)): # Sort for consistent output
+            for edge in sorted_edges:
                 f.write(f"{edge}\n")
         print(f"Edges written to: {filename}")
     except Exception as e:
         print(f"Error writing edges to {filename}: {e}", file=sys.stderr)
 
-def compare_taxonomies(group_code, neonhq_path, biorepo_path, output_path):
+def write_edge_table(comparison, filename):
+    """
+    Writes every edge of an EdgeComparison to one tab-separated table with
+    in_neonhq/in_biorepo membership flags (see EDGE_TABLE_FIELDNAMES), sorted by edge.
+    """
+    try:
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            writer.writerow(EDGE_TABLE_FIELDNAMES)
+            for edge, in_neonhq, in_biorepo in comparison.sorted_flagged_edges():
+                writer.writerow(edge + (in_neonhq, in_biorepo))
+        print(f"Edge table written to: {filename}")
+    except Exception as e:
+        print(f"Error writing edge table to {filename}: {e}", file=sys.stderr)
+
+def iter_edge_table(filename):
+    """Yields (edge, in_neonhq, in_biorepo) from an edge table written by write_edge_table."""
+    with open(filename, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f, delimiter='\t')
+        header = next(reader, None)
+        if header != EDGE_TABLE_FIELDNAMES:
+            raise ValueError(f"'{filename}' is not an edge table. Expected columns: {EDGE_TABLE_FIELDNAMES}")
+        for parent_rank, parent_name, child_rank, child_name, in_neonhq, in_biorepo in reader:
+            yield (parent_rank, parent_name, child_rank, child_name), in_neonhq == '1', in_biorepo == '1'
+
+def load_edge_table(filename, view='union'):
+    """
+    Reads one edge set back from an edge table, e.g. view='unique_to_biorepo'.
+    Returns the sorted list of (parent_rank, parent_name, child_rank, child_name)
+    tuples, the same edges as the matching "<report base>_<view>_edges.txt" file.
+    """
+    if view not in EDGE_SET_VIEWS:
+        raise ValueError(f"Unknown edge set view: {view}. Expected one of {list(EDGE_SET_VIEWS)}.")
+    in_view = EDGE_SET_VIEWS[view]
+    return [edge for edge, in_neonhq, in_biorepo in iter_edge_table(filename) if in_view(in_neonhq, in_biorepo)]
+
+def default_run_id():
+    """Run ID of snapshots saved without --run-id: today's date, as nightly runs are keyed."""
+    return time.strftime('%Y-%m-%d')
+
+# First line of the binary edge snapshots written by save_run_snapshot
+SNAPSHOT_MAGIC = b'NEON-EDGE-SNAPSHOT 1\n'
+
+def run_snapshot_path(snapshot_dir, run_id, group_code):
+    """Returns the snapshot file of one group's edges saved by run `run_id`."""
+    return os.path.join(snapshot_dir, run_id, f"{group_code}.edges.bin")
+
+def save_run_snapshot(snapshot_dir, run_id, group_code, edge_index, neonhq_edges, biorepo_edges, counts):
+    """
+    Saves the EdgeSets of this run in the snapshot store, for later --since comparisons,
+    with the (neonhq_edges, biorepo_edges, common_edges) `counts`. The file holds
+    SNAPSHOT_MAGIC, a JSON header line with the counts and the (rank, name) nodes the
+    edges refer to, then both sorted edge arrays as little-endian 64-bit integers.
+    Node ids are renumbered to the nodes the edges use, in id order, so the packed
+    edges stay sorted and nodes of earlier runs are not carried over.
+    """
+    node_id_bits = EdgeIndex.NODE_ID_BITS
+    node_id_mask = EdgeIndex.NODE_ID_MASK
+    arrays = [neonhq_edges.edges, biorepo_edges.edges]
+    used = np.zeros(len(edge_index.nodes), dtype=bool)
+    for edges in arrays:
+        used[edges >> node_id_bits] = True
+        used[edges & node_id_mask] = True
+    nodes = [node for node, is_used in zip(edge_index.nodes, used.tolist()) if is_used]
+    if len(nodes) < len(edge_index.nodes):
+        new_ids = np.cumsum(used, dtype=np.int64) - 1
+        arrays = [(new_ids[edges >> node_id_bits] << node_id_bits) | new_ids[edges & node_id_mask]
+                  for edges in arrays]
+
+    header = {
+        'run_id': run_id,
+        'group_code': group_code,
+        'neonhq_edges': counts[0],
+        'biorepo_edges': counts[1],
+        'common_edges': counts[2],
+        'nodes': nodes
+    }
+    snapshot_path = run_snapshot_path(snapshot_dir, run_id, group_code)
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+        for edges in arrays:
+            f.write(edges.astype('<i8').tobytes())
+    os.replace(tmp_path, snapshot_path)
+
+def load_run_snapshot(snapshot_dir, run_id, group_code, edge_index):
+    """
+    Loads one group's edges saved by run `run_id`, packed with `edge_index`.
+    Load snapshots into an empty EdgeIndex (before extracting this run's edges), so the
+    stored nodes keep their ids and the stored arrays are used as they are.
+    Returns (NEON HQ EdgeSet, Biorepo EdgeSet, stored counts), or (None, None, None) if missing.
+    """
+    snapshot_path = run_snapshot_path(snapshot_dir, run_id, group_code)
+    if not os.path.exists(snapshot_path):
+        print(f"Error: No snapshot of group '{group_code}' for run '{run_id}' in {snapshot_dir}", file=sys.stderr)
+        return None, None, None
+    with open(snapshot_path, 'rb') as f:
+        if f.readline() != SNAPSHOT_MAGIC:
+            raise ValueError(f"'{snapshot_path}' is not an edge snapshot.")
+        header = json.loads(f.readline())
+        arrays = []
+        for count_key in ('neonhq_edges', 'biorepo_edges'):
+            count = header[count_key]
+            data = f.read(count * 8)
+            if len(data) != count * 8:
+                raise ValueError(f"'{snapshot_path}' is truncated.")
+            arrays.append(np.frombuffer(data, dtype='<i8').astype(np.int64))
+
+    node_ids = [edge_index.node_id(rank, name) for rank, name in header['nodes']]
+    if node_ids != list(range(len(node_ids))):
+        node_id_bits = EdgeIndex.NODE_ID_BITS
+        node_id_mask = EdgeIndex.NODE_ID_MASK
+        new_ids = np.array(node_ids, dtype=np.int64)
+        arrays = [np.sort((new_ids[edges >> node_id_bits] << node_id_bits) | new_ids[edges & node_id_mask])
+                  for edges in arrays]
+    counts = {key: header[key] for key in ('run_id', 'group_code', 'neonhq_edges', 'biorepo_edges', 'common_edges')}
+    return EdgeSet(arrays[0]), EdgeSet(arrays[1]), counts
+
+def write_edge_changes(filename, edge_index, changes):
+    """
+    Writes the changed edges of a --since comparison, a list of
+    (source, change, packed edges) tuples, to a tab-separated table.
+    """
+    try:
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            writer.writerow(['source', 'change'] + EDGE_TABLE_FIELDNAMES[:4])
+            for source, change, edges in changes:
+                for edge in edge_index.decode_sorted(edges):
+                    writer.writerow((source, change) + edge)
+        print(f"Changed edges written to: {filename}")
+    except Exception as e:
+        print(f"Error writing changed edges to {filename}: {e}", file=sys.stderr)
+
+def compare_since(group_code, output_path, edge_index, t1_edges, t2_edges, previous_snapshot, since_run):
+    """
+    Compares this run's packed NEON HQ and Biorepo edges with those saved by run `since_run`,
+    given as the `previous_snapshot` returned by load_run_snapshot.
+    Only the added and removed edges of each source are computed; the Jaccard index is
+    updated from the stored counts by checking the changed edges alone. Writes a change
+    report and a table of the changed edges (see since_output_paths) instead of the
+    edge files. Returns the metrics of this run and its (neonhq_edges, biorepo_edges,
+    common_edges) counts, as save_run_snapshot takes them.
+    """
+    previous_t1_edges, previous_t2_edges, previous_counts = previous_snapshot
+
+    added_t1 = t1_edges.difference(previous_t1_edges)
+    removed_t1 = previous_t1_edges.difference(t1_edges)
+    added_t2 = t2_edges.difference(previous_t2_edges)
+    removed_t2 = previous_t2_edges.difference(t2_edges)
+
+    # An edge can only enter or leave the intersection if it changed in one of the sources
+    changed = added_t1.union(removed_t1).union(added_t2).union(removed_t2).edges
+    common_delta = (int(np.count_nonzero(t1_edges.contains(changed) & t2_edges.contains(changed)))
+                    - int(np.count_nonzero(previous_t1_edges.contains(changed) & previous_t2_edges.contains(changed))))
+
+    previous = (previous_counts['neonhq_edges'], previous_counts['biorepo_edges'], previous_counts['common_edges'])
+    current = (previous[0] + len(added_t1) - len(removed_t1),
+               previous[1] + len(added_t2) - len(removed_t2),
+               previous[2] + common_delta)
+    previous_union, previous_jaccard, _, _ = breakdown_metrics(*previous)
+    current_union, current_jaccard, neonhq_match_rate, biorepo_match_rate = breakdown_metrics(*current)
+
+    report_path, changes_path = since_output_paths(output_path, since_run)
+    report_lines = []
+    report_lines.append(f"Changes Since Run {since_run} for Group: {group_code}\n")
+    report_lines.append("--- Lineage Edge Comparison (Jaccard Index) ---\n")
+    report_lines.append(f"Jaccard Index in run {since_run}: {previous_jaccard:.4f} ({previous[2]}/{previous_union})\n")
+    report_lines.append(f"Jaccard Index now: {current_jaccard:.4f} ({current[2]}/{current_union})\n")
+    report_lines.append(f"Change: {current_jaccard - previous_jaccard:+.4f}\n")
+    report_lines.append(f"NEON HQ Edges Matched Rate now: {neonhq_match_rate:.4f} ({current[2]}/{current[0]})\n")
+    report_lines.append(f"Biorepo Edges Matched Rate now: {biorepo_match_rate:.4f} ({current[2]}/{current[1]})\n")
+
+    report_lines.append("\n--- Edge Counts ---\n")
+    report_lines.append(f"NEON HQ edges: {previous[0]} -> {current[0]} (+{len(added_t1)} / -{len(removed_t1)})\n")
+    report_lines.append(f"Biorepo edges: {previous[1]} -> {current[1]} (+{len(added_t2)} / -{len(removed_t2)})\n")
+    report_lines.append(f"Common edges: {previous[2]} -> {current[2]} ({common_delta:+d})\n")
+
+    changes = [('neonhq', 'added', added_t1), ('neonhq', 'removed', removed_t1),
+               ('biorepo', 'added', added_t2), ('biorepo', 'removed', removed_t2)]
+    MAX_EDGE_EXAMPLES = 10
+    for source, change, edges in changes:
+        if not edges:
+            continue
+        source_name = 'NEON HQ' if source == 'neonhq' else 'Biorepo'
+        report_lines.append(f"\n--- Edges {change.capitalize()} in {source_name} Taxonomy "
+                            f"(Top {min(MAX_EDGE_EXAMPLES, len(edges))} of {len(edges)}) ---\n")
+        for i, edge in enumerate(edge_index.decode_sorted(edges)[:MAX_EDGE_EXAMPLES]):
+            report_lines.append(f"  {i+1}. {edge}\n")
+
+    with open(report_path, 'w', encoding='utf-8', newline='') as f:
+        f.writelines(report_lines)
+    print(f"Change report saved to: {report_path}")
+    write_edge_changes(changes_path, edge_index, changes)
+
+    metrics = {
+        'jaccard_index': current_jaccard,
+        'neonhq_match_rate': neonhq_match_rate,
+        'biorepo_match_rate': biorepo_match_rate
+    }
+    return metrics, current
+
+def compare_taxonomies(group_code, neonhq_path, biorepo_path, output_path, edge_format='txt',
+                       breakdown_rank=DEFAULT_BREAKDOWN_RANK, snapshot_dir=None, run_id=None, since_run=None,
+                       edge_loader=load_lineage_edges):
     """
     Compares two taxonomy CSV files for a given group, generates a detailed report
     and various edge set files, and returns a dictionary of calculated metrics.
+    `edge_format` selects the edge files written (see EDGE_FORMATS and edge_output_paths).
+    Unless `breakdown_rank` is None, similarity is also broken down per rank pair and per
+    `breakdown_rank` subtree, in the report and in a breakdown CSV (see breakdown_output_path).
+    If `snapshot_dir` is given, this run's edges are saved there under `run_id` (default:
+    today's date). With `since_run`, only the changes since that saved run are computed and
+    reported (see compare_since); the full report, edge files and breakdown are not rewritten.
+    `edge_loader` reads each taxonomy's edges, with the signature of load_lineage_edges; pass
+    another loader (e.g. TaxonomyStore.load_lineage_edges) to read them from elsewhere, in which
+    case `neonhq_path` and `biorepo_path` only name the taxonomies in the report.
     Returns None if there's a critical error preventing comparison.
     """
+    if since_run:
+        breakdown_rank = None # The breakdown needs the full comparison
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
     report_lines = []
     report_lines.append(f"Comparison Report for Group: {group_code}\n")
     report_lines.append("--- Overview ---\n")
 
     report_lines.append(f"Canonical Ranks used for lineage: {', '.join(STANDARD_RANK_ORDER)}\n")
     
-    # Load Taxonomy 1 (NEON HQ raw data)
+    # Both sides share one EdgeIndex, so their packed integer edges are comparable.
+    edge_index = EdgeIndex()
+    if since_run:
+        # Loaded first, so the snapshot's packed edges are used without re-encoding them
+        previous_snapshot = load_run_snapshot(snapshot_dir, since_run, group_code, edge_index)
+        if previous_snapshot[2] is None:
+            return None
+    # Breakdown counts, filled during extraction
+    breakdown = SimilarityBreakdown(breakdown_rank) if breakdown_rank else None
+
+    # Stream Taxonomy 1 (NEON HQ raw data) into its edge set, passing group_code to neonhq extraction
     report_lines.append(f"Loading NEON HQ Taxonomy from: {neonhq_path}\n")
-    t1_data, t1_fieldnames = load_taxonomy(neonhq_path, group_code, 'taxonID')
-    if t1_data is None:
+    t1_edges, t1_record_count = edge_loader(neonhq_path, group_code, SOURCE_ID_COLUMNS['neonhq'], 'neonhq', edge_index,
+                                            breakdown)
+    if t1_edges is None:
         report_lines.append("Failed to load NEON HQ Taxonomy. Aborting comparison.\n")
         with open(output_path, 'w', encoding='utf-8') as f:
             f.writelines(report_lines)
         return None # Indicate failure
-    report_lines.append(f"Total records in NEON HQ Taxonomy: {len(t1_data)}\n")
+    report_lines.append(f"Total records in NEON HQ Taxonomy: {t1_record_count}\n")
+    if breakdown:
+        breakdown.neonhq_edges = t1_edges # Biorepo edges are checked against them for common edges
 
-    # Load Taxonomy 2 (Biorepo-derived raw data)
+    # Stream Taxonomy 2 (Biorepo-derived raw data); Biorepo extraction has no group_code special handling
     report_lines.append(f"Loading Biorepo Taxonomy from: {biorepo_path}\n")
-    t2_data, t2_fieldnames = load_taxonomy(biorepo_path, group_code, 'biorepo_tid')
-    if t2_data is None:
+    t2_edges, t2_record_count = edge_loader(biorepo_path, group_code, SOURCE_ID_COLUMNS['biorepo'], 'biorepo', edge_index,
+                                            breakdown)
+    if t2_edges is None:
         report_lines.append("Failed to load Biorepo Taxonomy. Aborting comparison.\n")
         with open(output_path, 'w', encoding='utf-8') as f:
             f.writelines(report_lines)
         return None # Indicate failure
-    report_lines.append(f"Total records in Biorepo Taxonomy: {len(t2_data)}\n")
+    report_lines.append(f"Total records in Biorepo Taxonomy: {t2_record_count}\n")
 
     report_lines.append("\n--- Lineage Edge Comparison (Jaccard Index) ---\n")
-
-    # Extract edges for both taxonomies, passing group_code to neonhq extraction
-    t1_edges = extract_lineage_edges(t1_data, t1_fieldnames, 'neonhq', group_code)
     report_lines.append(f"Unique edges found in NEON HQ Taxonomy: {len(t1_edges)}\n")
-
-    t2_edges = extract_lineage_edges(t2_data, t2_fieldnames, 'biorepo') # Biorepo does not need group_code special handling
     report_lines.append(f"Unique edges found in Biorepo Taxonomy: {len(t2_edges)}\n")
 
-    # Calculate Jaccard Index
-    jaccard_index = calculate_jaccard_index(t1_edges, t2_edges)
-    report_lines.append(f"\nOverall Jaccard Index for Lineage Edges: {jaccard_index:.4f}\n")
+    if since_run:
+        metrics, counts = compare_since(group_code, output_path, edge_index, t1_edges, t2_edges,
+                                        previous_snapshot, since_run)
+        save_run_snapshot(snapshot_dir, run_id or default_run_id(), group_code, edge_index, t1_edges, t2_edges, counts)
+        return metrics
 
-    intersection_len = len(t1_edges.intersection(t2_edges))
-    t1_edges_len = len(t1_edges)
-    t2_edges_len = len(t2_edges)
+    # Compute the intersection and differences once; everything below reads from them
+    comparison = EdgeComparison(t1_edges, t2_edges, edge_index)
+    report_lines.append(f"\nOverall Jaccard Index for Lineage Edges: {comparison.jaccard_index:.4f}\n")
 
-    report_lines.append(f"Number of common edges (intersection): {intersection_len}\n")
-    report_lines.append(f"Total unique edges (union): {len(t1_edges.union(t2_edges))}\n")
+    intersection_len = comparison.intersection_count
+    t1_edges_len = comparison.neonhq_count
+    t2_edges_len = comparison.biorepo_count
 
-    # Calculate new metrics (NEON HQ matched and Biorepo matched percentages)
-    neonhq_match_rate = intersection_len / t1_edges_len if t1_edges_len > 0 else 0.0
-    biorepo_match_rate = intersection_len / t2_edges_len if t2_edges_len > 0 else 0.0
+    report_lines.append(f"Number of common edges (intersection): {intersection_len}\n")
+    report_lines.append(f"Total unique edges (union): {comparison.union_count}\n")
 
-    report_lines.append(f"NEON HQ Edges Matched Rate: {neonhq_match_rate:.4f} ({intersection_len}/{t1_edges_len})\n")
-    report_lines.append(f"Biorepo Edges Matched Rate: {biorepo_match_rate:.4f} ({intersection_len}/{t2_edges_len})\n")
+    # NEON HQ matched and Biorepo matched percentages
+    report_lines.append(f"NEON HQ Edges Matched Rate: {comparison.neonhq_match_rate:.4f} ({intersection_len}/{t1_edges_len})\n")
+    report_lines.append(f"Biorepo Edges Matched Rate: {comparison.biorepo_match_rate:.4f} ({intersection_len}/{t2_edges_len})\n")
 
 
-    # Determine base filename for edge outputs - based on output_path
-    output_dir = os.path.dirname(output_path)
-    output_basename = os.path.splitext(os.path.basename(output_path))[0]
-    
-    # Calculate difference sets
-    unique_to_neonhq = t1_edges - t2_edges
-    unique_to_biorepo = t2_edges - t1_edges
-
-    # Write each set of edges to a file
-    write_edges_to_file(t1_edges.union(t2_edges), os.path.join(output_dir, f"{output_basename}_union_edges.txt"))
-    write_edges_to_file(t1_edges.intersection(t2_edges), os.path.join(output_dir, f"{output_basename}_intersection_edges.txt"))
-    write_edges_to_file(t1_edges, os.path.join(output_dir, f"{output_basename}_neonhq_edges.txt"))
-    write_edges_to_file(t2_edges, os.path.join(output_dir, f"{output_basename}_biorepo_edges.txt"))
-    write_edges_to_file(unique_to_neonhq, os.path.join(output_dir, f"{output_basename}_unique_to_neonhq_edges.txt"))
-    write_edges_to_file(unique_to_biorepo, os.path.join(output_dir, f"{output_basename}_unique_to_biorepo_edges.txt"))
+    # Write each set of edges to a file and/or all of them to the edge table
+    if edge_format in ('txt', 'both'):
+        for name, edges_path in zip(EDGE_SET_VIEWS, edge_output_paths(output_path, 'txt')):
+            write_edges_to_file(comparison.sorted_edge_set(name), edges_path)
+    if edge_format in ('tsv', 'both'):
+        write_edge_table(comparison, edge_output_paths(output_path, 'tsv')[0])
 
     # Optionally, list some unique edges for insight (useful for debugging)
     MAX_EDGE_EXAMPLES = 10
     
-    if unique_to_neonhq:
-        report_lines.append(f"\n--- Examples of Edges Unique to NEON HQ Taxonomy (Top {min(MAX_EDGE_EXAMPLES, len(unique_to_neonhq))}) ---\n")
-        for i, edge in enumerate(list(sorted(unique_to_neonhq))[:MAX_EDGE_EXAMPLES]):
+    if comparison.unique_to_neonhq_count:
+        report_lines.append(f"\n--- Examples of Edges Unique to NEON HQ Taxonomy (Top {min(MAX_EDGE_EXAMPLES, comparison.unique_to_neonhq_count)}) ---\n")
+        for i, edge in enumerate(comparison.sorted_unique_to_neonhq[:MAX_EDGE_EXAMPLES]):
             report_lines.append(f"  {i+1}. {edge}\n")
     else:
         report_lines.append("\nNo edges found unique to NEON HQ Taxonomy.\n")
 
-    if unique_to_biorepo:
-        report_lines.append(f"\n--- Examples of Edges Unique to Biorepo Taxonomy (Top {min(MAX_EDGE_EXAMPLES, len(unique_to_biorepo))}) ---\n")
-        for i, edge in enumerate(list(sorted(unique_to_biorepo))[:MAX_EDGE_EXAMPLES]):
+    if comparison.unique_to_biorepo_count:
+        report_lines.append(f"\n--- Examples of Edges Unique to Biorepo Taxonomy (Top {min(MAX_EDGE_EXAMPLES, comparison.unique_to_biorepo_count)}) ---\n")
+        for i, edge in enumerate(comparison.sorted_unique_to_biorepo[:MAX_EDGE_EXAMPLES]):
             report_lines.append(f"  {i+1}. {edge}\n")
     else:
         report_lines.append("\nNo edges found unique to Biorepo Taxonomy.\n")
 
+    # Per rank pair and per subtree similarity, for triaging where the taxonomies disagree
+    if breakdown:
+        rank_pair_counts = breakdown.rank_pairs()
+        subtree_counts = breakdown.subtrees()
+
+        report_lines.append("\n--- Similarity by Rank Pair ---\n")
+        for rank_pair, counts in rank_pair_counts.items():
+            report_lines.append(format_breakdown_line(rank_pair, counts))
+
+        # Least similar subtrees first; the breakdown CSV lists all of them
+        MAX_SUBTREE_EXAMPLES = 10
+        least_similar = sorted(subtree_counts.items(), key=lambda item: (breakdown_metrics(*item[1])[1], item[0]))
+        report_lines.append(f"\n--- Similarity by {breakdown_rank.capitalize()} "
+                            f"(Lowest {min(MAX_SUBTREE_EXAMPLES, len(least_similar))} of {len(least_similar)} by Jaccard) ---\n")
+        for subtree, counts in least_similar[:MAX_SUBTREE_EXAMPLES]:
+            report_lines.append(format_breakdown_line(subtree, counts))
+
+        write_breakdown(breakdown_output_path(output_path),
+                        [('rank_pair', rank_pair_counts), (breakdown_rank, subtree_counts)])
+
     # Write the main report to the output file
     with open(output_path, 'w', encoding='utf-8', newline='') as f:
         f.writelines(report_lines)
 
     print(f"Comparison report saved to: {output_path}")
 
+    if snapshot_dir:
+        save_run_snapshot(snapshot_dir, run_id or default_run_id(), group_code, edge_index, t1_edges, t2_edges,
+                          (comparison.neonhq_count, comparison.biorepo_count, comparison.intersection_count))
+
     # Return a dictionary of all calculated metrics
+    return comparison.metrics()
+
+def format_summary_row(group_code, comparison_results):
+    """
+    Formats the metrics returned by compare_taxonomies as a summary CSV row.
+    A `comparison_results` of None (failed comparison) is reported as 'N/A (Error)'.
+    """
+    if comparison_results is None:
+        return {
+            'group_code': group_code,
+            'jaccard_index': 'N/A (Error)',
+            'neonhq_match_rate': 'N/A (Error)',
+            'biorepo_match_rate': 'N/A (Error)'
+        }
     return {
-        'jaccard_index': jaccard_index,
-        'neonhq_match_rate': neonhq_match_rate,
-        'biorepo_match_rate': biorepo_match_rate
+        'group_code': group_code,
+        'jaccard_index': f"{comparison_results['jaccard_index']:.4f}",
+        'neonhq_match_rate': f"{comparison_results['neonhq_match_rate']:.4f}",
+        'biorepo_match_rate': f"{comparison_results['biorepo_match_rate']:.4f}"
     }
 
+def write_summary(summary_filepath, group_results):
+    """
+    Writes the whole summary CSV at once from a list of (group_code, comparison_results)
+    pairs, keeping the order of the list. The file is written to a temporary path and
+    moved into place, so readers never see a partial or interleaved summary.
+    """
+    output_dir = os.path.dirname(summary_filepath)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    tmp_path = f"{summary_filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDNAMES)
+        writer.writeheader()
+        for group_code, comparison_results in group_results:
+            writer.writerow(format_summary_row(group_code, comparison_results))
+    os.replace(tmp_path, summary_filepath)
+    print(f"Summary of {len(group_results)} groups written to: {summary_filepath}")
+
+def discover_groups(neonhq_template):
+    """
+    Returns the sorted group codes for which a file matching `neonhq_template`
+    (a path containing a '{group}' placeholder) exists.
+    """
+    prefix, suffix = neonhq_template.split('{group}', 1)
+    pattern = re.compile(re.escape(prefix) + r'(.+)' + re.escape(suffix) + r'\Z')
+    group_codes = []
+    for path in glob.glob(glob.escape(prefix) + '*' + glob.escape(suffix)):
+        match = pattern.match(path)
+        if match:
+            group_codes.append(match.group(1))
+    return sorted(group_codes)
+
+def _compare_group(group_code, neonhq_path, biorepo_path, output_path, edge_format, breakdown_rank,
+                   snapshot_dir, run_id, since_run):
+    # Isolates group failures, so one bad group does not stop a batch
+    try:
+        return compare_taxonomies(group_code, neonhq_path, biorepo_path, output_path, edge_format, breakdown_rank,
+                                  snapshot_dir, run_id, since_run)
+    except Exception as e:
+        print(f"Error: Comparison failed for group '{group_code}': {e}", file=sys.stderr)
+        return None
+
+def compare_group_batch(group_codes, neonhq_template, biorepo_template, output_template,
+                        jobs=1, edge_format='txt', summary_filepath=None,
+                        breakdown_rank=DEFAULT_BREAKDOWN_RANK, snapshot_dir=None, run_id=None, since_run=None):
+    """
+    Compares several groups in one process, or across `jobs` worker processes.
+    The remaining options are passed to compare_taxonomies for every group.
+    The templates are paths containing a '{group}' placeholder, which is replaced
+    by each group code. Returns [(group_code, metrics or None)] in the order of
+    `group_codes`, and writes them with write_summary if `summary_filepath` is given.
+    """
+    group_args = [(group_code,
+                   neonhq_template.replace('{group}', group_code),
+                   biorepo_template.replace('{group}', group_code),
+                   output_template.replace('{group}', group_code),
+                   edge_format,
+                   breakdown_rank,
+                   snapshot_dir,
+                   run_id or default_run_id(),
+                   since_run)
+                  for group_code in group_codes]
+
+    if jobs > 1 and len(group_args) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_compare_group, *args) for args in group_args]
+            group_results = list(zip(group_codes, (future.result() for future in futures)))
+    else:
+        group_results = [(args[0], _compare_group(*args)) for args in group_args]
+
+    if summary_filepath:
+        write_summary(summary_filepath, group_results)
+    return group_results
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Compares two taxonomy CSV files (NEON HQ raw vs. biorepo-generated raw) "
                     "by calculating a Jaccard Index on their unique lineage edges based on CSV headers."
     )
-    parser.add_argument(
+    group_args = parser.add_mutually_exclusive_group(required=True)
+    group_args.add_argument(
         "--group",
         type=str,
-        required=True,
         help="Taxon group code (e.g., ALGAE, HERPS) for reporting purposes and group-specific parsing rules."
     )
+    group_args.add_argument(
+        "--groups",
+        type=str,
+        help="Comma-separated taxon group codes (e.g., ALGAE,BEETLE,TICK) to compare in a single run. "
+             "--neonhq, --biorepo and --output must then contain a '{group}' placeholder, and "
+             "--summary-output is written once, after all groups, in the order given."
+    )
+    group_args.add_argument(
+        "--all-groups",
+        action="store_true",
+        help="Like --groups, for every group that has a file matching the --neonhq '{group}' template."
+    )
     parser.add_argument(
         "--neonhq",
         type=str,
@@ -377,13 +1288,92 @@ if __name__ == "__main__":
         required=True,
         help="Path to the output comparison report (.txt) file. Additional files for edge sets will be created alongside this."
     )
+    parser.add_argument(
+        "--edge-format",
+        choices=EDGE_FORMATS,
+        default='txt',
+        help="Edge files written alongside the report: 'txt' (default) writes the six *_edges.txt set files, "
+             "'tsv' writes a single *_edges.tsv table of all edges with in_neonhq/in_biorepo flags "
+             "(read back with load_edge_table), 'both' writes all of them."
+    )
+    parser.add_argument(
+        "--breakdown-rank",
+        choices=STANDARD_RANK_ORDER + ['none'],
+        default=DEFAULT_BREAKDOWN_RANK,
+        help="Rank whose taxa define the subtrees of the similarity breakdown, reported with the per rank pair "
+             f"breakdown and written to <report base>_breakdown.csv (default: {DEFAULT_BREAKDOWN_RANK}). "
+             "'none' skips the breakdown."
+    )
     parser.add_argument(
         "--summary-output",
         type=str,
         help="Optional: Path to a CSV file to append Jaccard indices and other metrics for each group. "
-             "If the file does not exist, it will be created with headers."
+             "If the file does not exist, it will be created with headers. "
+             "With --groups/--all-groups the file is rewritten atomically with one row per group."
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        type=str,
+        help="Optional: Directory of the snapshot store. Each run saves the edges of every group there, "
+             "as a binary '<snapshot-dir>/<run-id>/<GROUP>.edges.bin' file with its edge counts, for later --since comparisons."
+    )
+    parser.add_argument(
+        "--run-id",
+        type=str,
+        help="Name of this run in the snapshot store (default: today's date, e.g. 2025-06-10)."
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        metavar="RUN",
+        help="Compare with the edges saved by run RUN in --snapshot-dir: only the added and removed edges are "
+             "computed, and the Jaccard index is updated from the stored counts. Writes "
+             "<report base>_since_<RUN>.txt and <report base>_since_<RUN>_changes.tsv instead of the full report "
+             "and edge files."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of groups compared in parallel with --groups/--all-groups (default: 1)."
     )
     args = parser.parse_args()
+    breakdown_rank = None if args.breakdown_rank == 'none' else args.breakdown_rank
+    if args.since and not args.snapshot_dir:
+        parser.error("--since requires --snapshot-dir.")
+    for run_option, run_value in (('--run-id', args.run_id), ('--since', args.since)):
+        if run_value is not None and (not run_value or os.sep in run_value or run_value in ('.', '..')):
+            parser.error(f"{run_option} must be a plain name, such as a date.")
+    if args.since and args.since == (args.run_id or default_run_id()):
+        parser.error("--since must name an earlier run than this run's --run-id.")
+
+    if args.groups or args.all_groups:
+        if any('{group}' not in path for path in (args.neonhq, args.biorepo, args.output)):
+            parser.error("--neonhq, --biorepo and --output must contain a '{group}' placeholder "
+                         "when --groups or --all-groups is used.")
+        if args.jobs < 1:
+            parser.error("--jobs must be at least 1.")
+        if args.all_groups:
+            group_codes = discover_groups(args.neonhq)
+            if not group_codes:
+                parser.error(f"No files match the --neonhq template: {args.neonhq}")
+        else:
+            group_codes = [g.strip() for g in args.groups.split(',') if g.strip()]
+            if not group_codes:
+                parser.error("--groups must list at least one group code.")
+
+        group_results = compare_group_batch(group_codes, args.neonhq, args.biorepo, args.output,
+                                            jobs=args.jobs, edge_format=args.edge_format,
+                                            summary_filepath=args.summary_output,
+                                            breakdown_rank=breakdown_rank,
+                                            snapshot_dir=args.snapshot_dir,
+                                            run_id=args.run_id,
+                                            since_run=args.since)
+        failed_groups = [group_code for group_code, results in group_results if results is None]
+        if failed_groups:
+            print(f"Error: Comparison failed for: {', '.join(failed_groups)}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
 
     # Perform the comparison for the current group
     # The function now returns a dictionary of results
@@ -391,51 +1381,30 @@ if __name__ == "__main__":
         args.group,
         args.neonhq,
         args.biorepo,
-        args.output
+        args.output,
+        args.edge_format,
+        breakdown_rank,
+        args.snapshot_dir,
+        args.run_id,
+        args.since
     )
 
-    # If a summary output file is specified and comparison was successful, append the result
-    if args.summary_output and comparison_results is not None:
+    # If a summary output file is specified, append the result (or a failure row)
+    if args.summary_output:
         summary_filepath = args.summary_output
         file_exists = os.path.exists(summary_filepath)
-        
-        # Define the header for the summary CSV
-        summary_fieldnames = ['group_code', 'jaccard_index', 'neonhq_match_rate', 'biorepo_match_rate']
+        status = "" if comparison_results is not None else " (failed)"
 
         try:
             with open(summary_filepath, 'a', encoding='utf-8', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=summary_fieldnames)
+                writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDNAMES)
                 
                 # Check if the file is empty to write header
                 # Use os.stat and .st_size to check if file is truly empty
                 if not file_exists or os.stat(summary_filepath).st_size == 0:
                     writer.writeheader()
                 
-                writer.writerow({
-                    'group_code': args.group,
-                    'jaccard_index': f"{comparison_results['jaccard_index']:.4f}",
-                    'neonhq_match_rate': f"{comparison_results['neonhq_match_rate']:.4f}",
-                    'biorepo_match_rate': f"{comparison_results['biorepo_match_rate']:.4f}"
-                })
-            print(f"Metrics for {args.group} appended to summary file: {summary_filepath}")
-        except Exception as e:
-            print(f"Error appending to summary file {summary_filepath}: {e}", file=sys.stderr)
-    elif args.summary_output and comparison_results is None:
-        # If comparison failed, append a row indicating failure for all metrics
-        summary_filepath = args.summary_output
-        file_exists = os.path.exists(summary_filepath)
-        summary_fieldnames = ['group_code', 'jaccard_index', 'neonhq_match_rate', 'biorepo_match_rate']
-        try:
-            with open(summary_filepath, 'a', encoding='utf-8', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=summary_fieldnames)
-                if not file_exists or os.stat(summary_filepath).st_size == 0:
-                    writer.writeheader()
-                writer.writerow({
-                    'group_code': args.group,
-                    'jaccard_index': 'N/A (Error)',
-                    'neonhq_match_rate': 'N/A (Error)',
-                    'biorepo_match_rate': 'N/A (Error)'
-                })
-            print(f"Metrics for {args.group} (failed) appended to summary file: {summary_filepath}")
+                writer.writerow(format_summary_row(args.group, comparison_results))
+            print(f"Metrics for {args.group}{status} appended to summary file: {summary_filepath}")
         except Exception as e:
-            print(f"Error appending (failed) metrics to summary file {summary_filepath}: {e}", file=sys.stderr)
\ No newline at end of file
+            print(f"Error appending{status} metrics to summary file {summary_filepath}: {e}", file=sys.stderr)
\ No newline at end of file
@@ -6,8 +6,254 @@ import csv
 import argparse
 import sys
 import os
+import filecmp
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def download_taxonomy(group_code: str, output_path: str, api_base_url: str):
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Responses worth retrying: rate limiting and transient server-side failures
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Columns returned by the NEON taxonomy API with verbose=true, in CSV order.
+# Pages are streamed straight into a CSV with these columns; an unexpected key
+# triggers a rewrite of what has been written so far with the extra column.
+NEONHQ_VERBOSE_FIELDNAMES = [
+    'acceptedTaxonID',
+    'dwc:class',
+    'dwc:family',
+    'dwc:genus',
+    'dwc:infraspecificEpithet',
+    'dwc:kingdom',
+    'dwc:nameAccordingToID',
+    'dwc:nameAccordingToTitle',
+    'dwc:order',
+    'dwc:phylum',
+    'dwc:scientificName',
+    'dwc:scientificNameAuthorship',
+    'dwc:specificEpithet',
+    'dwc:subgenus',
+    'dwc:taxonRank',
+    'dwc:vernacularName',
+    'gbif:division',
+    'gbif:form',
+    'gbif:infraclass',
+    'gbif:infradivision',
+    'gbif:infrakingdom',
+    'gbif:infraorder',
+    'gbif:infraphylum',
+    'gbif:parvdivision',
+    'gbif:section',
+    'gbif:subclass',
+    'gbif:subdivision',
+    'gbif:subfamily',
+    'gbif:subform',
+    'gbif:subkingdom',
+    'gbif:suborder',
+    'gbif:subphylum',
+    'gbif:subsection',
+    'gbif:subspecies',
+    'gbif:subtribe',
+    'gbif:subvariety',
+    'gbif:superclass',
+    'gbif:superdivision',
+    'gbif:superfamily',
+    'gbif:superorder',
+    'gbif:superphylum',
+    'gbif:tribe',
+    'gbif:variety',
+    'speciesGroup',
+    'taxonID',
+    'taxonProtocolCategory',
+    'taxonTypeCode',
+]
+
+# How long a cached page without ETag/Last-Modified validators is reused without asking the API again
+DEFAULT_CACHE_TTL = 6 * 60 * 60
+
+def create_session(max_retries: int = 5, backoff_factor: float = 1.0, pool_size: int = 4):
+    """
+    Creates a requests Session whose pooled connections are reused across pages
+    and groups, and which retries connection errors, timeouts and the statuses in
+    RETRY_STATUS_CODES with exponential backoff (honoring Retry-After).
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def checkpoint_dir_for(output_path: str):
+    """Per-page checkpoints of a download are kept next to its output file."""
+    return f"{output_path}.partial"
+
+def _write_json_atomically(filepath, data):
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, filepath)
+
+def load_checkpoint_state(checkpoint_dir: str, start_url: str):
+    """
+    Returns the saved download state ({'start_url', 'next_url', 'pages', 'records',
+    'fieldnames', 'csv_file', 'csv_bytes', 'changed'}) if `checkpoint_dir` holds
+    checkpoints of a download of `start_url`, otherwise None.
+    """
+    state_path = os.path.join(checkpoint_dir, 'state.json')
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable download checkpoint {state_path}: {e}", file=sys.stderr)
+        return None
+    if state.get('start_url') != start_url or 'csv_bytes' not in state:
+        print(f"Warning: Ignoring download checkpoint in {checkpoint_dir} for a different request ({state.get('start_url')}).", file=sys.stderr)
+        return None
+    return state
+
+def checkpoint_csv_path(checkpoint_dir: str, state: dict):
+    """The partial CSV of a download, which gets a new name whenever it is rewritten (see save_page_checkpoint)."""
+    return os.path.join(checkpoint_dir, state.get('csv_file', 'records.csv'))
+
+def rewrite_csv_with_fieldnames(csv_path: str, output_path: str, fieldnames: list):
+    """
+    Rewrites a CSV to `output_path` under a wider header, streaming it row by row.
+    Used when a page brings a key that is not among the columns written so far.
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as infile, \
+         open(output_path, 'w', encoding='utf-8', newline='') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in csv.DictReader(infile):
+            writer.writerow(row)
+
+def save_page_checkpoint(checkpoint_dir: str, state: dict, page_records: list, next_url):
+    """
+    Appends one fetched page to the partial CSV in `checkpoint_dir` and then advances
+    the download state to `next_url`, so that an interrupted download resumes after
+    the last saved page. Only the current page is ever held in memory.
+
+    A CSV rewritten under new columns goes to a new file, which the saved state then
+    names in place of the old one. A crash before the state is saved resumes from the
+    old file and state, which still agree; the old file is only removed afterwards.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    csv_path = checkpoint_csv_path(checkpoint_dir, state)
+    replaced_csv_path = None
+
+    if page_records:
+        # Drop anything appended after the last saved state (e.g. a crash mid-page)
+        if os.path.exists(csv_path):
+            with open(csv_path, 'r+b') as f:
+                f.truncate(state['csv_bytes'])
+
+        page_keys = set()
+        for record in page_records:
+            page_keys.update(record.keys())
+        unexpected_keys = page_keys - set(state['fieldnames'])
+        if unexpected_keys:
+            print(f"Info: New columns {sorted(unexpected_keys)} in the NEON response; rewriting the {state['records']} records saved so far.")
+            state['fieldnames'] = sorted(set(state['fieldnames']) | unexpected_keys)
+            if state['csv_bytes']:
+                replaced_csv_path = csv_path
+                state['csv_file'] = f"records.{state['pages'] + 1}.csv"
+                csv_path = checkpoint_csv_path(checkpoint_dir, state)
+                rewrite_csv_with_fieldnames(replaced_csv_path, csv_path, state['fieldnames'])
+
+        with open(csv_path, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=state['fieldnames'])
+            if not state['csv_bytes']:
+                writer.writeheader()
+            writer.writerows(page_records)
+        state['csv_bytes'] = os.path.getsize(csv_path)
+
+    state['pages'] += 1
+    state['records'] += len(page_records)
+    state['next_url'] = next_url
+    _write_json_atomically(os.path.join(checkpoint_dir, 'state.json'), state)
+    if replaced_csv_path is not None:
+        os.remove(replaced_csv_path)
+
+def remove_checkpoints(checkpoint_dir: str):
+    if not os.path.isdir(checkpoint_dir):
+        return
+    for name in os.listdir(checkpoint_dir):
+        os.remove(os.path.join(checkpoint_dir, name))
+    os.rmdir(checkpoint_dir)
+
+def default_http_cache_dir(output_path: str):
+    """Cached API responses are kept in '.http_cache' next to the downloaded CSVs."""
+    return os.path.join(os.path.dirname(os.path.abspath(output_path)), '.http_cache')
+
+def fetch_page(session, url: str, http_cache_dir=None, cache_ttl: float = DEFAULT_CACHE_TTL):
+    """
+    Fetches one page of the API as parsed JSON. Returns (page_data, changed).
+
+    With an `http_cache_dir`, responses are cached per URL. A cached page is
+    revalidated with If-None-Match/If-Modified-Since when the API sent an ETag or
+    Last-Modified header (a 304 reuses the cached body and leaves the cache file as it is);
+    without validators it is reused as is for `cache_ttl` seconds. `changed` is False when
+    the cached body was used.
+    """
+    cache_path = None
+    cache_entry = None
+    if http_cache_dir:
+        cache_path = os.path.join(http_cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    cache_entry = json.load(f)
+            except (OSError, ValueError):
+                cache_entry = None
+        if cache_entry and cache_entry.get('url') != url:
+            cache_entry = None
+
+    headers = {}
+    if cache_entry:
+        if cache_entry.get('etag'):
+            headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry.get('last_modified'):
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+        if not headers and time.time() - cache_entry.get('fetched_at', 0) < cache_ttl:
+            return cache_entry['body'], False
+
+    response = session.get(url, headers=headers, timeout=60) # Increased timeout to 60 seconds; retries are handled by the session
+
+    if response.status_code == 304 and cache_entry:
+        # Entries with validators are always revalidated, so there is nothing to refresh
+        return cache_entry['body'], False
+
+    response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
+    page_data = response.json()
+
+    if cache_path:
+        os.makedirs(http_cache_dir, exist_ok=True)
+        _write_json_atomically(cache_path, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+            'body': page_data
+        })
+    return page_data, True
+
+def download_taxonomy(group_code: str, output_path: str, api_base_url: str, session=None, resume=True,
+                      http_cache_dir=None, cache_ttl: float = DEFAULT_CACHE_TTL):
     """
     Downloads all taxonomy data for a specific group from the NEON API,
     handling pagination, and saves it as a CSV file.
@@ -17,24 +263,46 @@ def download_taxonomy(group_code: str, output_path: str, api_base_url: str):
         output_path (str): The file path where the CSV data will be saved.
                            Expected to be like 'data/01_downloaded_neonhq/GROUP.csv'.
         api_base_url (str): The base URL for the NEON taxonomy API.
+        session (requests.Session): Optional session to reuse (see create_session).
+                                    A new one is created if not given.
+        resume (bool): Resume from the checkpoints of an earlier, interrupted download
+                       of the same request. If False, existing checkpoints are discarded.
+        http_cache_dir (str): Optional directory for conditional-request caching of
+                              API responses (see fetch_page).
+        cache_ttl (float): Seconds to reuse cached pages that have no validators.
+
+    Every page is streamed into a partial CSV in '<output_path>.partial/' as soon as it
+    is fetched, using the NEONHQ_VERBOSE_FIELDNAMES columns (plus any unexpected keys),
+    and checkpointed together with the URL of the next page. Once the last page is in,
+    the partial CSV becomes the output and the checkpoints are removed.
+    If no page changed since it was cached, or the assembled CSV is identical to the
+    existing one, the existing CSV is left untouched (including its mtime).
     """
-    all_records = []
-    next_page_url = f"{api_base_url}?taxonTypeCode={group_code}&verbose=true&limit=1000" # Start with limit=100
+    if session is None:
+        session = create_session()
+
+    start_url = f"{api_base_url}?taxonTypeCode={group_code}&verbose=true&limit=1000" # Start with limit=100
+    checkpoint_dir = checkpoint_dir_for(output_path)
+
+    state = load_checkpoint_state(checkpoint_dir, start_url) if resume else None
+    if state is None:
+        remove_checkpoints(checkpoint_dir)
+        state = {'start_url': start_url, 'next_url': start_url, 'pages': 0, 'records': 0, 'changed': False,
+                 'fieldnames': list(NEONHQ_VERBOSE_FIELDNAMES), 'csv_bytes': 0}
+        print(f"Starting download for group '{group_code}'...")
+    else:
+        print(f"Resuming download for group '{group_code}' after {state['pages']} checkpointed pages ({state['records']} records)...")
 
-    print(f"Starting download for group '{group_code}'...")
+    next_page_url = state['next_url']
 
     try:
         while next_page_url:
             print(f"Fetching page from: {next_page_url}")
-            response = requests.get(next_page_url, timeout=60) # Increased timeout to 60 seconds
-            response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
+            page_data, page_changed = fetch_page(session, next_page_url, http_cache_dir, cache_ttl)
+            if page_changed:
+                state['changed'] = True
 
-            page_data = response.json()
-
-            # Extend the list with records from the current page
-            if 'data' in page_data and isinstance(page_data['data'], list):
-                all_records.extend(page_data['data'])
-            else:
+            if not ('data' in page_data and isinstance(page_data['data'], list)):
                 print(f"Warning: 'data' key not found or not a list in response for {group_code} from {next_page_url}", file=sys.stderr)
                 break # Stop if data format is unexpected
 
@@ -43,35 +311,42 @@ def download_taxonomy(group_code: str, output_path: str, api_base_url: str):
             if next_page_url == "": # API might return empty string instead of null for last page
                 next_page_url = None
 
-        if not all_records:
+            # Checkpoint the records of the current page
+            save_page_checkpoint(checkpoint_dir, state, page_data['data'], next_page_url)
+
+        if not state.get('changed', True) and os.path.exists(output_path):
+            remove_checkpoints(checkpoint_dir)
+            print(f"NEON taxonomy for '{group_code}' is unchanged since the cached responses; left {output_path} untouched.")
+            return
+
+        if not state['records']:
             print(f"No records found for group '{group_code}'. Output file will be empty.", file=sys.stderr)
             # Create an empty file to satisfy Makefile dependency
             output_dir = os.path.dirname(output_path)
             if output_dir and not os.path.exists(output_dir):
                 os.makedirs(output_dir)
-            with open(output_path, 'w', encoding='utf-8', newline='') as f:
-                pass # Create empty file
+            if not os.path.exists(output_path) or os.path.getsize(output_path) > 0:
+                with open(output_path, 'w', encoding='utf-8', newline='') as f:
+                    pass # Create empty file
+            remove_checkpoints(checkpoint_dir)
             return
 
-        # Prepare for CSV writing
-        # Get all unique field names from all records to use as CSV headers
-        fieldnames = set()
-        for record in all_records:
-            fieldnames.update(record.keys())
-        # Convert set to list for consistent order, could sort if desired
-        fieldnames = sorted(list(fieldnames))
-
         # Ensure the output directory exists
         output_dir = os.path.dirname(output_path)
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        with open(output_path, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(all_records)
+        tmp_output_path = f"{output_path}.tmp"
+        os.replace(checkpoint_csv_path(checkpoint_dir, state), tmp_output_path)
+        remove_checkpoints(checkpoint_dir)
+
+        if os.path.exists(output_path) and filecmp.cmp(tmp_output_path, output_path, shallow=False):
+            os.remove(tmp_output_path)
+            print(f"NEON taxonomy for '{group_code}' is unchanged ({state['records']} records); left {output_path} untouched.")
+            return
+        os.replace(tmp_output_path, output_path)
 
-        print(f"Successfully downloaded and saved {len(all_records)} records for '{group_code}' to: {output_path}")
+        print(f"Successfully downloaded and saved {state['records']} records for '{group_code}' to: {output_path}")
 
     except requests.exceptions.HTTPError as e:
         print(f"HTTP error downloading for group '{group_code}': {e}", file=sys.stderr)
@@ -97,15 +372,45 @@ def download_taxonomy(group_code: str, output_path: str, api_base_url: str):
         sys.exit(1)
 
 
+def download_taxonomies(group_codes, output_template: str, api_base_url: str,
+                        max_workers: int = 4, max_retries: int = 5, backoff_factor: float = 1.0,
+                        resume: bool = True, http_cache_dir=None, cache_ttl: float = DEFAULT_CACHE_TTL):
+    """
+    Downloads several groups concurrently over one pooled session, with at most
+    `max_workers` requests in flight at a time. `output_template` is a path containing
+    a '{group}' placeholder. Returns {group_code: True if the download succeeded}.
+    """
+    session = create_session(max_retries=max_retries, backoff_factor=backoff_factor, pool_size=max_workers)
+
+    def download_group(group_code):
+        try:
+            download_taxonomy(group_code, output_template.replace('{group}', group_code), api_base_url, session, resume,
+                              http_cache_dir, cache_ttl)
+            return True
+        except SystemExit:
+            # download_taxonomy has already reported the error; only this group failed.
+            return False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(group_codes, executor.map(download_group, group_codes)))
+    session.close()
+    return results
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Download paginated taxonomy data from the NEON API and save it as CSV."
     )
-    parser.add_argument(
+    group_args = parser.add_mutually_exclusive_group(required=True)
+    group_args.add_argument(
         "--group",
-        required=True,
         help="Taxon type code to download (e.g., ALGAE, FISH)."
     )
+    group_args.add_argument(
+        "--groups",
+        help="Comma-separated taxon type codes to download concurrently (e.g., ALGAE,FISH,TICK). "
+             "--output must then contain a '{group}' placeholder."
+    )
     parser.add_argument(
         "--output",
         required=True,
@@ -116,6 +421,73 @@ if __name__ == "__main__":
         required=True,
         help="Base URL for the NEON taxonomy API (e.g., https://data.neonscience.org/api/v0/taxonomy)."
     )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=4,
+        help="Maximum number of concurrent requests to the API when using --groups (default: 4)."
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=5,
+        help="Number of retries for connection errors, timeouts and 429/5xx responses (default: 5)."
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.0,
+        help="Exponential backoff factor in seconds between retries (default: 1.0)."
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Discard the checkpoints of an interrupted download instead of resuming from them."
+    )
+    parser.add_argument(
+        "--http-cache-dir",
+        help="Directory for cached API responses used for conditional requests "
+             "(default: '.http_cache' next to the output files)."
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Seconds to reuse cached responses that have no ETag/Last-Modified header (default: {DEFAULT_CACHE_TTL})."
+    )
+    parser.add_argument(
+        "--no-http-cache",
+        action="store_true",
+        help="Always fetch every page, without conditional requests or cached responses."
+    )
     args = parser.parse_args()
 
-    download_taxonomy(args.group, args.output, args.api_url)
\ No newline at end of file
+    http_cache_dir = None
+    if not args.no_http_cache:
+        http_cache_dir = args.http_cache_dir or default_http_cache_dir(args.output)
+
+    if args.max_workers < 1:
+        parser.error("--max-workers must be at least 1.")
+
+    if args.groups:
+        group_codes = [g.strip() for g in args.groups.split(',') if g.strip()]
+        if not group_codes:
+            parser.error("--groups must list at least one group code.")
+        if '{group}' not in args.output:
+            parser.error("--output must contain a '{group}' placeholder when --groups is used.")
+
+        results = download_taxonomies(group_codes, args.output, args.api_url,
+                                      max_workers=args.max_workers,
+                                      max_retries=args.retries,
+                                      backoff_factor=args.backoff,
+                                      resume=not args.restart,
+                                      http_cache_dir=http_cache_dir,
+                                      cache_ttl=args.cache_ttl)
+        failed_groups = [group_code for group_code, succeeded in results.items() if not succeeded]
+        if failed_groups:
+            print(f"Download failed for: {', '.join(failed_groups)}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        session = create_session(max_retries=args.retries, backoff_factor=args.backoff, pool_size=1)
+        download_taxonomy(args.group, args.output, args.api_url, session, resume=not args.restart,
+                          http_cache_dir=http_cache_dir, cache_ttl=args.cache_ttl)
\ No newline at end of file
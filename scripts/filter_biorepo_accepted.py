@@ -3,49 +3,191 @@ import csv
 import os
 import sys
 
+from reference_cache import load_int_index_with_cache, load_with_cache
+from synonym_resolver import SynonymResolver
+
+def load_accepted_tids(taxstatus_filepath, taxstatus_tid_col='tid', taxstatus_accepted_tid_col='tidaccepted'):
+    """
+    Returns the set of tids in biorepo_taxstatus.csv that are their own accepted tid.
+    """
+    accepted_tids = set()
+    with open(taxstatus_filepath, 'r', encoding='utf-8', newline='') as ts_file:
+        reader = csv.DictReader(ts_file)
+        if taxstatus_tid_col not in reader.fieldnames or taxstatus_accepted_tid_col not in reader.fieldnames:
+            print(f"Error: Biorepo tax status file '{taxstatus_filepath}' missing '{taxstatus_tid_col}' or '{taxstatus_accepted_tid_col}' column.", file=sys.stderr)
+            sys.exit(1)
+        for row in reader:
+            tid = row.get(taxstatus_tid_col)
+            tid_accepted = row.get(taxstatus_accepted_tid_col)
+            if tid and tid_accepted and tid == tid_accepted:
+                accepted_tids.add(tid)
+    return accepted_tids
+
+def load_synonym_resolver(taxstatus_filepath, taxstatus_tid_col='tid', taxstatus_accepted_tid_col='tidaccepted'):
+    """
+    Returns a compiled SynonymResolver over the tid -> tidaccepted pairs of biorepo_taxstatus.csv,
+    which maps every tid to the accepted tid at the end of its synonym chain.
+    """
+    with open(taxstatus_filepath, 'r', encoding='utf-8', newline='') as ts_file:
+        reader = csv.DictReader(ts_file)
+        if taxstatus_tid_col not in reader.fieldnames or taxstatus_accepted_tid_col not in reader.fieldnames:
+            print(f"Error: Biorepo tax status file '{taxstatus_filepath}' missing '{taxstatus_tid_col}' or '{taxstatus_accepted_tid_col}' column.", file=sys.stderr)
+            sys.exit(1)
+        return SynonymResolver.from_pairs((row.get(taxstatus_tid_col), row.get(taxstatus_accepted_tid_col))
+                                          for row in reader)
+
+def is_integer_tid(tid):
+    """True if `tid` is written as a plain non-negative integer that fits in 64 bits (e.g. '123', not '0123')."""
+    return tid.isascii() and tid.isdigit() and (tid == '0' or tid[0] != '0') and int(tid) < 2 ** 63
+
+def load_accepted_tid_ints(taxstatus_filepath, taxstatus_tid_col='tid', taxstatus_accepted_tid_col='tidaccepted'):
+    """
+    Returns the accepted tids of load_accepted_tids as integers, for an AcceptedTidIndex.
+    Raises ValueError if a tid is not a plain integer, which the index cannot represent.
+    """
+    accepted_tids = load_accepted_tids(taxstatus_filepath, taxstatus_tid_col, taxstatus_accepted_tid_col)
+    for tid in accepted_tids:
+        if not is_integer_tid(tid):
+            raise ValueError(f"tid '{tid}' is not a plain integer")
+    return [int(tid) for tid in accepted_tids]
+
+class AcceptedTidIndex:
+    """
+    The accepted tids of biorepo_taxstatus.csv, as a memory-mapped sorted integer
+    array (see reference_cache.SortedIntIndex). Supports `tid in index` for the
+    tid strings of the generated taxonomies, like the set of load_accepted_tids.
+    """
+    def __init__(self, int_index):
+        self.int_index = int_index
+
+    def __len__(self):
+        return len(self.int_index)
+
+    def __contains__(self, tid):
+        return is_integer_tid(tid) and int(tid) in self.int_index
+
+def load_accepted_tid_index(taxstatus_filepath, taxstatus_tid_col='tid', taxstatus_accepted_tid_col='tidaccepted',
+                            cache_dir=None, use_cache=True):
+    """
+    Returns the accepted tids of biorepo_taxstatus.csv, for `tid in accepted_tids` lookups.
+    With `use_cache`, they are compiled once per content of the file into a sorted integer
+    index that every later run and group memory-maps instead of parsing the CSV. If the
+    index cannot be used (e.g. non-integer tids), the set of load_accepted_tids is returned,
+    read from a snapshot cache while the file is unchanged. That the file cannot be indexed
+    is cached too, so later runs go straight to the snapshot.
+    """
+    if use_cache:
+        try:
+            int_index = load_int_index_with_cache(taxstatus_filepath, load_accepted_tid_ints,
+                                                  taxstatus_tid_col, taxstatus_accepted_tid_col,
+                                                  cache_dir=cache_dir)
+            if int_index is not None:
+                return AcceptedTidIndex(int_index)
+        except ValueError as e:
+            print(f"Info: Not indexing {taxstatus_filepath} ({e}); using a tid set instead.", file=sys.stderr)
+    return load_with_cache(taxstatus_filepath, load_accepted_tids,
+                           taxstatus_tid_col, taxstatus_accepted_tid_col,
+                           cache_dir=cache_dir, use_cache=use_cache)
+
+class AcceptedRowSelector:
+    """
+    Collects the rows of accepted tids, one per accepted tid, in input order.
+    `accepted_tids` is a set-like of accepted tids (see load_accepted_tid_index),
+    or a SynonymResolver to keep synonym rows too (see select_biorepo_accepted).
+    A synonym's row only stands in for its accepted tid through `stand_in(row, accepted_tid)`,
+    which returns the row rewritten to describe the accepted taxon (see
+    generate_biorepo_taxonomy.biorepo_stand_in), or None to drop it; without
+    `stand_in`, synonym rows are dropped.
+    """
+    def __init__(self, accepted_tids, biorepo_tid_col='biorepo_tid', stand_in=None):
+        self.accepted_tids = accepted_tids
+        self.synonym_resolver = accepted_tids if isinstance(accepted_tids, SynonymResolver) else None
+        self.biorepo_tid_col = biorepo_tid_col
+        self.stand_in = stand_in
+        self.selected_rows = {} # {accepted tid: row}, to ensure uniqueness in the output based on biorepo_tid
+        self.own_row_tids = set() # Accepted tids whose selected row is their own, not a synonym's
+
+    def accepted_tid(self, tid):
+        """
+        Returns the accepted tid that a row of `tid` would be selected for,
+        or None if the row would be dropped.
+        """
+        if not tid:
+            return None
+        if self.synonym_resolver is None:
+            if tid in self.accepted_tids and tid not in self.selected_rows: # Ensure unique accepted tids in output
+                return tid
+            return None
+
+        accepted_tid = self.synonym_resolver.resolve(tid)
+        if accepted_tid is None or accepted_tid in self.own_row_tids:
+            return None
+        if accepted_tid == tid:
+            return accepted_tid
+        if self.stand_in is None or accepted_tid in self.selected_rows:
+            return None
+        return accepted_tid
+
+    def add(self, row):
+        """Selects `row` if its tid is accepted (see accepted_tid). Returns True if it was selected."""
+        tid = row.get(self.biorepo_tid_col)
+        accepted_tid = self.accepted_tid(tid)
+        if accepted_tid is None:
+            return False
+        if accepted_tid == tid:
+            # Replaces a synonym's row in place, keeping the output order
+            self.selected_rows[accepted_tid] = row
+            self.own_row_tids.add(accepted_tid)
+        else:
+            stand_in = self.stand_in(row, accepted_tid)
+            if stand_in is None:
+                return False # The accepted taxon cannot be described
+            self.selected_rows[accepted_tid] = stand_in
+        return True
+
+    def rows(self):
+        return self.selected_rows.values()
+
+    def __len__(self):
+        return len(self.selected_rows)
+
+    def stand_in_count(self):
+        """Number of accepted tids selected through a synonym's row."""
+        return len(self.selected_rows) - len(self.own_row_tids)
+
 def select_biorepo_accepted(input_filepath, taxstatus_filepath, output_filepath,
                             biorepo_tid_col='biorepo_tid', taxstatus_tid_col='tid',
-                            taxstatus_accepted_tid_col='tidaccepted'):
+                            taxstatus_accepted_tid_col='tidaccepted',
+                            cache_dir=None, use_cache=True, accepted_tids=None, resolve_synonyms=False,
+                            stand_in=None):
     """
     Selects rows from the biorepo-generated taxonomy where the biorepo_tid
     is an accepted tid according to biorepo_taxstatus.csv, ensuring uniqueness
     of accepted tids in the output.
+    The accepted tids come from a persisted index while biorepo_taxstatus.csv
+    is unchanged (see load_accepted_tid_index), unless `use_cache` is False.
+    Pass `accepted_tids` to reuse the accepted tids (or SynonymResolver) of an earlier call.
+
+    With `resolve_synonyms`, rows whose biorepo_tid is a synonym are kept too: the
+    synonym chain is followed to its accepted tid. An accepted tid's own row wins over
+    rows of its synonyms; otherwise the first synonym row stands in for it, rewritten by
+    `stand_in` (see AcceptedRowSelector) to the accepted taxon's tid, name and lineage.
     """
     print(f"--- Selecting accepted taxa from Biorepo-generated: {os.path.basename(input_filepath)} ---")
 
     if not os.path.exists(input_filepath):
         print(f"Error: Input file not found: {input_filepath}", file=sys.stderr)
         sys.exit(1)
-    if not os.path.exists(taxstatus_filepath):
-        print(f"Error: Biorepo tax status file not found: {taxstatus_filepath}", file=sys.stderr)
-        sys.exit(1)
 
     # 1. Load accepted tids from biorepo_taxstatus.csv
-    accepted_tids = set()
-    try:
-        with open(taxstatus_filepath, 'r', encoding='utf-8', newline='') as ts_file:
-            reader = csv.DictReader(ts_file)
-            if taxstatus_tid_col not in reader.fieldnames or taxstatus_accepted_tid_col not in reader.fieldnames:
-                print(f"Error: Biorepo tax status file '{taxstatus_filepath}' missing '{taxstatus_tid_col}' or '{taxstatus_accepted_tid_col}' column.", file=sys.stderr)
-                sys.exit(1)
-            for row in reader:
-                tid = row.get(taxstatus_tid_col)
-                tid_accepted = row.get(taxstatus_accepted_tid_col)
-                if tid and tid_accepted and tid == tid_accepted:
-                    accepted_tids.add(tid)
-        if not accepted_tids:
-            print("Warning: No accepted tids found in biorepo_taxstatus.csv. Output will be empty.", file=sys.stderr)
-
-    except Exception as e:
-        print(f"An error occurred reading biorepo_taxstatus.csv: {e}", file=sys.stderr)
-        sys.exit(1)
+    if accepted_tids is None:
+        accepted_tids = load_taxstatus(taxstatus_filepath, taxstatus_tid_col, taxstatus_accepted_tid_col,
+                                       cache_dir, use_cache, resolve_synonyms)
+    selector = AcceptedRowSelector(accepted_tids, biorepo_tid_col, stand_in)
 
     # 2. Process the main biorepo-generated taxonomy file
-    selected_rows = []
     fieldnames = []
     processed_count = 0
-    selected_count = 0
-    seen_output_tids = set() # To ensure uniqueness in the output based on biorepo_tid
 
     try:
         with open(input_filepath, 'r', encoding='utf-8', newline='') as infile:
@@ -58,14 +200,7 @@ def select_biorepo_accepted(input_filepath, taxstatus_filepath, output_filepath,
 
             for row in reader:
                 processed_count += 1
-                current_biorepo_tid = row.get(biorepo_tid_col)
-
-                if current_biorepo_tid and \
-                   current_biorepo_tid in accepted_tids and \
-                   current_biorepo_tid not in seen_output_tids: # Ensure unique accepted tids in output
-                    selected_rows.append(row)
-                    seen_output_tids.add(current_biorepo_tid)
-                    selected_count += 1
+                selector.add(row)
 
         if not fieldnames:
             print(f"Warning: Input file '{input_filepath}' was empty or had no headers.", file=sys.stderr)
@@ -79,15 +214,63 @@ def select_biorepo_accepted(input_filepath, taxstatus_filepath, output_filepath,
         with open(output_filepath, 'w', encoding='utf-8', newline='') as outfile:
             writer = csv.DictWriter(outfile, fieldnames=fieldnames)
             writer.writeheader()
-            writer.writerows(selected_rows)
+            writer.writerows(selector.rows())
 
-        print(f"Processed {processed_count} rows from input. Selected {selected_count} unique accepted taxa.")
+        print(f"Processed {processed_count} rows from input. Selected {len(selector)} unique accepted taxa.")
+        if selector.synonym_resolver is not None:
+            print(f"Resolved synonyms to {selector.stand_in_count()} accepted taxa that had no row of their own.")
         print(f"Accepted Biorepo taxa saved to: {output_filepath}")
 
     except Exception as e:
         print(f"An error occurred during processing: {e}", file=sys.stderr)
         sys.exit(1)
 
+def load_taxstatus(taxstatus_filepath, taxstatus_tid_col='tid', taxstatus_accepted_tid_col='tidaccepted',
+                   cache_dir=None, use_cache=True, resolve_synonyms=False):
+    """
+    Returns the accepted tids of biorepo_taxstatus.csv (see load_accepted_tid_index),
+    or with `resolve_synonyms` its SynonymResolver (see load_synonym_resolver), exiting on errors.
+    """
+    if not os.path.exists(taxstatus_filepath):
+        print(f"Error: Biorepo tax status file not found: {taxstatus_filepath}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        if resolve_synonyms:
+            return load_with_cache(taxstatus_filepath, load_synonym_resolver,
+                                   taxstatus_tid_col, taxstatus_accepted_tid_col,
+                                   cache_dir=cache_dir, use_cache=use_cache)
+        accepted_tids = load_accepted_tid_index(taxstatus_filepath, taxstatus_tid_col, taxstatus_accepted_tid_col,
+                                                cache_dir=cache_dir, use_cache=use_cache)
+        if not len(accepted_tids):
+            print("Warning: No accepted tids found in biorepo_taxstatus.csv. Output will be empty.", file=sys.stderr)
+        return accepted_tids
+    except Exception as e:
+        print(f"An error occurred reading biorepo_taxstatus.csv: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def group_output_path(input_filepath, output_template):
+    """
+    Returns the output path of one of several inputs: `output_template` with '{group}'
+    replaced by the input's group code, the part of its file name before the first '.'
+    (e.g. ALGAE for ALGAE.biorepo.csv).
+    """
+    group_code = os.path.basename(input_filepath).split('.', 1)[0]
+    return output_template.replace('{group}', group_code)
+
+def select_biorepo_accepted_files(input_filepaths, taxstatus_filepath, output_template,
+                                  cache_dir=None, use_cache=True, resolve_synonyms=False, stand_in=None):
+    """
+    Runs select_biorepo_accepted on several biorepo-generated taxonomy files,
+    loading the accepted tids of biorepo_taxstatus.csv only once. Each output path
+    is `output_template` with '{group}' replaced (see group_output_path).
+    """
+    accepted_tids = load_taxstatus(taxstatus_filepath, cache_dir=cache_dir, use_cache=use_cache,
+                                   resolve_synonyms=resolve_synonyms)
+    for input_filepath in input_filepaths:
+        select_biorepo_accepted(input_filepath, taxstatus_filepath,
+                                group_output_path(input_filepath, output_template),
+                                accepted_tids=accepted_tids, stand_in=stand_in)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Selects accepted taxa from biorepo-generated taxonomy CSV files."
@@ -95,8 +278,12 @@ if __name__ == "__main__":
     parser.add_argument(
         "--input",
         type=str,
+        nargs='+',
         required=True,
-        help="Path to the input biorepo-generated taxonomy CSV file (e.g., ALGAE.biorepo.csv)."
+        help="Path(s) to the input biorepo-generated taxonomy CSV file(s) (e.g., ALGAE.biorepo.csv). "
+             "Several files are filtered in one run, reading biorepo_taxstatus.csv only once; "
+             "--output must then contain a '{group}' placeholder, replaced by the part of each "
+             "input file name before the first '.'."
     )
     parser.add_argument(
         "--taxstatus",
@@ -108,8 +295,62 @@ if __name__ == "__main__":
         "--output",
         type=str,
         required=True,
-        help="Path to the output CSV file for accepted taxa (e.g., ALGAE.biorepo.accepted.csv)."
+        help="Path to the output CSV file for accepted taxa (e.g., ALGAE.biorepo.accepted.csv, "
+             "or '03_accepted_taxonomies/{group}.biorepo.accepted.csv' for several inputs)."
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Directory for the accepted tid index and snapshots of biorepo_taxstatus.csv. "
+             "Defaults to a '.cache' directory next to the taxstatus file."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always parse biorepo_taxstatus.csv, ignoring and not writing the index or snapshots."
+    )
+    parser.add_argument(
+        "--resolve-synonyms",
+        action="store_true",
+        help="Keep rows whose biorepo_tid is a synonym, following its tidaccepted chain to the accepted tid "
+             "instead of dropping it. An accepted tid's own row still wins over its synonyms' rows; otherwise "
+             "a synonym row stands in for it with the accepted taxon's name, rank and lineage, looked up in "
+             "--biorepo-taxa, --biorepo-enum-tree and --biorepo-taxon-units."
+    )
+    parser.add_argument(
+        "--biorepo-taxa",
+        type=str,
+        help="With --resolve-synonyms: Path to biorepo_taxa.csv."
+    )
+    parser.add_argument(
+        "--biorepo-enum-tree",
+        type=str,
+        help="With --resolve-synonyms: Path to biorepo_taxaenumtree.csv."
+    )
+    parser.add_argument(
+        "--biorepo-taxon-units",
+        type=str,
+        help="With --resolve-synonyms: Path to biorepo_taxonunits.csv."
     )
     args = parser.parse_args()
 
-    select_biorepo_accepted(args.input, args.taxstatus, args.output)
\ No newline at end of file
+    stand_in = None
+    if args.resolve_synonyms:
+        if not (args.biorepo_taxa and args.biorepo_enum_tree and args.biorepo_taxon_units):
+            parser.error("--resolve-synonyms requires --biorepo-taxa, --biorepo-enum-tree and --biorepo-taxon-units, "
+                         "to describe a synonym row as its accepted taxon.")
+        from generate_biorepo_taxonomy import biorepo_stand_in_builder, load_lineage_tables
+        stand_in = biorepo_stand_in_builder(load_lineage_tables(args.biorepo_taxa, args.biorepo_enum_tree,
+                                                                args.biorepo_taxon_units, cache_dir=args.cache_dir,
+                                                                use_cache=not args.no_cache))
+
+    if len(args.input) > 1:
+        if '{group}' not in args.output:
+            parser.error("--output must contain a '{group}' placeholder when several --input files are given.")
+        select_biorepo_accepted_files(args.input, args.taxstatus, args.output,
+                                      cache_dir=args.cache_dir, use_cache=not args.no_cache,
+                                      resolve_synonyms=args.resolve_synonyms, stand_in=stand_in)
+    else:
+        select_biorepo_accepted(args.input[0], args.taxstatus, group_output_path(args.input[0], args.output),
+                                cache_dir=args.cache_dir, use_cache=not args.no_cache,
+                                resolve_synonyms=args.resolve_synonyms, stand_in=stand_in)
@@ -3,10 +3,94 @@ import csv
 import os
 import sys
 
-def select_neonhq_accepted(input_filepath, output_filepath, id_col='taxonID', accepted_id_col='acceptedTaxonID'):
+from synonym_resolver import SynonymResolver
+
+def select_accepted_rows(fieldnames, rows, source_name, id_col='taxonID', accepted_id_col='acceptedTaxonID',
+                         resolve_synonyms=False):
+    """
+    Selects the NEON HQ rows (csv.reader lists under `fieldnames`) where taxonID matches
+    acceptedTaxonID and collapses 'SPP' forms to 'SP' forms if both exist for the same
+    base name. Returns (the selected rows sorted by taxonID, number of rows processed).
+    `source_name` names the rows' origin in error messages. See select_neonhq_accepted
+    for `resolve_synonyms`.
+    """
+    if id_col not in fieldnames:
+        print(f"Error: Required column '{id_col}' not found in '{source_name}'. Found: {fieldnames}", file=sys.stderr)
+        sys.exit(1)
+    if accepted_id_col not in fieldnames:
+        print(f"Error: Required column '{accepted_id_col}' not found in '{source_name}'. Found: {fieldnames}", file=sys.stderr)
+        sys.exit(1)
+
+    accepted_rows = {} # Rows where taxonID == acceptedTaxonID, keyed by taxonID (the last duplicate wins)
+    sp_base_names = set() # Base names with a self-accepted 'SP' form, e.g. 'CAREX' for 'CAREXSP'
+    synonym_resolver = SynonymResolver() if resolve_synonyms else None
+    synonym_ids = [] # taxonIDs of synonyms, when resolving synonyms
+    processed_count = 0
+
+    # Like csv.DictReader, the last of duplicate columns wins and short rows read as ''
+    field_count = len(fieldnames)
+    id_index = field_count - 1 - fieldnames[::-1].index(id_col)
+    accepted_id_index = field_count - 1 - fieldnames[::-1].index(accepted_id_col)
+
+    for row in rows:
+        if not row:
+            continue # csv.DictReader skips blank lines
+        processed_count += 1
+        if len(row) < field_count:
+            row += [''] * (field_count - len(row))
+        taxon_id = row[id_index]
+        accepted_taxon_id = row[accepted_id_index]
+
+        if taxon_id and taxon_id == accepted_taxon_id:
+            accepted_rows[taxon_id] = row
+            if taxon_id.endswith('SP'):
+                sp_base_names.add(taxon_id[:-2])
+        elif synonym_resolver is not None and taxon_id and accepted_taxon_id:
+            synonym_ids.append(taxon_id)
+        if synonym_resolver is not None:
+            synonym_resolver.add(taxon_id, accepted_taxon_id)
+
+    print(f"Initial pass: Identified {len(accepted_rows)} self-accepted taxa.")
+
+    if synonym_resolver is not None:
+        # A synonym's row only names and places the synonym. When its accepted taxon has no
+        # row in the file, nothing describes that taxon, so the synonym is dropped rather
+        # than standing in for it with the wrong name and lineage.
+        synonym_resolver.compile()
+        resolved_ids = [synonym_resolver.resolve(taxon_id) for taxon_id in dict.fromkeys(synonym_ids)]
+        resolved_count = sum(resolved_id in accepted_rows for resolved_id in resolved_ids)
+        print(f"Resolved {resolved_count} synonyms to accepted taxa in the file; dropped "
+              f"{len(resolved_ids) - resolved_count} whose accepted taxon has no row of its own or that loop.")
+
+    # An 'SPP' form is dropped when the 'SP' form of the same base name was also accepted
+    selected_ids = sorted(
+        taxon_id for taxon_id in accepted_rows
+        if not (taxon_id.endswith('SPP') and taxon_id[:-3] in sp_base_names)
+    )
+    return [accepted_rows[taxon_id] for taxon_id in selected_ids], processed_count
+
+def write_accepted_rows(output_filepath, fieldnames, rows):
+    """Writes the selected NEON HQ rows as CSV, creating the output directory if needed."""
+    output_dir = os.path.dirname(output_filepath)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    with open(output_filepath, 'w', encoding='utf-8', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(fieldnames)
+        writer.writerows(rows)
+
+def select_neonhq_accepted(input_filepath, output_filepath, id_col='taxonID', accepted_id_col='acceptedTaxonID',
+                           resolve_synonyms=False):
     """
     Selects rows from the NEON HQ taxonomy where taxonID matches acceptedTaxonID,
-    and then collapses 'SPP' forms to 'SP' forms if both exist for the same base name.
+    collapses 'SPP' forms to 'SP' forms if both exist for the same base name,
+    and writes the selected rows sorted by taxonID, in a single pass over the input.
+
+    With `resolve_synonyms`, the acceptedTaxonID chains of the other rows are followed
+    to their accepted taxon, and the synonyms are counted by whether that taxon has a
+    row of its own. A synonym row never stands in for its accepted taxon, as it carries
+    the synonym's name and lineage; the taxon is only selected through its own row.
     """
     print(f"--- Selecting accepted taxa from NEON HQ: {os.path.basename(input_filepath)} ---")
 
@@ -14,104 +98,16 @@ def select_neonhq_accepted(input_filepath, output_filepath, id_col='taxonID', ac
         print(f"Error: Input file not found: {input_filepath}", file=sys.stderr)
         sys.exit(1)
 
-    initial_accepted_rows = {} # Store rows where taxonID == acceptedTaxonID, keyed by taxonID
-    fieldnames = []
-    processed_count = 0
-
     try:
         with open(input_filepath, 'r', encoding='utf-8', newline='') as infile:
-            reader = csv.DictReader(infile)
-            fieldnames = reader.fieldnames
-
-            if id_col not in fieldnames:
-                print(f"Error: Required column '{id_col}' not found in '{input_filepath}'. Found: {fieldnames}", file=sys.stderr)
-                sys.exit(1)
-            if accepted_id_col not in fieldnames:
-                print(f"Error: Required column '{accepted_id_col}' not found in '{input_filepath}'. Found: {fieldnames}", file=sys.stderr)
-                sys.exit(1)
-
-            for row in reader:
-                processed_count += 1
-                taxon_id = row.get(id_col)
-                accepted_taxon_id = row.get(accepted_id_col)
-
-                if taxon_id and accepted_taxon_id and taxon_id == accepted_taxon_id:
-                    initial_accepted_rows[taxon_id] = row
-
-        if not fieldnames:
-            print(f"Warning: Input file '{input_filepath}' was empty or had no headers.", file=sys.stderr)
-            # Proceed to create an empty output file.
-
-        print(f"Initial pass: Identified {len(initial_accepted_rows)} self-accepted taxa.")
-
-        final_selected_rows = []
-        # This set will track base_name -> {'SP': row, 'SPP': row}
-        # to handle the collapse logic
-        sp_spp_resolver = {}
-        processed_taxon_ids = set() # To prevent adding the same taxonID twice in final selection
-
-        # Second pass: Apply SP/SPP collapse logic
-        for taxon_id, row_data in initial_accepted_rows.items():
-            if taxon_id in processed_taxon_ids:
-                continue # Already handled as part of a collapse group or directly added
-
-            # Check for SP/SPP pattern
-            if taxon_id.endswith('SPP'):
-                base_name = taxon_id[:-3]
-                sp_key = base_name + 'SP'
-                
-                # Check if the SP version exists and is also self-accepted
-                if sp_key in initial_accepted_rows:
-                    # Both SPP and SP versions exist and are self-accepted
-                    # Prioritize SP, add SP to resolver, mark SPP as processed
-                    sp_spp_resolver.setdefault(base_name, {})['SP'] = initial_accepted_rows[sp_key]
-                    sp_spp_resolver.setdefault(base_name, {})['SPP'] = row_data # Store SPP for completeness but will prefer SP
-                    processed_taxon_ids.add(taxon_id) # Mark SPP as processed
-                    processed_taxon_ids.add(sp_key) # Mark SP as processed
-                else:
-                    # Only SPP version exists or SP version is not self-accepted, keep SPP
-                    final_selected_rows.append(row_data)
-                    processed_taxon_ids.add(taxon_id)
-
-            elif taxon_id.endswith('SP'):
-                base_name = taxon_id[:-2]
-                spp_key = base_name + 'SPP'
-                
-                # If the SPP version exists and is also self-accepted, this SP will be handled by the SPP block
-                # Otherwise, it's just a standalone SP, so we add it.
-                if spp_key not in initial_accepted_rows:
-                    final_selected_rows.append(row_data)
-                    processed_taxon_ids.add(taxon_id)
-                # If spp_key IS in initial_accepted_rows, it means the SPP block above
-                # already handled this base_name, including both SP and SPP via sp_spp_resolver.
-                # So we just mark SP as processed and move on.
-                else:
-                    processed_taxon_ids.add(taxon_id)
-            else:
-                # Not an SP/SPP variant, just add it if not already processed
-                if taxon_id not in processed_taxon_ids:
-                    final_selected_rows.append(row_data)
-                    processed_taxon_ids.add(taxon_id)
-        
-        # Finally, add the resolved SP/SPP groups
-        for base_name, variants in sp_spp_resolver.items():
-            if 'SP' in variants:
-                final_selected_rows.append(variants['SP'])
-            elif 'SPP' in variants: # Fallback if only SPP was found for some reason
-                final_selected_rows.append(variants['SPP'])
-            # No need for else, if it got into sp_spp_resolver, it must have at least one variant.
-
-        # Ensure the output directory exists
-        output_dir = os.path.dirname(output_filepath)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        with open(output_filepath, 'w', encoding='utf-8', newline='') as outfile:
-            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(final_selected_rows)
-
-        print(f"Processed {processed_count} rows from input. Selected {len(final_selected_rows)} unique accepted taxa after SP/SPP collapse.")
+            reader = csv.reader(infile)
+            fieldnames = next(reader, None) or []
+            selected_rows, processed_count = select_accepted_rows(fieldnames, reader, input_filepath,
+                                                                  id_col, accepted_id_col, resolve_synonyms)
+
+        write_accepted_rows(output_filepath, fieldnames, selected_rows)
+
+        print(f"Processed {processed_count} rows from input. Selected {len(selected_rows)} unique accepted taxa after SP/SPP collapse.")
         print(f"Accepted taxa saved to: {output_filepath}")
 
     except Exception as e:
@@ -120,7 +116,8 @@ def select_neonhq_accepted(input_filepath, output_filepath, id_col='taxonID', ac
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Selects accepted taxa from NEON HQ taxonomy CSV files and collapses SPP to SP variants."
+        description="Selects accepted taxa from NEON HQ taxonomy CSV files, collapses SPP to SP variants, "
+                    "and writes them sorted by taxonID."
     )
     parser.add_argument(
         "--input",
@@ -134,6 +131,12 @@ if __name__ == "__main__":
         required=True,
         help="Path to the output CSV file for accepted taxa (e.g., ALGAE.accepted.csv)."
     )
+    parser.add_argument(
+        "--resolve-synonyms",
+        action="store_true",
+        help="Follow the acceptedTaxonID chains of synonyms and report how many reach an accepted taxon "
+             "with a row of its own. Synonym rows are still dropped, as they carry the synonym's name and lineage."
+    )
     args = parser.parse_args()
 
-    select_neonhq_accepted(args.input, args.output)
\ No newline at end of file
+    select_neonhq_accepted(args.input, args.output, resolve_synonyms=args.resolve_synonyms)
\ No newline at end of file
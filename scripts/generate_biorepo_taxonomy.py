@@ -1,4 +1,4 @@
-# scripts/generate_second_taxonomy.py
+# scripts/generate_biorepo_taxonomy.py
 
 import argparse
 import csv
@@ -7,6 +7,20 @@ import os
 import sys
 import datetime 
 
+from filter_biorepo_accepted import AcceptedRowSelector, load_taxstatus
+from reference_cache import load_with_cache
+
+# Leading columns of a generated Biorepo taxonomy, followed by the rank schema's lineage fields
+BIOREPO_CORE_FIELDNAMES = [
+    "neon_taxonID",
+    "neon_lookup_group",
+    "is_biorepo_mapped",
+    "biorepo_tid",
+    "scientificName_biorepo",
+    "taxonRank_biorepo",
+    "verbatimScientificName_biorepo_map",
+]
+
 def load_csv_to_dict(filepath, key_column_or_list, encoding='utf-8'):
     """
     Loads a CSV file into a dictionary.
@@ -42,7 +56,7 @@ def load_csv_to_dict(filepath, key_column_or_list, encoding='utf-8'):
 def load_taxa_enum_tree(filepath, encoding='utf-8'):
     """
     Loads biorepo_taxaenumtree.csv. Stores ALL parenttids for each tid,
-    as the direct parent resolution will happen in build_lineage based on rankID.
+    as the direct parent resolution happens in build_direct_parent_index based on rankID.
     """
     data = {} # {child_tid: [parent_tid1, parent_tid2, ...]}
     if not os.path.exists(filepath):
@@ -67,79 +81,88 @@ def load_taxa_enum_tree(filepath, encoding='utf-8'):
     return data
 
 
-def build_lineage(tid, taxa_data, taxa_enum_tree, taxon_units_data):
+def build_rank_schema(taxon_units_data):
     """
-    Builds the full lineage (Kingdom, Phylum, Class, etc.) for a given tid
-    by traversing up the parent tree. The direct parent is determined by
-    finding the ancestor with the highest rankID that is strictly less than
-    the current tid's rankID.
-    Returns a dictionary of ranks.
+    Builds the rank schema used for the whole run from biorepo_taxonunits:
+      - 'rankid_to_rankname': {int rankid: lowercase rankname}
+      - 'lineage_fields': ordered 'biorepo_<rankname>' output columns
+    Only rows with kingdomName 'Organism' are used.
     """
-    lineage = {}
-    current_tid = tid
+    rankid_to_rankname = {}
+    dynamic_ranks = []
+    organism_kingdom_rows_found = 0 
+    for row in taxon_units_data.values():
+        if (row.get('kingdomName') == 'Organism' and
+            'rankname' in row and 'rankid' in row): 
+            organism_kingdom_rows_found += 1 
+            try:
+                rank_identifier = int(row['rankid']) 
+            except ValueError:
+                print(f"Warning: Could not parse rankid '{row.get('rankid')}' for rank '{row.get('rankname')}'. Skipping this rank unit due to invalid rankid format.", file=sys.stderr)
+                continue
+            rankid_to_rankname[rank_identifier] = row['rankname'].lower()
+            dynamic_ranks.append((rank_identifier, "biorepo_" + row['rankname'].lower()))
+    
+    print(f"Info: Found {organism_kingdom_rows_found} rows with 'kingdomName' as 'Organism' and valid 'rankname'/'rankid' in biorepo_taxonunits.csv.")
 
-    # Map rankid to rankname from biorepo_taxonunits for quick lookup
-    # FIXED: Keyed by 'rankid', not 'taxonunitid' (still relevant and correct)
-    rankid_to_rankname = {
-        row['rankid']: row['rankname'].lower() 
-        for row in taxon_units_data.values()
-        if 'rankid' in row and 'rankname' in row and row.get('kingdomName') == 'Organism'
-    }
+    dynamic_ranks.sort(key=lambda x: x[0])
+    
+    lineage_fields = [rank_name for level, rank_name in dynamic_ranks]
+    
+    if "biorepo_organism" not in lineage_fields:
+        lineage_fields.insert(0, "biorepo_organism")
+    
+    if not lineage_fields:
+        print("Warning: No taxonomic lineage fields could be generated from biorepo_taxonunits.csv after filtering. This might indicate an issue with the file content, column names, or the 'Organism' filter value.", file=sys.stderr)
 
-    visited_tids = set() 
+    return {
+        'rankid_to_rankname': rankid_to_rankname,
+        'lineage_fields': lineage_fields
+    }
 
-    while current_tid and current_tid not in visited_tids:
-        visited_tids.add(current_tid)
-        
-        taxon_info = taxa_data.get(current_tid)
-        if not taxon_info:
-            break 
 
+def build_rank_ids(taxa_data):
+    """
+    Parses the rankID of every biorepo taxon once.
+    Returns {tid: int rankID}; taxa with a missing or invalid rankID are left out.
+    """
+    rank_ids = {}
+    for tid, taxon_info in taxa_data.items():
         rank_id_str = taxon_info.get('rankID')
-        sci_name = taxon_info.get('sciName')
-
-        # Add current taxon to lineage if valid rank
-        if rank_id_str and sci_name:
-            mapped_rank_name = rankid_to_rankname.get(str(rank_id_str)) 
-            if mapped_rank_name:
-                lineage[mapped_rank_name] = sci_name  
-
-        # Determine the direct parent based on rankID
-        child_rank_id = None
         if rank_id_str:
             try:
-                child_rank_id = int(rank_id_str)
+                rank_ids[tid] = int(rank_id_str)
             except ValueError:
-                print(f"Warning: Invalid rankID '{rank_id_str}' for tid {current_tid}. Cannot determine direct parent based on rank. Stopping traversal.", file=sys.stderr)
-                break
-        else:
-            print(f"Warning: No rankID found for tid {current_tid}. Cannot determine direct parent based on rank. Stopping traversal.", file=sys.stderr)
-            break
+                continue
+    return rank_ids
 
 
-        potential_parents_list = taxa_enum_tree.get(current_tid, [])
+def build_direct_parent_index(rank_ids, taxa_enum_tree):
+    """
+    Resolves the direct parent of every tid in the enum tree once, up front.
+    The direct parent is the ancestor with the highest rankID that is strictly
+    less than the tid's own rankID. Returns {child_tid: parent_tid}; tids with
+    no resolvable parent are left out.
+    """
+    parent_index = {}
+
+    for child_tid, potential_parents_list in taxa_enum_tree.items():
+        child_rank_id = rank_ids.get(child_tid)
+        if child_rank_id is None:
+            continue
 
         best_parent_tid = None
         # Initialize with a value lower than any valid parent rankID would be,
         # ensuring the first valid parent is picked.
-        closest_parent_rank_id = -1 
+        closest_parent_rank_id = -1
 
         for p_tid in potential_parents_list:
             # Skip self-loops if present in enumtree
-            if p_tid == current_tid:
+            if p_tid == child_tid:
                 continue
 
-            parent_taxon_info = taxa_data.get(p_tid)
-            if not parent_taxon_info:
-                continue
-
-            parent_rank_id_str = parent_taxon_info.get('rankID')
-            if not parent_rank_id_str:
-                continue
-
-            try:
-                parent_rank_id = int(parent_rank_id_str)
-            except ValueError:
+            parent_rank_id = rank_ids.get(p_tid)
+            if parent_rank_id is None:
                 continue
 
             # Rule: Parent rankID must be strictly less than child's rankID (meaning it's a higher rank)
@@ -149,12 +172,234 @@ def build_lineage(tid, taxa_data, taxa_enum_tree, taxon_units_data):
                 best_parent_tid = p_tid
 
         if best_parent_tid:
-            current_tid = best_parent_tid
-        else:
-            break 
+            parent_index[child_tid] = best_parent_tid
+
+    return parent_index
+
+
+def build_lineage(tid, taxa_data, rank_ids, parent_index, rank_schema, lineage_cache=None):
+    """
+    Builds the full lineage (Kingdom, Phylum, Class, etc.) for a given tid
+    by traversing up the direct parent index (see build_direct_parent_index).
+    Lineages are memoized per tid in `lineage_cache`, so shared ancestors are
+    only resolved once per run and reused by all of their descendants.
+    Returns a dictionary of ranks.
+    """
+    if lineage_cache is None:
+        lineage_cache = {}
+    if tid in lineage_cache:
+        return lineage_cache[tid]
+
+    rankid_to_rankname = rank_schema['rankid_to_rankname']
+
+    # Walk up until we reach the root or a tid whose lineage is already known
+    path = []
+    current_tid = tid
+    while current_tid and current_tid not in lineage_cache:
+        path.append(current_tid)
+
+        taxon_info = taxa_data.get(current_tid)
+        if not taxon_info:
+            break
+
+        if current_tid not in rank_ids:
+            rank_id_str = taxon_info.get('rankID')
+            if rank_id_str:
+                print(f"Warning: Invalid rankID '{rank_id_str}' for tid {current_tid}. Cannot determine direct parent based on rank. Stopping traversal.", file=sys.stderr)
+            else:
+                print(f"Warning: No rankID found for tid {current_tid}. Cannot determine direct parent based on rank. Stopping traversal.", file=sys.stderr)
+            break
+
+        current_tid = parent_index.get(current_tid)
+
+    inherited_lineage = lineage_cache.get(current_tid, {})
 
-    return lineage
+    # Fill the cache from the top of the walked path back down to the requested tid.
+    # Ancestors take precedence over descendants that map to the same rank name.
+    for path_tid in reversed(path):
+        lineage = {}
+        taxon_info = taxa_data.get(path_tid)
+        sci_name = taxon_info.get('sciName') if taxon_info else None
 
+        # Add current taxon to lineage if valid rank
+        if sci_name and path_tid in rank_ids:
+            mapped_rank_name = rankid_to_rankname.get(rank_ids[path_tid])
+            if mapped_rank_name:
+                lineage[mapped_rank_name] = sci_name
+        lineage.update(inherited_lineage)
+        lineage_cache[path_tid] = lineage
+        inherited_lineage = lineage
+
+    return lineage_cache[tid]
+
+
+def load_lineage_tables(biorepo_taxa_path: str,
+                        biorepo_enum_tree_path: str,
+                        biorepo_taxon_units_path: str,
+                        cache_dir=None,
+                        use_cache=True):
+    """
+    Loads the biorepo reference tables that lineages are built from (see build_lineage),
+    and derives the rank schema and direct parent index from them. Unchanged tables
+    are read from their snapshot cache (see reference_cache), unless `use_cache` is False.
+    """
+    cache_options = {'cache_dir': cache_dir, 'use_cache': use_cache}
+
+    print(f"Loading biorepo_taxa from: {biorepo_taxa_path}")
+    taxa_data = load_with_cache(biorepo_taxa_path, load_csv_to_dict, 'tid', **cache_options)
+
+    print(f"Loading biorepo_taxaenumtree from: {biorepo_enum_tree_path} (loading all parent-child associations for rank-based resolution)")
+    taxa_enum_tree = load_with_cache(biorepo_enum_tree_path, load_taxa_enum_tree, **cache_options)
+
+    print(f"Loading biorepo_taxonunits from: {biorepo_taxon_units_path}")
+    taxon_units_data = load_with_cache(biorepo_taxon_units_path, load_csv_to_dict, 'taxonunitid', **cache_options)
+
+    rank_schema = build_rank_schema(taxon_units_data)
+
+    print("Indexing direct parents from biorepo_taxaenumtree")
+    rank_ids = build_rank_ids(taxa_data)
+    parent_index = build_direct_parent_index(rank_ids, taxa_enum_tree)
+
+    return {
+        'taxa_data': taxa_data,
+        'taxon_units_data': taxon_units_data,
+        'rank_schema': rank_schema,
+        'rank_ids': rank_ids,
+        'parent_index': parent_index,
+        'lineage_cache': {} # {tid: lineage dict}, shared by every record and group in this run
+    }
+
+
+def load_reference_tables(biorepo_neon_taxonomy_path: str,
+                          biorepo_taxa_path: str,
+                          biorepo_enum_tree_path: str,
+                          biorepo_taxon_units_path: str,
+                          cache_dir=None,
+                          use_cache=True):
+    """
+    Loads the biorepo reference tables and derives everything the lineage
+    resolution needs from them. The result can be shared by several groups,
+    including the lineage cache, so the tables are only parsed once per run.
+    Unchanged tables are read from their snapshot cache (see reference_cache)
+    instead of being re-parsed, unless `use_cache` is False.
+    """
+    print(f"Loading biorepo_neon_taxonomy from: {biorepo_neon_taxonomy_path}")
+    neon_biorepo_map = load_with_cache(biorepo_neon_taxonomy_path, load_csv_to_dict, ['taxonGroup', 'taxonCode'],
+                                       cache_dir=cache_dir, use_cache=use_cache)
+
+    reference_tables = load_lineage_tables(biorepo_taxa_path, biorepo_enum_tree_path, biorepo_taxon_units_path,
+                                           cache_dir=cache_dir, use_cache=use_cache)
+    reference_tables['neon_biorepo_map'] = neon_biorepo_map
+    return reference_tables
+
+
+def reference_lineage_of(reference_tables):
+    """Returns lineage_of(tid), the memoized build_lineage of a tid over `reference_tables`."""
+    taxa_data = reference_tables['taxa_data']
+    rank_ids = reference_tables['rank_ids']
+    parent_index = reference_tables['parent_index']
+    rank_schema = reference_tables['rank_schema']
+    lineage_cache = reference_tables['lineage_cache']
+
+    def lineage_of(biorepo_tid):
+        return build_lineage(biorepo_tid, taxa_data, rank_ids, parent_index, rank_schema, lineage_cache)
+    return lineage_of
+
+
+def write_taxonomy_records(output_path, records, fieldnames):
+    """Writes taxonomy records as CSV, creating the output directory if needed."""
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(records)
+
+def describe_biorepo_taxon(output_record, biorepo_tid, taxa_entry, lineage_of, taxon_units_data, lineage_fields):
+    """
+    Fills the Biorepo columns of a generated record (tid, scientific name, rank and lineage)
+    from the Biorepo taxon `biorepo_tid`, whose biorepo_taxa row is `taxa_entry`.
+    """
+    output_record['is_biorepo_mapped'] = True
+    output_record['biorepo_tid'] = biorepo_tid
+    output_record['scientificName_biorepo'] = taxa_entry.get('sciName')
+
+    if taxa_entry.get('rankID'):
+        output_record['taxonRank_biorepo'] = taxon_units_data.get(taxa_entry['rankID'], {}).get('rankname')
+
+    for rank_key, sci_name in lineage_of(biorepo_tid).items():
+        formatted_rank_field = f'biorepo_{rank_key}'
+        if formatted_rank_field in lineage_fields:
+            output_record[formatted_rank_field] = sci_name
+
+def biorepo_stand_in(record, accepted_tid, taxa_entry, lineage_of, taxon_units_data, lineage_fields):
+    """
+    Returns a copy of the generated `record` of a synonym, standing in for its accepted tid:
+    the Biorepo columns describe the accepted taxon (`taxa_entry` is its biorepo_taxa row)
+    instead of the synonym, and the NEON columns are kept. Returns None if the accepted
+    taxon is not in biorepo_taxa, as there is then no name or lineage to give the record.
+    """
+    if taxa_entry is None:
+        return None
+    stand_in = dict(record, taxonRank_biorepo=None)
+    stand_in.update(dict.fromkeys(lineage_fields))
+    describe_biorepo_taxon(stand_in, accepted_tid, taxa_entry, lineage_of, taxon_units_data, lineage_fields)
+    return stand_in
+
+def biorepo_stand_in_builder(reference_tables):
+    """
+    Returns stand_in(record, accepted_tid) for an AcceptedRowSelector, which describes a
+    synonym's record as its accepted taxon (see biorepo_stand_in) from `reference_tables`
+    (from load_reference_tables or load_lineage_tables).
+    """
+    taxa_data = reference_tables['taxa_data']
+    taxon_units_data = reference_tables['taxon_units_data']
+    lineage_fields = reference_tables['rank_schema']['lineage_fields']
+    lineage_of = reference_lineage_of(reference_tables)
+
+    def stand_in(record, accepted_tid):
+        return biorepo_stand_in(record, accepted_tid, taxa_data.get(accepted_tid), lineage_of,
+                                taxon_units_data, lineage_fields)
+    return stand_in
+
+def build_biorepo_record(group_code, neon_taxon_id, map_entry, taxa_entry, lineage_of, taxon_units_data,
+                         lineage_fields, selector=None, keep_unfiltered=True):
+    """
+    Builds the generated Biorepo record of one NEON HQ record, for generate_second_taxonomy
+    and the taxonomy store alike. `map_entry` is the record's biorepo_neon_taxonomy row and
+    `taxa_entry` the biorepo_taxa row of its mapped tid, each None if there is none;
+    `lineage_of(tid)` returns the {rank: sciName} lineage of a tid (see build_lineage).
+    Unless `keep_unfiltered`, records the accepted `selector` would drop are not built,
+    so they need no lineage, and None is returned for them.
+    """
+    output_record = {field: None for field in BIOREPO_CORE_FIELDNAMES + lineage_fields}
+    output_record['neon_taxonID'] = neon_taxon_id
+    output_record['neon_lookup_group'] = group_code
+    output_record['is_biorepo_mapped'] = False
+
+    if neon_taxon_id and map_entry is not None:
+        biorepo_tid = map_entry.get('tid')
+        # Records the accepted filter would drop need no lineage, unless the unfiltered output is kept
+        skip_record = not keep_unfiltered and selector.accepted_tid(biorepo_tid) is None
+
+        if biorepo_tid and taxa_entry is not None:
+            if skip_record:
+                return None
+            describe_biorepo_taxon(output_record, biorepo_tid, taxa_entry, lineage_of, taxon_units_data, lineage_fields)
+            output_record['verbatimScientificName_biorepo_map'] = map_entry.get('verbatimScientificName')
+        else:
+            print(f"Warning: NEON record (group '{group_code}', ID '{neon_taxon_id}') mapped to biorepo_tid '{biorepo_tid}' but biorepo_tid not found in biorepo_taxa. Only basic map data included for this entry.", file=sys.stderr)
+            if skip_record:
+                return None
+            output_record['biorepo_tid'] = biorepo_tid
+            output_record['verbatimScientificName_biorepo_map'] = map_entry.get('verbatimScientificName')
+    else:
+        print(f"Info: NEON record (group '{group_code}', ID '{neon_taxon_id}') not found in biorepo_neon_taxonomy mapping. No biorepo data will be included for this entry.", file=sys.stderr)
+        if not keep_unfiltered:
+            return None
+    return output_record
 
 def generate_second_taxonomy(group_code: str,
                               neonhq_taxonomy_path: str,
@@ -162,67 +407,50 @@ def generate_second_taxonomy(group_code: str,
                               biorepo_taxa_path: str,
                               biorepo_enum_tree_path: str,
                               biorepo_taxon_units_path: str,
-                              output_path: str):
+                              output_path: str,
+                              reference_tables=None,
+                              accepted_tids=None,
+                              unfiltered_output_path=None):
     """
     Generates the second taxonomy CSV containing only biorepo-derived data,
     linked by neon_taxonID and neon_lookup_group (from --group argument).
+    If `reference_tables` (from load_reference_tables) is given, the biorepo
+    reference paths are ignored and the already loaded tables are used.
+
+    If `accepted_tids` (from filter_biorepo_accepted.load_taxstatus) is given, only the
+    records that select_biorepo_accepted would keep are written to `output_path`,
+    and lineages are only built for them. The unfiltered records are then written
+    to `unfiltered_output_path`, if given.
     """
     print(f"--- Step 02: Generating second taxonomy for {group_code} ---")
 
     # 1. Load reference data
-    print(f"Loading biorepo_taxa from: {biorepo_taxa_path}")
-    taxa_data = load_csv_to_dict(biorepo_taxa_path, 'tid')
-
-    print(f"Loading biorepo_neon_taxonomy from: {biorepo_neon_taxonomy_path}")
-    neon_biorepo_map = load_csv_to_dict(biorepo_neon_taxonomy_path, ['taxonGroup', 'taxonCode'])
-
-    print(f"Loading biorepo_taxaenumtree from: {biorepo_enum_tree_path} (loading all parent-child associations for rank-based resolution)")
-    taxa_enum_tree = load_taxa_enum_tree(biorepo_enum_tree_path)
-
-    print(f"Loading biorepo_taxonunits from: {biorepo_taxon_units_path}")
-    taxon_units_data = load_csv_to_dict(biorepo_taxon_units_path, 'taxonunitid')
+    if reference_tables is None:
+        reference_tables = load_reference_tables(biorepo_neon_taxonomy_path,
+                                                 biorepo_taxa_path,
+                                                 biorepo_enum_tree_path,
+                                                 biorepo_taxon_units_path)
+
+    taxa_data = reference_tables['taxa_data']
+    neon_biorepo_map = reference_tables['neon_biorepo_map']
+    taxon_units_data = reference_tables['taxon_units_data']
+    rank_schema = reference_tables['rank_schema']
+    biorepo_lineage_fields_ordered = rank_schema['lineage_fields']
+
+    selector = None
+    if accepted_tids is not None:
+        selector = AcceptedRowSelector(accepted_tids, stand_in=biorepo_stand_in_builder(reference_tables))
+    if selector is None:
+        unfiltered_output_path = output_path
+    keep_unfiltered = unfiltered_output_path is not None
 
     second_taxonomy_records = []
-    all_fieldnames = set() 
-
-    # Dynamically generate biorepo_lineage_fields_ordered using 'rankid' for sorting
-    dynamic_ranks = []
-    organism_kingdom_rows_found = 0 
-    for row in taxon_units_data.values():
-        if (row.get('kingdomName') == 'Organism' and
-            'rankname' in row and 'rankid' in row): 
-            organism_kingdom_rows_found += 1 
-            try:
-                rank_identifier = int(row['rankid']) 
-                dynamic_ranks.append((rank_identifier, "biorepo_" + row['rankname'].lower()))
-            except ValueError:
-                print(f"Warning: Could not parse rankid '{row.get('rankid')}' for rank '{row.get('rankname')}'. Skipping this rank unit due to invalid rankid format.", file=sys.stderr)
-                continue
-    
-    print(f"Info: Found {organism_kingdom_rows_found} rows with 'kingdomName' as 'Organism' and valid 'rankname'/'rankid' in biorepo_taxonunits.csv.")
-
-    dynamic_ranks.sort(key=lambda x: x[0])
-    
-    biorepo_lineage_fields_ordered = [rank_name for level, rank_name in dynamic_ranks]
-    
-    if "biorepo_organism" not in biorepo_lineage_fields_ordered:
-        biorepo_lineage_fields_ordered.insert(0, "biorepo_organism")
-    
-    if not biorepo_lineage_fields_ordered:
-        print("Warning: No taxonomic lineage fields could be generated from biorepo_taxonunits.csv after filtering. This might indicate an issue with the file content, column names, or the 'Organism' filter value.", file=sys.stderr)
 
+    core_output_fields_ordered = BIOREPO_CORE_FIELDNAMES + biorepo_lineage_fields_ordered
+    # Every record has these fields, including the ones the accepted filter skips
+    all_fieldnames = set(core_output_fields_ordered)
 
-    core_output_fields_ordered = [
-        "neon_taxonID",
-        "neon_lookup_group",
-        "is_biorepo_mapped",
-        "biorepo_tid",
-        "scientificName_biorepo",
-        "taxonRank_biorepo",
-        "verbatimScientificName_biorepo_map",
-    ]
-    core_output_fields_ordered.extend(biorepo_lineage_fields_ordered)
-
+    lineage_of = reference_lineage_of(reference_tables)
 
     print(f"Processing NEON HQ data from: {neonhq_taxonomy_path}")
     if not os.path.exists(neonhq_taxonomy_path):
@@ -230,7 +458,6 @@ def generate_second_taxonomy(group_code: str,
         sys.exit(1)
 
     processed_neon_records = 0 
-    processed_mapped_biorepo_records = 0 
 
     with open(neonhq_taxonomy_path, 'r', encoding='utf-8', newline='') as f:
         reader = csv.DictReader(f)
@@ -240,62 +467,27 @@ def generate_second_taxonomy(group_code: str,
 
         for neon_record in reader:
             processed_neon_records += 1 
-            output_record = {}
-
             neon_taxon_id = neon_record.get('taxonID')
-            lookup_taxon_group = group_code
-
-            output_record['neon_taxonID'] = neon_taxon_id
-            output_record['neon_lookup_group'] = lookup_taxon_group
-
-            output_record['is_biorepo_mapped'] = False
-            output_record['biorepo_tid'] = None
-            output_record['scientificName_biorepo'] = None
-            output_record['taxonRank_biorepo'] = None
-            output_record['verbatimScientificName_biorepo_map'] = None
-
-            for field in biorepo_lineage_fields_ordered:
-                output_record[field] = None
-
-            compound_key_for_map = (lookup_taxon_group, neon_taxon_id)
-
-            if neon_taxon_id and compound_key_for_map in neon_biorepo_map:
-                biorepo_map_entry = neon_biorepo_map[compound_key_for_map]
-                biorepo_tid = biorepo_map_entry.get('tid')
-
-                if biorepo_tid and biorepo_tid in taxa_data:
-                    processed_mapped_biorepo_records += 1 
-                    taxa_entry = taxa_data[biorepo_tid]
-                    
-                    lineage_info = build_lineage(biorepo_tid, taxa_data, taxa_enum_tree, taxon_units_data)
-
-                    output_record['is_biorepo_mapped'] = True
-                    output_record['biorepo_tid'] = biorepo_tid
-                    output_record['scientificName_biorepo'] = taxa_entry.get('sciName')
-
-                    if taxa_entry.get('rankID'):
-                        output_record['taxonRank_biorepo'] = taxon_units_data.get(taxa_entry['rankID'], {}).get('rankname')
-
-                    for rank_key, sci_name in lineage_info.items():
-                        formatted_rank_field = f'biorepo_{rank_key}'
-                        if formatted_rank_field in biorepo_lineage_fields_ordered:
-                             output_record[formatted_rank_field] = sci_name
+            map_entry = neon_biorepo_map.get((group_code, neon_taxon_id)) if neon_taxon_id else None
+            biorepo_tid = map_entry.get('tid') if map_entry is not None else None
+            taxa_entry = taxa_data.get(biorepo_tid) if biorepo_tid else None
+            output_record = build_biorepo_record(group_code, neon_taxon_id, map_entry, taxa_entry, lineage_of,
+                                                 taxon_units_data, biorepo_lineage_fields_ordered,
+                                                 selector, keep_unfiltered)
+            if output_record is None:
+                continue
 
-                    output_record['verbatimScientificName_biorepo_map'] = biorepo_map_entry.get('verbatimScientificName')
-                else:
-                    print(f"Warning: NEON record (group '{lookup_taxon_group}', ID '{neon_taxon_id}') mapped to biorepo_tid '{biorepo_tid}' but biorepo_tid not found in biorepo_taxa. Only basic map data included for this entry.", file=sys.stderr)
-                    output_record['biorepo_tid'] = biorepo_tid
-                    output_record['verbatimScientificName_biorepo_map'] = biorepo_map_entry.get('verbatimScientificName')
-            else:
-                print(f"Info: NEON record (group '{lookup_taxon_group}', ID '{neon_taxon_id}') not found in biorepo_neon_taxonomy mapping. No biorepo data will be included for this entry.", file=sys.stderr)
-            
-            second_taxonomy_records.append(output_record)
+            if keep_unfiltered:
+                second_taxonomy_records.append(output_record)
+            if selector is not None:
+                selector.add(output_record)
             all_fieldnames.update(output_record.keys())
 
-    if not second_taxonomy_records:
+    if not processed_neon_records:
         print(f"No records processed for group '{group_code}'. Output file will be empty.", file=sys.stderr)
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        open(output_path, 'w').close()
+        for path in {output_path, unfiltered_output_path} - {None}:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
         return
 
     final_fieldnames = []
@@ -306,26 +498,78 @@ def generate_second_taxonomy(group_code: str,
     remaining_fields = sorted(list(all_fieldnames - set(final_fieldnames)))
     final_fieldnames.extend(remaining_fields)
 
-    output_dir = os.path.dirname(output_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    with open(output_path, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=final_fieldnames)
-        writer.writeheader()
-        writer.writerows(second_taxonomy_records)
-
-    print(f"Successfully generated {len(second_taxonomy_records)} second taxonomy records for '{group_code}' to: {output_path}")
+    if keep_unfiltered:
+        write_taxonomy_records(unfiltered_output_path, second_taxonomy_records, final_fieldnames)
+        print(f"Successfully generated {len(second_taxonomy_records)} second taxonomy records for '{group_code}' to: {unfiltered_output_path}")
+
+    if selector is not None:
+        write_taxonomy_records(output_path, selector.rows(), final_fieldnames)
+        print(f"Selected {len(selector)} unique accepted taxa of {processed_neon_records} NEON records for '{group_code}'.")
+        if selector.synonym_resolver is not None:
+            print(f"Resolved synonyms to {selector.stand_in_count()} accepted taxa that had no row of their own.")
+        print(f"Accepted Biorepo taxa saved to: {output_path}")
+
+def generate_second_taxonomies(group_codes,
+                                neonhq_taxonomy_template: str,
+                                biorepo_neon_taxonomy_path: str,
+                                biorepo_taxa_path: str,
+                                biorepo_enum_tree_path: str,
+                                biorepo_taxon_units_path: str,
+                                output_template: str,
+                                cache_dir=None,
+                                use_cache=True,
+                                taxstatus_path=None,
+                                unfiltered_output_template=None,
+                                resolve_synonyms=False):
+    """
+    Generates the second taxonomy CSV for several groups in one process.
+    The reference tables are loaded once and shared by all groups.
+    `neonhq_taxonomy_template` and `output_template` are paths containing a
+    '{group}' placeholder, which is replaced by each group code.
+    With `taxstatus_path`, the accepted taxa are written instead, as in
+    generate_second_taxonomy; the unfiltered records go to
+    `unfiltered_output_template`, if given.
+    """
+    reference_tables = load_reference_tables(biorepo_neon_taxonomy_path,
+                                             biorepo_taxa_path,
+                                             biorepo_enum_tree_path,
+                                             biorepo_taxon_units_path,
+                                             cache_dir=cache_dir,
+                                             use_cache=use_cache)
+    accepted_tids = None
+    if taxstatus_path is not None:
+        accepted_tids = load_taxstatus(taxstatus_path, cache_dir=cache_dir, use_cache=use_cache,
+                                       resolve_synonyms=resolve_synonyms)
+    for group_code in group_codes:
+        generate_second_taxonomy(
+            group_code,
+            neonhq_taxonomy_template.replace('{group}', group_code),
+            biorepo_neon_taxonomy_path,
+            biorepo_taxa_path,
+            biorepo_enum_tree_path,
+            biorepo_taxon_units_path,
+            output_template.replace('{group}', group_code),
+            reference_tables=reference_tables,
+            accepted_tids=accepted_tids,
+            unfiltered_output_path=(unfiltered_output_template.replace('{group}', group_code)
+                                    if unfiltered_output_template else None)
+        )
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Generate second taxonomy CSV by combining NEON HQ data with biorepo data."
     )
-    parser.add_argument(
+    group_args = parser.add_mutually_exclusive_group(required=True)
+    group_args.add_argument(
         "--group",
-        required=True,
         help="Taxon group code (e.g., ALGAE, MACROINVERTEBRATE). This is used as the 'taxonGroup' part of the compound key for mapping to biorepo data."
     )
+    group_args.add_argument(
+        "--groups",
+        help="Comma-separated taxon group codes (e.g., ALGAE,BEETLE,TICK) to generate in a single run, "
+             "loading the biorepo reference files only once. --neonhq-taxonomy and --output must then "
+             "contain a '{group}' placeholder."
+    )
     parser.add_argument(
         "--neonhq-taxonomy",
         required=True,
@@ -358,14 +602,83 @@ if __name__ == "__main__":
         required=True,
         help="Path to the output CSV file (e.g., data/02_generated_neonbiorepo/ALGAE.biorepo.csv)."
     )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for snapshots of the parsed biorepo reference files. "
+             "Defaults to a '.cache' directory next to each reference file."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always parse the biorepo reference CSV files, ignoring and not writing snapshots."
+    )
+    parser.add_argument(
+        "--taxstatus",
+        help="Optional: Path to biorepo_taxstatus.csv. If given, --output receives only the accepted taxa, as "
+             "filter_biorepo_accepted.py would select them (e.g., data/03_accepted_taxonomies/ALGAE.biorepo.accepted.csv), "
+             "and lineages are only built for those records."
+    )
+    parser.add_argument(
+        "--unfiltered-output",
+        help="Optional, with --taxstatus: Path to also write every generated record to, for debugging "
+             "(e.g., data/02_generated_neonbiorepo/ALGAE.biorepo.csv). Must contain '{group}' with --groups."
+    )
+    parser.add_argument(
+        "--resolve-synonyms",
+        action="store_true",
+        help="With --taxstatus: keep records mapped to synonyms under their accepted tid, with the accepted "
+             "taxon's name, rank and lineage (see filter_biorepo_accepted.py --resolve-synonyms)."
+    )
     args = parser.parse_args()
 
-    generate_second_taxonomy(
-        args.group,
-        args.neonhq_taxonomy,
-        args.biorepo_neon_taxonomy,
-        args.biorepo_taxa,
-        args.biorepo_enum_tree,
-        args.biorepo_taxon_units,
-        args.output
-    )
\ No newline at end of file
+    if (args.unfiltered_output or args.resolve_synonyms) and not args.taxstatus:
+        parser.error("--unfiltered-output and --resolve-synonyms require --taxstatus.")
+
+    if args.groups:
+        group_codes = [g.strip() for g in args.groups.split(',') if g.strip()]
+        if not group_codes:
+            parser.error("--groups must list at least one group code.")
+        if '{group}' not in args.neonhq_taxonomy or '{group}' not in args.output:
+            parser.error("--neonhq-taxonomy and --output must contain a '{group}' placeholder when --groups is used.")
+        if args.unfiltered_output and '{group}' not in args.unfiltered_output:
+            parser.error("--unfiltered-output must contain a '{group}' placeholder when --groups is used.")
+
+        generate_second_taxonomies(
+            group_codes,
+            args.neonhq_taxonomy,
+            args.biorepo_neon_taxonomy,
+            args.biorepo_taxa,
+            args.biorepo_enum_tree,
+            args.biorepo_taxon_units,
+            args.output,
+            cache_dir=args.cache_dir,
+            use_cache=not args.no_cache,
+            taxstatus_path=args.taxstatus,
+            unfiltered_output_template=args.unfiltered_output,
+            resolve_synonyms=args.resolve_synonyms
+        )
+    else:
+        reference_tables = load_reference_tables(
+            args.biorepo_neon_taxonomy,
+            args.biorepo_taxa,
+            args.biorepo_enum_tree,
+            args.biorepo_taxon_units,
+            cache_dir=args.cache_dir,
+            use_cache=not args.no_cache
+        )
+        accepted_tids = None
+        if args.taxstatus:
+            accepted_tids = load_taxstatus(args.taxstatus, cache_dir=args.cache_dir, use_cache=not args.no_cache,
+                                           resolve_synonyms=args.resolve_synonyms)
+        generate_second_taxonomy(
+            args.group,
+            args.neonhq_taxonomy,
+            args.biorepo_neon_taxonomy,
+            args.biorepo_taxa,
+            args.biorepo_enum_tree,
+            args.biorepo_taxon_units,
+            args.output,
+            reference_tables=reference_tables,
+            accepted_tids=accepted_tids,
+            unfiltered_output_path=args.unfiltered_output
+        )
@@ -0,0 +1,565 @@
+# scripts/minhash_taxonomies.py
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from compare_taxonomies import (EdgeIndex, SOURCE_ID_COLUMNS, calculate_jaccard_index,
+                                discover_groups, load_lineage_edges)
+
+# MinHash permutations are h -> (a * h + b) mod MERSENNE_PRIME over 61-bit edge hashes
+MERSENNE_PRIME = (1 << 61) - 1
+DEFAULT_NUM_PERM = 128
+DEFAULT_SEED = 1
+# 32 bands of 4 rows: snapshots with a Jaccard index above ~0.42 are likely LSH candidates
+DEFAULT_BANDS = 32
+
+SIGNATURE_SUFFIX = '.minhash.json'
+# The LSH band buckets of the signatures, kept next to them (see LSHBucketStore)
+LSH_INDEX_FILENAME = 'lsh_index.sqlite'
+
+LSH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lsh_signature (
+    name TEXT PRIMARY KEY,
+    num_perm INTEGER NOT NULL,
+    seed INTEGER NOT NULL
+);
+-- The band counts whose buckets are kept for the signatures of a (num_perm, seed) setting
+CREATE TABLE IF NOT EXISTS lsh_banding (
+    num_perm INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    bands INTEGER NOT NULL,
+    PRIMARY KEY (num_perm, seed, bands)
+);
+CREATE TABLE IF NOT EXISTS lsh_bucket (
+    num_perm INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    bands INTEGER NOT NULL,
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,           -- The band's signature values, comma-separated
+    name TEXT NOT NULL,
+    PRIMARY KEY (num_perm, seed, bands, band, bucket, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS lsh_bucket_name ON lsh_bucket (name);
+"""
+
+def stable_edge_hash(edge):
+    """
+    Hashes a (parent_rank, parent_name, child_rank, child_name) edge to an integer
+    below MERSENNE_PRIME. Unlike hash(), the value is the same in every process and
+    run, so signatures persisted by different runs can be compared.
+    """
+    digest = hashlib.blake2b('\x1f'.join(edge).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % MERSENNE_PRIME
+
+def permutation_params(num_perm=DEFAULT_NUM_PERM, seed=DEFAULT_SEED):
+    """Returns the (a, b) coefficients of the `num_perm` hash permutations for `seed`."""
+    rng = random.Random(seed)
+    return [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)]
+
+def minhash_signature(edges, num_perm=DEFAULT_NUM_PERM, seed=DEFAULT_SEED):
+    """
+    Returns the MinHash signature (a list of `num_perm` integers) of a set of edge tuples.
+    An empty set gets a signature of MERSENNE_PRIME values, matching only other empty sets.
+    """
+    edge_hashes = [stable_edge_hash(edge) for edge in edges]
+    if not edge_hashes:
+        return [MERSENNE_PRIME] * num_perm
+    return [min((a * h + b) % MERSENNE_PRIME for h in edge_hashes)
+            for a, b in permutation_params(num_perm, seed)]
+
+def minhash_standard_error(jaccard, num_perm=DEFAULT_NUM_PERM):
+    """
+    Returns the standard error of a MinHash estimate of `jaccard` from `num_perm` permutations,
+    sqrt(J * (1 - J) / num_perm), as each permutation agrees with probability J. With `jaccard`
+    None, returns its bound over every Jaccard index, 0.5 / sqrt(num_perm) at J = 0.5.
+    """
+    if jaccard is None:
+        return 0.5 / num_perm ** 0.5
+    return (jaccard * (1 - jaccard) / num_perm) ** 0.5
+
+def approximate_jaccard(signature1, signature2):
+    """Estimates the Jaccard index of two edge sets from their MinHash signatures."""
+    if len(signature1) != len(signature2):
+        raise ValueError("Signatures must use the same number of permutations to be compared.")
+    return sum(1 for h1, h2 in zip(signature1, signature2) if h1 == h2) / len(signature1)
+
+def load_snapshot_edges(filepath, source, group_code):
+    """
+    Reads the lineage edges of one taxonomy snapshot (a NEON HQ or Biorepo taxonomy CSV)
+    as a set of (parent_rank, parent_name, child_rank, child_name) tuples, or None on error.
+    """
+    edge_index = EdgeIndex()
+    edges, _ = load_lineage_edges(filepath, group_code, SOURCE_ID_COLUMNS[source], source, edge_index)
+    if edges is None:
+        return None
+    return {edge_index.decode(edge) for edge in edges}
+
+def signature_path(signature_dir, name):
+    return os.path.join(signature_dir, f"{name}{SIGNATURE_SUFFIX}")
+
+def save_signature(signature_dir, name, signature, source, group_code, edge_count,
+                   input_path=None, seed=DEFAULT_SEED):
+    """Persists the signature of a snapshot as '<signature_dir>/<name>.minhash.json'."""
+    os.makedirs(signature_dir, exist_ok=True)
+    record = {
+        'name': name,
+        'source': source,
+        'group_code': group_code,
+        'input': input_path,
+        'edge_count': edge_count,
+        'num_perm': len(signature),
+        'seed': seed,
+        'signature': signature
+    }
+    filepath = signature_path(signature_dir, name)
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, filepath)
+    return filepath
+
+def load_signature(signature_dir, name):
+    """Returns the signature record persisted as `name` in `signature_dir`, or None if there is none."""
+    try:
+        with open(signature_path(signature_dir, name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def load_signatures(signature_dir):
+    """Returns {name: signature record} for every signature persisted in `signature_dir`."""
+    records = {}
+    for filepath in sorted(glob.glob(os.path.join(glob.escape(signature_dir), f"*{SIGNATURE_SUFFIX}"))):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        records[record['name']] = record
+    return records
+
+class LSHIndex:
+    """
+    Locality-sensitive hashing over MinHash signatures: each signature is cut into
+    `bands` bands, and snapshots sharing any identical band become candidates.
+    Lookups only touch one bucket per band, whatever the number of indexed snapshots.
+    """
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS):
+        if num_perm % bands:
+            raise ValueError(f"The number of permutations ({num_perm}) must be a multiple of the number of bands ({bands}).")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)] # Per band: {band values: {names}}
+
+    def band_keys(self, signature):
+        """Returns the values of each band of `signature`, which key its bucket in that band."""
+        return [tuple(signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def add(self, name, signature):
+        for band_buckets, key in zip(self.buckets, self.band_keys(signature)):
+            band_buckets.setdefault(key, set()).add(name)
+
+    def candidates(self, signature):
+        """Returns the names of the indexed snapshots sharing at least one band with `signature`."""
+        names = set()
+        for band_buckets, key in zip(self.buckets, self.band_keys(signature)):
+            names.update(band_buckets.get(key, ()))
+        return names
+
+class LSHBucketStore:
+    """
+    The LSH band buckets of the signatures in a signature directory, persisted in
+    '<signature_dir>/lsh_index.sqlite' and updated whenever a signature is written
+    (see sign_snapshots), so a lookup reads only the buckets of the queried signature
+    and the signatures of its candidates. Only signatures of the same (num_perm, seed)
+    setting are candidates of each other. The buckets of a band count are built from
+    the signature files the first time that band count is used (see ensure_banding).
+    """
+    def __init__(self, signature_dir):
+        os.makedirs(signature_dir, exist_ok=True)
+        self.signature_dir = signature_dir
+        self.connection = sqlite3.connect(os.path.join(signature_dir, LSH_INDEX_FILENAME), timeout=60)
+        self.connection.executescript(LSH_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _insert_buckets(self, name, signature, seed, bands):
+        index = LSHIndex(len(signature), bands)
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO lsh_bucket (num_perm, seed, bands, band, bucket, name) VALUES (?, ?, ?, ?, ?, ?)",
+            ((len(signature), seed, bands, band, ','.join(map(str, key)), name)
+             for band, key in enumerate(index.band_keys(signature))))
+
+    def add(self, name, signature, seed=DEFAULT_SEED):
+        """Indexes (or re-indexes) the signature of `name` under every band count kept for its setting."""
+        num_perm = len(signature)
+        with self.connection:
+            self.connection.execute("DELETE FROM lsh_bucket WHERE name = ?", (name,))
+            self.connection.execute("INSERT OR REPLACE INTO lsh_signature (name, num_perm, seed) VALUES (?, ?, ?)",
+                                    (name, num_perm, seed))
+            for (bands,) in self.connection.execute("SELECT bands FROM lsh_banding WHERE num_perm = ? AND seed = ?",
+                                                    (num_perm, seed)).fetchall():
+                self._insert_buckets(name, signature, seed, bands)
+
+    def remove(self, name):
+        with self.connection:
+            self.connection.execute("DELETE FROM lsh_bucket WHERE name = ?", (name,))
+            self.connection.execute("DELETE FROM lsh_signature WHERE name = ?", (name,))
+
+    def is_indexed(self, name, num_perm, seed):
+        return self.connection.execute("SELECT 1 FROM lsh_signature WHERE name = ? AND num_perm = ? AND seed = ?",
+                                       (name, num_perm, seed)).fetchone() is not None
+
+    def ensure_banding(self, num_perm, seed, bands):
+        """
+        Keeps the buckets of `bands` bands for the (num_perm, seed) setting from now on. The
+        first time, they are built from every signature file of that setting, which are also
+        (re-)indexed. Raises ValueError if `num_perm` is not a multiple of `bands`.
+        """
+        LSHIndex(num_perm, bands)
+        if self.connection.execute("SELECT 1 FROM lsh_banding WHERE num_perm = ? AND seed = ? AND bands = ?",
+                                   (num_perm, seed, bands)).fetchone():
+            return
+        records = [record for record in load_signatures(self.signature_dir).values()
+                   if record['num_perm'] == num_perm and record['seed'] == seed]
+        with self.connection:
+            self.connection.execute("INSERT INTO lsh_banding (num_perm, seed, bands) VALUES (?, ?, ?)",
+                                    (num_perm, seed, bands))
+            for record in records:
+                self.connection.execute("INSERT OR REPLACE INTO lsh_signature (name, num_perm, seed) VALUES (?, ?, ?)",
+                                        (record['name'], num_perm, seed))
+                self.connection.execute("DELETE FROM lsh_bucket WHERE name = ? AND bands = ?", (record['name'], bands))
+                self._insert_buckets(record['name'], record['signature'], seed, bands)
+
+    def candidates(self, signature, seed=DEFAULT_SEED, bands=DEFAULT_BANDS):
+        """
+        Returns the names of the indexed signatures of the same setting that share at least
+        one of the `bands` bands with `signature` (see LSHIndex.candidates).
+        """
+        self.ensure_banding(len(signature), seed, bands)
+        index = LSHIndex(len(signature), bands)
+        names = set()
+        for band, key in enumerate(index.band_keys(signature)):
+            names.update(name for (name,) in self.connection.execute(
+                "SELECT name FROM lsh_bucket WHERE num_perm = ? AND seed = ? AND bands = ? AND band = ? AND bucket = ?",
+                (len(signature), seed, bands, band, ','.join(map(str, key)))))
+        return names
+
+def sign_snapshots(snapshots, signature_dir, num_perm=DEFAULT_NUM_PERM, seed=DEFAULT_SEED):
+    """
+    Computes and persists the signature of each (name, source, group_code, input_path)
+    snapshot, and indexes it in the LSH buckets of `signature_dir` (see LSHBucketStore).
+    Returns the names of the snapshots that could not be read.
+    """
+    failed = []
+    with LSHBucketStore(signature_dir) as lsh_buckets:
+        for name, source, group_code, input_path in snapshots:
+            edges = load_snapshot_edges(input_path, source, group_code)
+            if edges is None:
+                failed.append(name)
+                continue
+            signature = minhash_signature(edges, num_perm, seed)
+            filepath = save_signature(signature_dir, name, signature, source, group_code, len(edges), input_path, seed)
+            lsh_buckets.add(name, signature, seed)
+            print(f"Signature of {name} ({len(edges)} edges) saved to: {filepath}")
+        if num_perm % DEFAULT_BANDS == 0:
+            lsh_buckets.ensure_banding(num_perm, seed, DEFAULT_BANDS)
+    return failed
+
+def query_similar(signature_dir, name, threshold=0.0, bands=DEFAULT_BANDS):
+    """
+    Looks up the snapshots similar to `name` through the persisted LSH buckets of
+    `signature_dir` (see LSHBucketStore). Returns [(other name, approximate Jaccard)]
+    for candidates at or above `threshold`, most similar first, or None if there is
+    no signature named `name`. Only the signatures of the candidates are read.
+    """
+    record = load_signature(signature_dir, name)
+    if record is None:
+        return None
+    signature, seed = record['signature'], record['seed']
+    matches = []
+    with LSHBucketStore(signature_dir) as lsh_buckets:
+        if not lsh_buckets.is_indexed(name, record['num_perm'], seed):
+            lsh_buckets.add(name, signature, seed) # e.g. a signature file copied in from elsewhere
+        for other in sorted(lsh_buckets.candidates(signature, seed, bands) - {name}):
+            other_record = load_signature(signature_dir, other)
+            if other_record is None:
+                lsh_buckets.remove(other) # The signature file was deleted
+                continue
+            estimate = approximate_jaccard(signature, other_record['signature'])
+            if estimate >= threshold:
+                matches.append((other, estimate))
+    return sorted(matches, key=lambda match: (-match[1], match[0]))
+
+def benchmark_accuracy(accepted_dir, num_perm=DEFAULT_NUM_PERM, seed=DEFAULT_SEED, bands=DEFAULT_BANDS,
+                       lsh_threshold=0.5):
+    """
+    Compares MinHash estimates against exact Jaccard indices on the accepted taxonomies in
+    `accepted_dir`: NEON HQ against Biorepo for every group, and every snapshot against every
+    other for the LSH recall (the share of pairs with an exact Jaccard of at least
+    `lsh_threshold` that are returned as candidates). Returns the results as a dictionary.
+    """
+    templates = {
+        'neonhq': os.path.join(accepted_dir, '{group}.neonhq.accepted.csv'),
+        'biorepo': os.path.join(accepted_dir, '{group}.biorepo.accepted.csv')
+    }
+    group_codes = [group_code for group_code in discover_groups(templates['neonhq'])
+                   if os.path.exists(templates['biorepo'].replace('{group}', group_code))]
+
+    edges = {}
+    signatures = {}
+    started = time.perf_counter()
+    for group_code in group_codes:
+        for source, template in templates.items():
+            snapshot_edges = load_snapshot_edges(template.replace('{group}', group_code), source, group_code)
+            if snapshot_edges is not None:
+                edges[f"{group_code}.{source}"] = snapshot_edges
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for name, snapshot_edges in edges.items():
+        signatures[name] = minhash_signature(snapshot_edges, num_perm, seed)
+    signature_seconds = time.perf_counter() - started
+
+    groups = []
+    for group_code in group_codes:
+        neonhq_name, biorepo_name = f"{group_code}.neonhq", f"{group_code}.biorepo"
+        if neonhq_name not in edges or biorepo_name not in edges:
+            continue
+        exact = calculate_jaccard_index(edges[neonhq_name], edges[biorepo_name])
+        estimate = approximate_jaccard(signatures[neonhq_name], signatures[biorepo_name])
+        groups.append({'group_code': group_code, 'exact_jaccard': exact, 'approximate_jaccard': estimate,
+                       'absolute_error': abs(estimate - exact),
+                       'expected_standard_error': minhash_standard_error(exact, num_perm)})
+
+    index = LSHIndex(num_perm, bands)
+    for name, signature in signatures.items():
+        index.add(name, signature)
+    names = sorted(signatures)
+    similar_pairs = found_pairs = candidate_pairs = 0
+    for i, name in enumerate(names):
+        candidates = index.candidates(signatures[name])
+        for other in names[i + 1:]:
+            is_candidate = other in candidates
+            candidate_pairs += is_candidate
+            if calculate_jaccard_index(edges[name], edges[other]) >= lsh_threshold:
+                similar_pairs += 1
+                found_pairs += is_candidate
+
+    errors = [group['absolute_error'] for group in groups]
+    return {
+        'num_perm': num_perm,
+        'seed': seed,
+        'bands': bands,
+        'groups': groups,
+        'mean_absolute_error': sum(errors) / len(errors) if errors else None,
+        'max_absolute_error': max(errors) if errors else None,
+        'max_standard_error': minhash_standard_error(None, num_perm),
+        'snapshots': len(names),
+        'snapshot_pairs': len(names) * (len(names) - 1) // 2,
+        'lsh_threshold': lsh_threshold,
+        'similar_pairs': similar_pairs,
+        'lsh_candidate_pairs': candidate_pairs,
+        'lsh_recall': found_pairs / similar_pairs if similar_pairs else None,
+        'load_seconds': load_seconds,
+        'signature_seconds': signature_seconds
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Approximate lineage edge similarity between many taxonomy snapshots with MinHash signatures "
+                    "and LSH candidate lookup."
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sign_parser = subparsers.add_parser(
+        'sign',
+        help="Compute and persist the MinHash signature of taxonomy snapshots."
+    )
+    sign_parser.add_argument(
+        "--source",
+        choices=sorted(SOURCE_ID_COLUMNS),
+        required=True,
+        help="Taxonomy source of the input files, which selects the lineage columns."
+    )
+    sign_group_args = sign_parser.add_mutually_exclusive_group(required=True)
+    sign_group_args.add_argument(
+        "--group",
+        help="Taxon group code of the input file (for group-specific parsing rules)."
+    )
+    sign_group_args.add_argument(
+        "--groups",
+        help="Comma-separated taxon group codes to sign in one run. --input must then contain a '{group}' placeholder."
+    )
+    sign_parser.add_argument(
+        "--input",
+        required=True,
+        help="Path to the taxonomy CSV snapshot (e.g., data/03_accepted_taxonomies/ALGAE.neonhq.accepted.csv)."
+    )
+    sign_parser.add_argument(
+        "--label",
+        help="Optional snapshot label (e.g., a download date). Signatures are named "
+             "'<GROUP>.<source>' or '<GROUP>.<source>.<label>'."
+    )
+    sign_parser.add_argument(
+        "--signature-dir",
+        required=True,
+        help="Directory where signatures are persisted, one '<name>.minhash.json' file per snapshot, "
+             f"with their LSH buckets in '{LSH_INDEX_FILENAME}'."
+    )
+    sign_parser.add_argument(
+        "--num-perm",
+        type=int,
+        default=DEFAULT_NUM_PERM,
+        help=f"Number of hash permutations per signature (default: {DEFAULT_NUM_PERM}). "
+             "The estimate of a Jaccard index J has a standard error of sqrt(J*(1-J)/num-perm), "
+             "at most 0.5/sqrt(num-perm)."
+    )
+    sign_parser.add_argument(
+        "--seed",
+        type=int,
+        default=DEFAULT_SEED,
+        help=f"Seed of the hash permutations (default: {DEFAULT_SEED}). Only signatures with the same seed can be compared."
+    )
+
+    compare_parser = subparsers.add_parser(
+        'compare',
+        help="Print the approximate Jaccard index of two persisted signatures."
+    )
+    compare_parser.add_argument("--signature-dir", required=True, help="Directory of persisted signatures.")
+    compare_parser.add_argument("names", nargs=2, help="Names of the two signatures (e.g., ALGAE.neonhq ALGAE.biorepo).")
+
+    query_parser = subparsers.add_parser(
+        'query',
+        help="List the persisted snapshots similar to one of them, through LSH candidate lookup."
+    )
+    query_parser.add_argument("--signature-dir", required=True, help="Directory of persisted signatures.")
+    query_parser.add_argument("name", help="Name of the signature to look up (e.g., PLANT.neonhq).")
+    query_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.0,
+        help="Only list candidates with an approximate Jaccard index at or above this value (default: 0)."
+    )
+    query_parser.add_argument(
+        "--bands",
+        type=int,
+        default=DEFAULT_BANDS,
+        help=f"Number of LSH bands (default: {DEFAULT_BANDS}). More bands find less similar candidates. "
+             "The buckets of a band count other than the default are built once, on its first query."
+    )
+
+    benchmark_parser = subparsers.add_parser(
+        'benchmark',
+        help="Measure the accuracy of the MinHash estimates and LSH lookup against exact Jaccard indices."
+    )
+    benchmark_parser.add_argument(
+        "--accepted-dir",
+        default=os.path.join('data', '03_accepted_taxonomies'),
+        help="Directory of '<GROUP>.neonhq.accepted.csv' and '<GROUP>.biorepo.accepted.csv' files "
+             "(default: data/03_accepted_taxonomies)."
+    )
+    benchmark_parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM,
+                                  help=f"Number of hash permutations per signature (default: {DEFAULT_NUM_PERM}).")
+    benchmark_parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                                  help=f"Seed of the hash permutations (default: {DEFAULT_SEED}).")
+    benchmark_parser.add_argument("--bands", type=int, default=DEFAULT_BANDS,
+                                  help=f"Number of LSH bands (default: {DEFAULT_BANDS}).")
+    benchmark_parser.add_argument(
+        "--lsh-threshold",
+        type=float,
+        default=0.5,
+        help="Exact Jaccard index from which a snapshot pair counts as similar for the LSH recall (default: 0.5)."
+    )
+    benchmark_parser.add_argument("--output", help="Optional: Path to a JSON file for the benchmark results.")
+
+    args = parser.parse_args()
+
+    if args.command == 'sign':
+        if args.num_perm < 1:
+            parser.error("--num-perm must be at least 1.")
+        if args.groups:
+            group_codes = [g.strip() for g in args.groups.split(',') if g.strip()]
+            if not group_codes:
+                parser.error("--groups must list at least one group code.")
+            if '{group}' not in args.input:
+                parser.error("--input must contain a '{group}' placeholder when --groups is used.")
+        else:
+            group_codes = [args.group]
+        label_suffix = f".{args.label}" if args.label else ''
+        snapshots = [(f"{group_code}.{args.source}{label_suffix}", args.source, group_code,
+                      args.input.replace('{group}', group_code))
+                     for group_code in group_codes]
+        failed = sign_snapshots(snapshots, args.signature_dir, args.num_perm, args.seed)
+        if failed:
+            print(f"Error: Could not sign: {', '.join(failed)}", file=sys.stderr)
+            sys.exit(1)
+
+    elif args.command == 'compare':
+        records = {name: load_signature(args.signature_dir, name) for name in args.names}
+        missing = [name for name, record in records.items() if record is None]
+        if missing:
+            print(f"Error: No signature named {', '.join(missing)} in {args.signature_dir}", file=sys.stderr)
+            sys.exit(1)
+        first, second = (records[name] for name in args.names)
+        if first['seed'] != second['seed']:
+            print("Error: The signatures were computed with different seeds and cannot be compared.", file=sys.stderr)
+            sys.exit(1)
+        if first['num_perm'] != second['num_perm']:
+            print(f"Error: The signatures were computed with different numbers of permutations "
+                  f"({first['num_perm']} and {second['num_perm']}) and cannot be compared.", file=sys.stderr)
+            sys.exit(1)
+        estimate = approximate_jaccard(first['signature'], second['signature'])
+        print(f"Approximate Jaccard Index of {args.names[0]} and {args.names[1]}: {estimate:.4f}")
+
+    elif args.command == 'query':
+        try:
+            matches = query_similar(args.signature_dir, args.name, args.threshold, args.bands)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if matches is None:
+            print(f"Error: No signature named {args.name} in {args.signature_dir}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Snapshots similar to {args.name} ({len(matches)} LSH candidates at or above {args.threshold}):")
+        for other, estimate in matches:
+            print(f"  {other}: {estimate:.4f}")
+
+    elif args.command == 'benchmark':
+        try:
+            results = benchmark_accuracy(args.accepted_dir, args.num_perm, args.seed, args.bands, args.lsh_threshold)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"MinHash accuracy with {results['num_perm']} permutations "
+              f"(standard error at most {results['max_standard_error']:.4f}):")
+        for group in results['groups']:
+            print(f"  {group['group_code']}: exact {group['exact_jaccard']:.4f}, "
+                  f"approximate {group['approximate_jaccard']:.4f}, error {group['absolute_error']:.4f} "
+                  f"(expected standard error {group['expected_standard_error']:.4f})")
+        if results['groups']:
+            print(f"Mean absolute error: {results['mean_absolute_error']:.4f}, "
+                  f"max absolute error: {results['max_absolute_error']:.4f}")
+        recall = 'n/a' if results['lsh_recall'] is None else f"{results['lsh_recall']:.4f}"
+        print(f"LSH with {results['bands']} bands: {results['lsh_candidate_pairs']} candidate pairs of "
+              f"{results['snapshot_pairs']}, recall {recall} on the {results['similar_pairs']} pairs "
+              f"with an exact Jaccard of at least {results['lsh_threshold']}")
+        print(f"Edges loaded in {results['load_seconds']:.2f}s, signatures computed in {results['signature_seconds']:.2f}s")
+        if args.output:
+            output_dir = os.path.dirname(args.output)
+            if output_dir and not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            print(f"Benchmark results saved to: {args.output}")
@@ -0,0 +1,180 @@
+# scripts/reference_cache.py
+
+import hashlib
+import mmap
+import os
+import pickle
+import sys
+from array import array
+from bisect import bisect_left
+
+# Bump this when the structure returned by a cached loader changes,
+# so snapshots written by older code are never picked up.
+CACHE_FORMAT_VERSION = 1
+
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """Returns the hex SHA-256 digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def default_cache_dir(filepath):
+    """Snapshots live in a '.cache' directory next to the source file."""
+    return os.path.join(os.path.dirname(os.path.abspath(filepath)), '.cache')
+
+def snapshot_paths(filepath, loader, loader_args, cache_dir, extension):
+    """
+    Returns (cache_dir, snapshot_prefix, snapshot_path) of the snapshot of
+    loader(filepath, *loader_args) for the file's current content.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir(filepath)
+    args_digest = hashlib.sha256(repr((CACHE_FORMAT_VERSION, loader_args)).encode('utf-8')).hexdigest()[:12]
+    snapshot_prefix = f"{os.path.basename(filepath)}.{loader.__name__}.{args_digest}."
+    content_digest = file_sha256(filepath)
+    return cache_dir, snapshot_prefix, os.path.join(cache_dir, f"{snapshot_prefix}{content_digest}.{extension}")
+
+def remove_stale_snapshots(cache_dir, snapshot_prefix, snapshot_path):
+    """
+    Creates `cache_dir` and removes older, completed snapshots of the same file and loader.
+    Temporary '*.tmp' files are left alone, as other processes may still be writing them.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        if (not name.startswith(snapshot_prefix) or name.endswith('.tmp')
+                or name == os.path.basename(snapshot_path)):
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass # Removed by another process in the meantime
+
+def load_with_cache(filepath, loader, *loader_args, cache_dir=None, use_cache=True):
+    """
+    Returns loader(filepath, *loader_args), read from an on-disk pickle snapshot
+    when one exists for the file's current content.
+
+    Snapshots are keyed by the loader, its arguments and the SHA-256 of the
+    source file, so editing the CSV invalidates its snapshot automatically.
+    Stale snapshots of the same file and loader are removed when a new one
+    is written. Any problem with the cache falls back to the plain loader.
+    """
+    if not use_cache or not os.path.exists(filepath):
+        return loader(filepath, *loader_args)
+
+    cache_dir, snapshot_prefix, snapshot_path = snapshot_paths(filepath, loader, loader_args, cache_dir, 'pickle')
+
+    if os.path.exists(snapshot_path):
+        try:
+            with open(snapshot_path, 'rb') as f:
+                data = pickle.load(f)
+            print(f"Loaded cached snapshot of {filepath} from: {snapshot_path}")
+            return data
+        except Exception as e:
+            print(f"Warning: Could not read cache snapshot {snapshot_path} ({e}). Re-reading {filepath}.", file=sys.stderr)
+
+    data = loader(filepath, *loader_args)
+
+    try:
+        remove_stale_snapshots(cache_dir, snapshot_prefix, snapshot_path)
+        tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as e:
+        print(f"Warning: Could not write cache snapshot {snapshot_path}: {e}", file=sys.stderr)
+
+    return data
+
+class SortedIntIndex:
+    """
+    A read-only set of 64-bit integers, stored as a sorted array in a file and
+    memory-mapped, so several processes share one copy through the page cache.
+    Membership is a binary search; nothing is parsed when the index is opened.
+    """
+    ITEM_SIZE = 8
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._mmap = None
+        self._values = ()
+        with open(filepath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._values = memoryview(self._mmap).cast('q')
+
+    @staticmethod
+    def write(values, filepath):
+        """Writes the sorted, distinct `values` to `filepath` atomically."""
+        tmp_path = f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            array('q', sorted(set(values))).tofile(f)
+        os.replace(tmp_path, filepath)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, value):
+        position = bisect_left(self._values, value)
+        return position < len(self._values) and self._values[position] == value
+
+    def close(self):
+        if self._mmap is not None:
+            self._values.release()
+            self._mmap.close()
+            self._mmap = None
+            self._values = ()
+
+def load_int_index_with_cache(filepath, loader, *loader_args, cache_dir=None):
+    """
+    Returns a SortedIntIndex of the integers returned by loader(filepath, *loader_args),
+    memory-mapped from an on-disk index that is compiled once per content of the
+    source file (keyed like the snapshots of load_with_cache). Returns None when the
+    index can neither be read nor written, so the caller can fall back to a plain load.
+
+    A ValueError of the loader (values that cannot be indexed) is passed on, and is
+    remembered under the same key: while the file is unchanged, later calls raise it
+    again right away, without running the loader over the file.
+    """
+    cache_dir, index_prefix, index_path = snapshot_paths(filepath, loader, loader_args, cache_dir,
+                                                         f"i64{sys.byteorder[0]}")
+    unindexable_path = f"{os.path.splitext(index_path)[0]}.unindexable"
+
+    if os.path.exists(unindexable_path):
+        try:
+            with open(unindexable_path, 'r', encoding='utf-8') as f:
+                reason = f.read()
+        except OSError:
+            reason = None
+        if reason is not None:
+            raise ValueError(reason)
+
+    if not os.path.exists(index_path):
+        try:
+            values = loader(filepath, *loader_args)
+        except ValueError as e:
+            try:
+                remove_stale_snapshots(cache_dir, index_prefix, unindexable_path)
+                tmp_path = f"{unindexable_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(str(e))
+                os.replace(tmp_path, unindexable_path)
+            except OSError as write_error:
+                print(f"Warning: Could not write {unindexable_path}: {write_error}", file=sys.stderr)
+            raise
+        try:
+            remove_stale_snapshots(cache_dir, index_prefix, index_path)
+            SortedIntIndex.write(values, index_path)
+        except OSError as e:
+            print(f"Warning: Could not write index {index_path}: {e}", file=sys.stderr)
+            return None
+
+    try:
+        index = SortedIntIndex(index_path)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read index {index_path}: {e}", file=sys.stderr)
+        return None
+    print(f"Using index of {filepath}: {index_path}")
+    return index
@@ -0,0 +1,350 @@
+# scripts/run_pipeline.py
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from compare_taxonomies import breakdown_output_path, compare_taxonomies, edge_output_paths, write_summary
+from download_neonhq_taxonomy import download_taxonomies
+from filter_biorepo_accepted import load_taxstatus
+from filter_neonhq_accepted import select_neonhq_accepted
+from generate_biorepo_taxonomy import generate_second_taxonomy, load_reference_tables
+from reference_cache import file_sha256
+
+# Same groups, in the same order, as GROUPS in the Makefile
+DEFAULT_GROUPS = [
+    'ALGAE', 'BEETLE', 'BIRD', 'FISH', 'HERPETOLOGY', 'MACROINVERTEBRATE',
+    'MOSQUITO', 'MOSQUITO_PATHOGENS', 'SMALL_MAMMAL', 'PLANT', 'TICK'
+]
+DEFAULT_API_URL = "https://data.neonscience.org/api/v0/taxonomy"
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Scripts whose code each stage depends on, including the modules they import; editing one reruns that stage
+STAGE_SCRIPTS = {
+    'generate': [os.path.join(SCRIPTS_DIR, name) for name in
+                 ('generate_biorepo_taxonomy.py', 'filter_biorepo_accepted.py',
+                  'reference_cache.py', 'synonym_resolver.py')],
+    'filter_neonhq': [os.path.join(SCRIPTS_DIR, name) for name in
+                      ('filter_neonhq_accepted.py', 'synonym_resolver.py')],
+    'compare': [os.path.join(SCRIPTS_DIR, 'compare_taxonomies.py')],
+}
+MANIFEST_FILENAME = '.pipeline_manifest.json'
+
+# Reference tables and accepted tids for Step 02. Loaded once in the parent before the pool starts,
+# so forked workers share them; workers started another way load their own copy.
+_reference_tables = None
+_accepted_tids = {} # {resolve_synonyms: accepted tids, or their SynonymResolver}
+
+def pipeline_paths(data_dir):
+    """Returns the pipeline's directory and reference file layout (mirrors the Makefile)."""
+    uploaded_dir = os.path.join(data_dir, '00_uploaded_data')
+    return {
+        'uploaded_dir': uploaded_dir,
+        'download_dir': os.path.join(data_dir, '01_downloaded_neonhq'),
+        'accepted_dir': os.path.join(data_dir, '03_accepted_taxonomies'),
+        'similarity_dir': os.path.join(data_dir, '04_similiarity_index'),
+        'biorepo_neon_taxonomy': os.path.join(uploaded_dir, 'biorepo_neon_taxonomy.csv'),
+        'biorepo_taxa': os.path.join(uploaded_dir, 'biorepo_taxa.csv'),
+        'biorepo_enum_tree': os.path.join(uploaded_dir, 'biorepo_taxaenumtree.csv'),
+        'biorepo_taxon_units': os.path.join(uploaded_dir, 'biorepo_taxonunits.csv'),
+        'biorepo_taxstatus': os.path.join(uploaded_dir, 'biorepo_taxstatus.csv'),
+        'manifest': os.path.join(data_dir, MANIFEST_FILENAME),
+    }
+
+def load_manifest(manifest_path):
+    """
+    Loads the stage manifest: {group: {stage: {'inputs': {path: sha256}, 'outputs': [...], ...}}}.
+    A missing or unreadable manifest means every stage is out of date.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read pipeline manifest {manifest_path} ({e}). Rebuilding every stage.", file=sys.stderr)
+        return {}
+
+def write_manifest(manifest_path, manifest):
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def hash_inputs(input_paths, known_hashes):
+    """
+    Returns {path: sha256} for the given files, reusing hashes from `known_hashes`
+    (the shared reference files and scripts are only hashed once per run).
+    Missing files hash to None.
+    """
+    hashes = {}
+    for path in input_paths:
+        if path not in known_hashes:
+            known_hashes[path] = file_sha256(path) if os.path.exists(path) else None
+        hashes[path] = known_hashes[path]
+    return hashes
+
+def stage_is_current(previous_stage, input_hashes, options=None):
+    """
+    A stage can be skipped if its inputs and `options` (see stage_options) are unchanged
+    and all of its outputs still exist.
+    """
+    return (previous_stage is not None and
+            previous_stage.get('inputs') == input_hashes and
+            previous_stage.get('options', {}) == (options or {}) and
+            all(os.path.exists(path) for path in previous_stage.get('outputs', [])))
+
+def stage_options(resolve_synonyms=False):
+    """
+    Returns {stage: options} for the options that change a stage's output. They are
+    recorded in the manifest only when set, so older manifests stay valid.
+    """
+    options = {}
+    if resolve_synonyms:
+        options['generate'] = options['filter_neonhq'] = {'resolve_synonyms': True}
+    return options
+
+def _load_shared_reference_tables(paths, resolve_synonyms=False):
+    global _reference_tables
+    if _reference_tables is None:
+        _reference_tables = load_reference_tables(paths['biorepo_neon_taxonomy'],
+                                                  paths['biorepo_taxa'],
+                                                  paths['biorepo_enum_tree'],
+                                                  paths['biorepo_taxon_units'])
+    if resolve_synonyms not in _accepted_tids:
+        _accepted_tids[resolve_synonyms] = load_taxstatus(paths['biorepo_taxstatus'], resolve_synonyms=resolve_synonyms)
+
+def group_stage_inputs(group_code, paths):
+    """Returns each stage's (input paths, output paths) for one group, in pipeline order."""
+    neonhq_path = os.path.join(paths['download_dir'], f"{group_code}.neonhq.csv")
+    neonhq_accepted_path = os.path.join(paths['accepted_dir'], f"{group_code}.neonhq.accepted.csv")
+    biorepo_accepted_path = os.path.join(paths['accepted_dir'], f"{group_code}.biorepo.accepted.csv")
+    comparison_path = os.path.join(paths['similarity_dir'], f"{group_code}.comparison.txt")
+    edge_files = edge_output_paths(comparison_path)
+
+    # The Biorepo taxonomy is generated and filtered to accepted taxa in one stage
+    return {
+        'generate': ([neonhq_path, paths['biorepo_neon_taxonomy'], paths['biorepo_taxa'],
+                      paths['biorepo_enum_tree'], paths['biorepo_taxon_units'], paths['biorepo_taxstatus']]
+                     + STAGE_SCRIPTS['generate'],
+                     [biorepo_accepted_path]),
+        'filter_neonhq': ([neonhq_path] + STAGE_SCRIPTS['filter_neonhq'],
+                          [neonhq_accepted_path]),
+        'compare': ([neonhq_accepted_path, biorepo_accepted_path] + STAGE_SCRIPTS['compare'],
+                    [comparison_path, breakdown_output_path(comparison_path)] + edge_files),
+    }
+
+def run_group(group_code, paths, previous_group_manifest, known_hashes, force=False, resolve_synonyms=False):
+    """
+    Runs Steps 02-04 for one group, skipping every stage whose inputs and options
+    are unchanged since the run recorded in `previous_group_manifest`.
+    The Biorepo taxonomy is written already filtered to accepted taxa (see
+    generate_second_taxonomy). With `resolve_synonyms`, both sides keep synonym
+    records (see the filters' --resolve-synonyms).
+    Returns (comparison metrics or None if any step failed, updated group manifest).
+    """
+    neonhq_path = os.path.join(paths['download_dir'], f"{group_code}.neonhq.csv")
+    stages = group_stage_inputs(group_code, paths)
+    biorepo_accepted_path = stages['generate'][1][0]
+    neonhq_accepted_path = stages['filter_neonhq'][1][0]
+    comparison_path = stages['compare'][1][0]
+
+    group_manifest = {}
+    options = stage_options(resolve_synonyms)
+
+    def needs_run(stage):
+        input_hashes = hash_inputs(stages[stage][0], known_hashes)
+        previous_stage = previous_group_manifest.get(stage)
+        if not force and stage_is_current(previous_stage, input_hashes, options.get(stage)):
+            print(f"{group_code}: '{stage}' is up to date, skipping.")
+            group_manifest[stage] = previous_stage
+            return False
+        return True
+
+    def record(stage, **extra):
+        # Outputs are rehashed so downstream stages see this run's content
+        for output_path in stages[stage][1]:
+            known_hashes.pop(output_path, None)
+        if stage in options:
+            extra['options'] = options[stage]
+        group_manifest[stage] = dict(inputs=hash_inputs(stages[stage][0], known_hashes),
+                                     outputs=stages[stage][1], **extra)
+
+    try:
+        if needs_run('generate'):
+            _load_shared_reference_tables(paths, resolve_synonyms)
+            generate_second_taxonomy(group_code, neonhq_path,
+                                     paths['biorepo_neon_taxonomy'], paths['biorepo_taxa'],
+                                     paths['biorepo_enum_tree'], paths['biorepo_taxon_units'],
+                                     biorepo_accepted_path, reference_tables=_reference_tables,
+                                     accepted_tids=_accepted_tids[resolve_synonyms])
+            record('generate')
+
+        if needs_run('filter_neonhq'):
+            select_neonhq_accepted(neonhq_path, neonhq_accepted_path, resolve_synonyms=resolve_synonyms)
+            record('filter_neonhq')
+
+        if needs_run('compare'):
+            metrics = compare_taxonomies(group_code, neonhq_accepted_path, biorepo_accepted_path, comparison_path)
+            if metrics is None:
+                return None, group_manifest
+            record('compare', metrics=metrics)
+
+        return group_manifest['compare']['metrics'], group_manifest
+    except SystemExit:
+        # The stage scripts exit on fatal errors; only this group is affected.
+        print(f"Error: Pipeline failed for group '{group_code}'.", file=sys.stderr)
+        return None, group_manifest
+    except Exception as e:
+        print(f"Error: Pipeline failed for group '{group_code}': {e}", file=sys.stderr)
+        return None, group_manifest
+
+def run_pipeline(group_codes, data_dir, api_url, jobs, summary_output=None,
+                 download=True, force=False, download_workers=4, resolve_synonyms=False):
+    """
+    Runs the whole pipeline for each group, with up to `jobs` groups in parallel,
+    then writes jaccard_summary.csv once, in the order of `group_codes`.
+    NEON HQ downloads run first, concurrently, with at most `download_workers`
+    requests in flight.
+    Stages whose inputs (including the stage's script) have the same content
+    as in the previous run are skipped, unless `force` is set. With
+    `download` False, existing NEON HQ downloads are reused. `resolve_synonyms`
+    is passed on to both accepted-taxa filters.
+    Returns the list of (group_code, metrics) pairs.
+    """
+    paths = pipeline_paths(data_dir)
+    for dir_key in ('uploaded_dir', 'download_dir', 'accepted_dir', 'similarity_dir'):
+        os.makedirs(paths[dir_key], exist_ok=True)
+    if summary_output is None:
+        summary_output = os.path.join(paths['similarity_dir'], 'jaccard_summary.csv')
+
+    manifest = load_manifest(paths['manifest'])
+
+    # Hash the files shared by every group once, up front
+    known_hashes = {}
+    hash_inputs([paths['biorepo_neon_taxonomy'], paths['biorepo_taxa'], paths['biorepo_enum_tree'],
+                 paths['biorepo_taxon_units'], paths['biorepo_taxstatus']]
+                + sorted({path for stage_scripts in STAGE_SCRIPTS.values() for path in stage_scripts}),
+                known_hashes)
+
+    print(f"--- Running pipeline for {len(group_codes)} groups with {jobs} parallel jobs ---")
+    # Step 01 first, so we know which groups' downstream stages are stale
+    download_groups = [group_code for group_code in group_codes
+                       if download or not os.path.exists(os.path.join(paths['download_dir'], f"{group_code}.neonhq.csv"))]
+    downloaded = {}
+    if download_groups:
+        downloaded = download_taxonomies(download_groups,
+                                         os.path.join(paths['download_dir'], "{group}.neonhq.csv"),
+                                         api_url, max_workers=download_workers,
+                                         http_cache_dir=os.path.join(paths['download_dir'], '.http_cache'))
+    run_groups = [group_code for group_code in group_codes if downloaded.get(group_code, True)]
+
+    # Only load the reference tables if some group has to regenerate its Biorepo taxonomy,
+    # judged with the same inputs and options as run_group
+    generate_options = stage_options(resolve_synonyms).get('generate')
+    if force or any(
+            not stage_is_current(manifest.get(group_code, {}).get('generate'),
+                                 hash_inputs(group_stage_inputs(group_code, paths)['generate'][0], known_hashes),
+                                 generate_options)
+            for group_code in run_groups):
+        _load_shared_reference_tables(paths, resolve_synonyms)
+
+    # Start the pool now, so that forked workers inherit the reference tables loaded above
+    run_args = [(group_code, paths, manifest.get(group_code, {}), dict(known_hashes), force, resolve_synonyms)
+                for group_code in run_groups]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(run_group, *group_args) for group_args in run_args]
+            group_outcomes = dict(zip(run_groups, (future.result() for future in futures)))
+    else:
+        group_outcomes = dict(zip(run_groups, (run_group(*group_args) for group_args in run_args)))
+
+    group_results = []
+    for group_code in group_codes:
+        if group_code in group_outcomes:
+            metrics, group_manifest = group_outcomes[group_code]
+            manifest[group_code] = group_manifest
+        else:
+            metrics = None # Download failed; keep the previous manifest so nothing is skipped wrongly
+        group_results.append((group_code, metrics))
+
+    write_manifest(paths['manifest'], manifest)
+    write_summary(summary_output, group_results)
+    return group_results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the download -> generate -> filter -> compare pipeline for every group, "
+                    "processing independent groups in parallel."
+    )
+    parser.add_argument(
+        "--groups",
+        type=str,
+        default=",".join(DEFAULT_GROUPS),
+        help="Comma-separated taxon group codes to process (default: all groups of the Makefile)."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of groups to process in parallel (default: number of CPU cores)."
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=str,
+        default="data",
+        help="Main pipeline data directory, laid out as in the Makefile (default: data)."
+    )
+    parser.add_argument(
+        "--api-url",
+        type=str,
+        default=DEFAULT_API_URL,
+        help=f"Base URL for the NEON taxonomy API (default: {DEFAULT_API_URL})."
+    )
+    parser.add_argument(
+        "--summary-output",
+        type=str,
+        help="Path of the summary CSV (default: <data-dir>/04_similiarity_index/jaccard_summary.csv)."
+    )
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Maximum number of concurrent requests to the NEON API (default: 4)."
+    )
+    parser.add_argument(
+        "--no-download",
+        action="store_true",
+        help="Reuse existing NEON HQ downloads instead of fetching them again (missing ones are still downloaded)."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rerun every stage, even if its inputs are unchanged since the last run."
+    )
+    parser.add_argument(
+        "--resolve-synonyms",
+        action="store_true",
+        help="Follow synonym chains to their accepted taxa in Step 03 instead of dropping synonym records."
+    )
+    args = parser.parse_args()
+
+    group_codes = [g.strip() for g in args.groups.split(',') if g.strip()]
+    if not group_codes:
+        parser.error("--groups must list at least one group code.")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+    if args.download_workers < 1:
+        parser.error("--download-workers must be at least 1.")
+
+    group_results = run_pipeline(group_codes, args.data_dir, args.api_url, args.jobs, args.summary_output,
+                                 download=not args.no_download, force=args.force,
+                                 download_workers=args.download_workers,
+                                 resolve_synonyms=args.resolve_synonyms)
+
+    failed_groups = [group_code for group_code, metrics in group_results if metrics is None]
+    if failed_groups:
+        print(f"Pipeline failed for: {', '.join(failed_groups)}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,71 @@
+# scripts/synonym_resolver.py
+
+class SynonymResolver:
+    """
+    Follows synonym chains (taxon -> accepted taxon -> ...) to the accepted taxon
+    at their end, as a union-find forest whose roots are the accepted taxa.
+
+    Each taxon points at its accepted taxon. A taxon is accepted if it is its own
+    accepted taxon, or if it has no entry of its own (the chain ends outside the
+    table). Resolving compresses the path it walked, so every taxon on it then
+    points straight at the accepted taxon, and a chain is only walked once;
+    after compile(), every lookup is a single dict access.
+    """
+    def __init__(self):
+        self.accepted_of = {} # {taxon id: accepted id}; roots point at themselves
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Builds a compiled resolver from (taxon id, accepted id) pairs."""
+        resolver = cls()
+        for taxon_id, accepted_id in pairs:
+            resolver.add(taxon_id, accepted_id)
+        return resolver.compile()
+
+    def add(self, taxon_id, accepted_id):
+        """
+        Records that `taxon_id` is a synonym of `accepted_id`, or accepted if they are equal.
+        A taxon listed as accepted stays accepted, and otherwise the first accepted id listed wins.
+        """
+        if not taxon_id or not accepted_id:
+            return
+        if taxon_id == accepted_id or taxon_id not in self.accepted_of:
+            self.accepted_of[taxon_id] = accepted_id
+
+    def resolve(self, taxon_id):
+        """
+        Returns the accepted taxon at the end of the synonym chain of `taxon_id`,
+        or None if `taxon_id` is not in the table or its chain is a cycle.
+        """
+        accepted_of = self.accepted_of
+        if taxon_id not in accepted_of:
+            return None
+
+        path = []
+        on_path = set()
+        current = taxon_id
+        while True:
+            parent = accepted_of.get(current, current)
+            if parent is None or parent == current:
+                root = parent
+                break
+            if current in on_path:
+                root = None # A cycle without an accepted taxon
+                break
+            path.append(current)
+            on_path.add(current)
+            current = parent
+
+        # Path compression: unresolvable taxa are remembered as None
+        for node in path:
+            accepted_of[node] = root
+        return root
+
+    def compile(self):
+        """Resolves every taxon up front, so later lookups never walk a chain. Returns the resolver."""
+        for taxon_id in list(self.accepted_of):
+            self.resolve(taxon_id)
+        return self
+
+    def __len__(self):
+        return len(self.accepted_of)
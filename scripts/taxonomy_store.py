@@ -0,0 +1,757 @@
+# scripts/taxonomy_store.py
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+
+from compare_taxonomies import (DEFAULT_BREAKDOWN_RANK, EDGE_FORMATS, SOURCE_ID_COLUMNS, STANDARD_RANK_ORDER,
+                                _last_index, collect_lineage_edges, compare_taxonomies, compile_lineage_extractor,
+                                write_summary)
+from filter_biorepo_accepted import AcceptedRowSelector
+from filter_neonhq_accepted import select_accepted_rows, write_accepted_rows
+from generate_biorepo_taxonomy import (BIOREPO_CORE_FIELDNAMES, biorepo_stand_in, build_biorepo_record,
+                                       build_rank_schema, write_taxonomy_records)
+from reference_cache import file_sha256
+from synonym_resolver import SynonymResolver
+
+DEFAULT_STORE_PATH = os.path.join('data', 'taxonomy.sqlite')
+
+# Sources of the accepted taxonomies kept in the store, as named by compare_taxonomies
+ACCEPTED_SOURCES = ('neonhq', 'biorepo')
+
+# Bumped whenever STORE_SCHEMA changes; older databases have to be ingested again
+STORE_VERSION = 2
+
+# CSV columns of the scientificName and taxonRank columns of each source's rows
+NAME_RANK_COLUMNS = {
+    'neonhq': ('dwc:scientificName', 'dwc:taxonRank'),
+    'biorepo': ('scientificName_biorepo', 'taxonRank_biorepo'),
+}
+
+# Columns of accepted_taxon holding the lineage compare_taxonomies reads from each row
+LINEAGE_COLUMNS = [f"lineage_{rank}" for rank in STANDARD_RANK_ORDER]
+
+# biorepo_taxonunits columns used by build_rank_schema and build_biorepo_record
+TAXON_UNIT_COLUMNS = ['taxonunitid', 'kingdomName', 'rankid', 'rankname']
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS source_file (
+    name TEXT PRIMARY KEY,          -- e.g. 'biorepo_taxa' or 'neonhq:ALGAE'
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,           -- Content digest, so unchanged files are not ingested again
+    header TEXT NOT NULL            -- JSON list of the CSV columns
+);
+
+-- NEON HQ downloads, one row per data row of each group's CSV. The columns of the
+-- downloads differ by group, so the whole row is also kept to select and export it.
+CREATE TABLE IF NOT EXISTS neonhq_taxon (
+    taxonTypeCode TEXT NOT NULL,    -- Group the file was downloaded for
+    seq INTEGER NOT NULL,           -- Row order in the file
+    taxonID TEXT,                   -- NULL when the row is too short
+    acceptedTaxonID TEXT,
+    scientificName TEXT,            -- dwc:scientificName
+    taxonRank TEXT,                 -- dwc:taxonRank
+    row TEXT NOT NULL,              -- JSON list of the CSV fields, as read
+    PRIMARY KEY (taxonTypeCode, seq)
+);
+CREATE INDEX IF NOT EXISTS neonhq_taxon_taxon_id ON neonhq_taxon (taxonTypeCode, taxonID);
+CREATE INDEX IF NOT EXISTS neonhq_taxon_accepted_id ON neonhq_taxon (taxonTypeCode, acceptedTaxonID);
+
+-- Biorepo reference tables; keyed tables keep the last row of each key, as the CSV loaders do
+CREATE TABLE IF NOT EXISTS biorepo_taxon (
+    tid TEXT PRIMARY KEY,
+    sciName TEXT,
+    rankID TEXT,
+    rank_id INTEGER                 -- rankID as an integer, NULL if missing or invalid
+);
+CREATE INDEX IF NOT EXISTS biorepo_taxon_rank_id ON biorepo_taxon (rank_id);
+
+CREATE TABLE IF NOT EXISTS biorepo_enum_tree (
+    seq INTEGER PRIMARY KEY,
+    tid TEXT NOT NULL,
+    parenttid TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS biorepo_enum_tree_tid ON biorepo_enum_tree (tid);
+CREATE INDEX IF NOT EXISTS biorepo_enum_tree_parenttid ON biorepo_enum_tree (parenttid);
+
+-- Direct parent of each tid (see generate_biorepo_taxonomy.build_direct_parent_index)
+CREATE TABLE IF NOT EXISTS biorepo_direct_parent (
+    tid TEXT PRIMARY KEY,
+    parenttid TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS biorepo_neon_map (
+    taxonGroup TEXT,
+    taxonCode TEXT,
+    tid TEXT,
+    verbatimScientificName TEXT,
+    PRIMARY KEY (taxonGroup, taxonCode)
+);
+
+CREATE TABLE IF NOT EXISTS biorepo_taxon_unit (
+    seq INTEGER PRIMARY KEY,
+    taxonunitid TEXT,
+    kingdomName TEXT,
+    rankid TEXT,
+    rankname TEXT
+);
+
+CREATE TABLE IF NOT EXISTS biorepo_taxstatus (
+    seq INTEGER PRIMARY KEY,
+    tid TEXT,
+    tidaccepted TEXT
+);
+CREATE INDEX IF NOT EXISTS biorepo_taxstatus_tid ON biorepo_taxstatus (tid);
+
+-- Accepted taxonomies built from the tables above, in the row order of their CSV export.
+-- Their columns differ by group (e.g. the Biorepo ranks present), so each row is also kept
+-- verbatim to export it byte for byte.
+CREATE TABLE IF NOT EXISTS accepted_header (
+    source TEXT NOT NULL,           -- 'neonhq' or 'biorepo'
+    taxonTypeCode TEXT NOT NULL,
+    header TEXT NOT NULL,           -- JSON list of the CSV columns, empty for an empty file
+    PRIMARY KEY (source, taxonTypeCode)
+);
+CREATE TABLE IF NOT EXISTS accepted_taxon (
+    source TEXT NOT NULL,
+    taxonTypeCode TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    taxon_id TEXT,                  -- Value of the source's ID column (see SOURCE_ID_COLUMNS)
+    scientificName TEXT,            -- See NAME_RANK_COLUMNS
+    taxonRank TEXT,
+    lineage_kingdom TEXT,           -- Lowercase name at each rank of STANDARD_RANK_ORDER, as
+    lineage_phylum TEXT,            -- compare_taxonomies reads it; NULL if the rank is empty
+    lineage_class TEXT,
+    lineage_order TEXT,
+    lineage_family TEXT,
+    lineage_genus TEXT,
+    lineage_species TEXT,
+    lineage_subspecies TEXT,
+    lineage_variety TEXT,
+    lineage_form TEXT,
+    row TEXT NOT NULL,              -- JSON list of the CSV fields
+    PRIMARY KEY (source, taxonTypeCode, seq)
+);
+CREATE INDEX IF NOT EXISTS accepted_taxon_taxon_id ON accepted_taxon (source, taxonTypeCode, taxon_id);
+"""
+
+# Picks the direct parent of every ranked tid: among its enum tree ancestors, the one with the
+# highest non-negative rankID below its own, the first listed on ties.
+DIRECT_PARENT_SQL = """
+INSERT INTO biorepo_direct_parent (tid, parenttid)
+SELECT tid, parenttid FROM (
+    SELECT e.tid, e.parenttid,
+           ROW_NUMBER() OVER (PARTITION BY e.tid ORDER BY parent.rank_id DESC, e.seq) AS choice
+    FROM biorepo_enum_tree e
+    JOIN biorepo_taxon child ON child.tid = e.tid
+    JOIN biorepo_taxon parent ON parent.tid = e.parenttid
+    WHERE e.parenttid != e.tid AND parent.rank_id > -1 AND parent.rank_id < child.rank_id
+)
+WHERE choice = 1
+"""
+
+# Walks up from every tid in lineage_request to its root, one row per taxon on the way
+LINEAGE_SQL = """
+WITH RECURSIVE walk (start_tid, tid, depth) AS (
+    SELECT tid, tid, 0 FROM lineage_request
+    UNION ALL
+    SELECT walk.start_tid, p.parenttid, walk.depth + 1
+    FROM walk JOIN biorepo_direct_parent p ON p.tid = walk.tid
+)
+SELECT walk.start_tid, walk.tid, t.sciName, t.rankID, t.rank_id
+FROM walk JOIN biorepo_taxon t ON t.tid = walk.tid
+ORDER BY walk.start_tid, walk.depth
+"""
+
+# Reference tables: (source_file name, required columns)
+REFERENCE_TABLES = {
+    'biorepo_neon_taxonomy': ['taxonGroup', 'taxonCode'],
+    'biorepo_taxa': ['tid'],
+    'biorepo_taxaenumtree': ['tid', 'parenttid'],
+    'biorepo_taxonunits': ['taxonunitid'],
+    'biorepo_taxstatus': ['tid', 'tidaccepted'],
+}
+
+def parse_rank_id(rank_id_str):
+    """rankID as an integer, or None if it is missing or invalid (as in build_rank_ids)."""
+    if not rank_id_str:
+        return None
+    try:
+        return int(rank_id_str)
+    except ValueError:
+        return None
+
+def _column_index(fieldnames, column_name):
+    """Index of the column csv.DictReader would read as `column_name`, or None if it is absent."""
+    return _last_index(fieldnames, column_name) if column_name in fieldnames else None
+
+def _csv_field(row, index):
+    """Field `index` of a csv.reader row, or None if the row is too short (as csv.DictReader reads it)."""
+    return row[index] if index is not None and index < len(row) else None
+
+
+class TaxonomyStore:
+    """
+    SQLite database holding the Biorepo reference tables, the NEON HQ downloads and
+    the accepted taxonomies built from them, so the pipeline parses each CSV once.
+
+    ingest_* loads the CSV files (skipping files whose content is unchanged),
+    build_* derives the accepted taxonomies of a group, exactly as Steps 02 and 03
+    would write them, and export_accepted writes them back out as those CSV files.
+    load_lineage_edges lets compare_taxonomies read them straight from the store.
+    """
+    def __init__(self, db_path):
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        has_tables = self.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        if has_tables and version != STORE_VERSION:
+            self.connection.close()
+            print(f"Error: The taxonomy store {db_path} has an older layout. Delete it and ingest the files again.", file=sys.stderr)
+            sys.exit(1)
+        self.connection.executescript(STORE_SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {STORE_VERSION}")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Ingest ---
+
+    def _source_digest(self, name, filepath, force):
+        """
+        Returns the SHA-256 of `filepath`, or None if it was already ingested as `name`
+        with the same content (and `force` is False). Exits if the file is missing.
+        """
+        if not os.path.exists(filepath):
+            print(f"Error: File not found: {filepath}", file=sys.stderr)
+            sys.exit(1)
+        digest = file_sha256(filepath)
+        stored = self.connection.execute("SELECT sha256 FROM source_file WHERE name = ?", (name,)).fetchone()
+        if not force and stored is not None and stored[0] == digest:
+            print(f"Unchanged, not ingesting again: {filepath}")
+            return None
+        return digest
+
+    def _record_source(self, name, filepath, digest, fieldnames):
+        self.connection.execute("INSERT OR REPLACE INTO source_file (name, path, sha256, header) VALUES (?, ?, ?, ?)",
+                                (name, filepath, digest, json.dumps(fieldnames)))
+
+    def source_header(self, name):
+        """Columns of the file ingested as `name`, or None if there is none."""
+        stored = self.connection.execute("SELECT header FROM source_file WHERE name = ?", (name,)).fetchone()
+        return json.loads(stored[0]) if stored is not None else None
+
+    def ingest_neonhq(self, group_code, filepath, force=False):
+        """Loads a group's downloaded NEON HQ CSV. Returns True if it was (re)ingested."""
+        name = f"neonhq:{group_code}"
+        digest = self._source_digest(name, filepath, force)
+        if digest is None:
+            return False
+
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            fieldnames = next(reader, None) or []
+            indices = [_column_index(fieldnames, column) for column in
+                       ('taxonID', 'acceptedTaxonID') + NAME_RANK_COLUMNS['neonhq']]
+            with self.connection:
+                self.connection.execute("DELETE FROM neonhq_taxon WHERE taxonTypeCode = ?", (group_code,))
+                self.connection.executemany(
+                    "INSERT INTO neonhq_taxon (taxonTypeCode, seq, taxonID, acceptedTaxonID, scientificName, taxonRank, row) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((group_code, seq, *(_csv_field(row, index) for index in indices), json.dumps(row))
+                     for seq, row in enumerate(row for row in reader if row)) # csv.DictReader skips blank lines
+                )
+                self._record_source(name, filepath, digest, fieldnames)
+        count = self.connection.execute("SELECT COUNT(*) FROM neonhq_taxon WHERE taxonTypeCode = ?",
+                                        (group_code,)).fetchone()[0]
+        print(f"Ingested {count} NEON HQ records for '{group_code}' from: {filepath}")
+        return True
+
+    def _ingest_reference(self, name, filepath, force, table, insert_sql, to_params):
+        """
+        Replaces `table` with the rows of a reference CSV, each turned into the parameters
+        of `insert_sql` by to_params(seq, csv.DictReader row). Returns True if it was (re)ingested.
+        """
+        digest = self._source_digest(name, filepath, force)
+        if digest is None:
+            return False
+
+        with open(filepath, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames or []
+            missing_cols = [col for col in REFERENCE_TABLES[name] if col not in fieldnames]
+            if missing_cols:
+                print(f"Error: Required columns {missing_cols} not found in {filepath}. Found fields: {fieldnames}", file=sys.stderr)
+                sys.exit(1)
+            with self.connection:
+                self.connection.execute(f"DELETE FROM {table}")
+                self.connection.executemany(insert_sql, (params for params in
+                                                         (to_params(seq, row) for seq, row in enumerate(reader))
+                                                         if params is not None))
+                self._record_source(name, filepath, digest, fieldnames)
+        count = self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        print(f"Ingested {count} rows into {table} from: {filepath}")
+        return True
+
+    def ingest_reference_tables(self, biorepo_neon_taxonomy_path=None, biorepo_taxa_path=None,
+                                biorepo_enum_tree_path=None, biorepo_taxon_units_path=None,
+                                taxstatus_path=None, force=False):
+        """
+        Loads the given Biorepo reference CSV files, then re-derives the direct parents
+        if the taxa or the enum tree changed. Returns True if anything was (re)ingested.
+        """
+        ingested = {}
+        if biorepo_neon_taxonomy_path:
+            ingested['map'] = self._ingest_reference(
+                'biorepo_neon_taxonomy', biorepo_neon_taxonomy_path, force, 'biorepo_neon_map',
+                "INSERT OR REPLACE INTO biorepo_neon_map (taxonGroup, taxonCode, tid, verbatimScientificName) "
+                "VALUES (?, ?, ?, ?)",
+                lambda seq, row: (row['taxonGroup'], row['taxonCode'], row.get('tid'), row.get('verbatimScientificName')))
+        if biorepo_taxa_path:
+            ingested['taxa'] = self._ingest_reference(
+                'biorepo_taxa', biorepo_taxa_path, force, 'biorepo_taxon',
+                "INSERT OR REPLACE INTO biorepo_taxon (tid, sciName, rankID, rank_id) VALUES (?, ?, ?, ?)",
+                lambda seq, row: (row['tid'], row.get('sciName'), row.get('rankID'), parse_rank_id(row.get('rankID'))))
+        if biorepo_enum_tree_path:
+            ingested['enum_tree'] = self._ingest_reference(
+                'biorepo_taxaenumtree', biorepo_enum_tree_path, force, 'biorepo_enum_tree',
+                "INSERT INTO biorepo_enum_tree (seq, tid, parenttid) VALUES (?, ?, ?)",
+                lambda seq, row: ((seq, row['tid'], row['parenttid'])
+                                  if row.get('tid') and row.get('parenttid') else None))
+        if biorepo_taxon_units_path:
+            ingested['units'] = self._ingest_reference(
+                'biorepo_taxonunits', biorepo_taxon_units_path, force, 'biorepo_taxon_unit',
+                "INSERT INTO biorepo_taxon_unit (seq, taxonunitid, kingdomName, rankid, rankname) VALUES (?, ?, ?, ?, ?)",
+                lambda seq, row: (seq, *(row.get(column) for column in TAXON_UNIT_COLUMNS)))
+        if taxstatus_path:
+            ingested['taxstatus'] = self._ingest_reference(
+                'biorepo_taxstatus', taxstatus_path, force, 'biorepo_taxstatus',
+                "INSERT INTO biorepo_taxstatus (seq, tid, tidaccepted) VALUES (?, ?, ?)",
+                lambda seq, row: (seq, row['tid'], row['tidaccepted']))
+
+        if ingested.get('taxa') or ingested.get('enum_tree'):
+            print("Indexing direct parents from biorepo_taxaenumtree")
+            with self.connection:
+                self.connection.execute("DELETE FROM biorepo_direct_parent")
+                self.connection.execute(DIRECT_PARENT_SQL)
+        return any(ingested.values())
+
+    def _require_sources(self, *names):
+        missing = [name for name in names if self.source_header(name) is None]
+        if missing:
+            print(f"Error: {', '.join(missing)} not ingested into the taxonomy store {self.db_path}.", file=sys.stderr)
+            sys.exit(1)
+
+    # --- Biorepo taxonomy (Step 02) ---
+
+    def taxon_units(self):
+        """
+        biorepo_taxonunits rows keyed by taxonunitid, as load_csv_to_dict would load them,
+        with the TAXON_UNIT_COLUMNS the file has.
+        """
+        present = [column in self.source_header('biorepo_taxonunits') for column in TAXON_UNIT_COLUMNS]
+        return {values[0]: {column: value for column, value, is_present in zip(TAXON_UNIT_COLUMNS, values, present)
+                            if is_present}
+                for values in self.connection.execute(
+                    f"SELECT {', '.join(TAXON_UNIT_COLUMNS)} FROM biorepo_taxon_unit ORDER BY seq")}
+
+    def accepted_tids(self, resolve_synonyms=False):
+        """
+        The self-accepted tids of biorepo_taxstatus (as load_accepted_tids returns them),
+        or with `resolve_synonyms` a SynonymResolver over all of its rows.
+        """
+        if resolve_synonyms:
+            return SynonymResolver.from_pairs(
+                self.connection.execute("SELECT tid, tidaccepted FROM biorepo_taxstatus ORDER BY seq"))
+        accepted_tids = {tid for (tid,) in self.connection.execute(
+            "SELECT DISTINCT tid FROM biorepo_taxstatus WHERE tid != '' AND tid = tidaccepted")}
+        if not accepted_tids:
+            print("Warning: No accepted tids found in biorepo_taxstatus.csv. Output will be empty.", file=sys.stderr)
+        return accepted_tids
+
+    def taxa(self, tids):
+        """Returns the biorepo_taxa rows of `tids` that are in the store, as {tid: {'sciName', 'rankID'}}."""
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS taxon_request (tid TEXT PRIMARY KEY)")
+        self.connection.execute("DELETE FROM taxon_request")
+        self.connection.executemany("INSERT OR IGNORE INTO taxon_request (tid) VALUES (?)", ((tid,) for tid in tids))
+        return {tid: {'sciName': sci_name, 'rankID': rank_id_str}
+                for tid, sci_name, rank_id_str in self.connection.execute(
+                    "SELECT t.tid, t.sciName, t.rankID FROM taxon_request r JOIN biorepo_taxon t ON t.tid = r.tid")}
+
+    def lineages(self, tids, rank_schema):
+        """
+        Returns {tid: lineage} for `tids`, as build_lineage builds them, walking every
+        tid up biorepo_direct_parent in a single recursive query.
+        """
+        rankid_to_rankname = rank_schema['rankid_to_rankname']
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS lineage_request (tid TEXT PRIMARY KEY)")
+        self.connection.execute("DELETE FROM lineage_request")
+        self.connection.executemany("INSERT OR IGNORE INTO lineage_request (tid) VALUES (?)",
+                                    ((tid,) for tid in tids))
+
+        lineages = {}
+        warned_tids = set()
+        for start_tid, tid, sci_name, rank_id_str, rank_id in self.connection.execute(LINEAGE_SQL):
+            lineage = lineages.setdefault(start_tid, {})
+            if rank_id is None:
+                # The walk stops here, as it has no direct parent
+                if tid not in warned_tids:
+                    warned_tids.add(tid)
+                    if rank_id_str:
+                        print(f"Warning: Invalid rankID '{rank_id_str}' for tid {tid}. Cannot determine direct parent based on rank. Stopping traversal.", file=sys.stderr)
+                    else:
+                        print(f"Warning: No rankID found for tid {tid}. Cannot determine direct parent based on rank. Stopping traversal.", file=sys.stderr)
+                continue
+            mapped_rank_name = rankid_to_rankname.get(rank_id)
+            if sci_name and mapped_rank_name:
+                # Rows come from the tid upwards, so ancestors take precedence
+                lineage[mapped_rank_name] = sci_name
+        return lineages
+
+    def build_biorepo_accepted(self, group_code, accepted_tids, unfiltered_output_path=None):
+        """
+        Builds the accepted Biorepo taxonomy of a group from the NEON HQ records and
+        reference tables in the store, with the rows, columns and messages of
+        generate_biorepo_taxonomy.generate_second_taxonomy given `accepted_tids`
+        (see accepted_tids), and stores it for export_accepted and load_lineage_edges.
+        The unfiltered records are also written to `unfiltered_output_path`, if given.
+        """
+        print(f"--- Step 02: Generating second taxonomy for {group_code} from the taxonomy store ---")
+        self._require_sources(f"neonhq:{group_code}", 'biorepo_neon_taxonomy', 'biorepo_taxa',
+                              'biorepo_taxaenumtree', 'biorepo_taxonunits', 'biorepo_taxstatus')
+        neonhq_fieldnames = self.source_header(f"neonhq:{group_code}")
+        if 'taxonID' not in neonhq_fieldnames:
+            print(f"Error: NEON HQ records of '{group_code}' missing 'taxonID' column. Found fields: {neonhq_fieldnames}", file=sys.stderr)
+            sys.exit(1)
+
+        taxon_units_data = self.taxon_units()
+        rank_schema = build_rank_schema(taxon_units_data)
+        biorepo_lineage_fields_ordered = rank_schema['lineage_fields']
+        fieldnames = BIOREPO_CORE_FIELDNAMES + biorepo_lineage_fields_ordered
+
+        # Every NEON record with its map entry and Biorepo taxon, if any
+        records = self.connection.execute("""
+            SELECT n.taxonID, m.taxonCode IS NOT NULL, m.tid, m.verbatimScientificName,
+                   t.tid IS NOT NULL, t.sciName, t.rankID
+            FROM neonhq_taxon n
+            LEFT JOIN biorepo_neon_map m ON m.taxonGroup = n.taxonTypeCode AND m.taxonCode = n.taxonID
+            LEFT JOIN biorepo_taxon t ON t.tid = m.tid
+            WHERE n.taxonTypeCode = ?
+            ORDER BY n.seq
+        """, (group_code,)).fetchall()
+
+        keep_unfiltered = unfiltered_output_path is not None
+        synonym_resolver = accepted_tids if isinstance(accepted_tids, SynonymResolver) else None
+        # Lineages are only needed for the tids the selector may keep
+        lineage_tids = {biorepo_tid for _, _, biorepo_tid, _, in_taxa, _, _ in records
+                        if biorepo_tid and in_taxa and
+                        (keep_unfiltered or (synonym_resolver.resolve(biorepo_tid) is not None
+                                             if synonym_resolver is not None else biorepo_tid in accepted_tids))}
+        # ... and for the accepted taxa that synonym records may stand in for
+        stand_in_taxa = {}
+        if synonym_resolver is not None:
+            mapped_tids = {biorepo_tid for _, _, biorepo_tid, _, _, _, _ in records if biorepo_tid}
+            stand_in_taxa = self.taxa({synonym_resolver.resolve(tid) for tid in mapped_tids
+                                       if synonym_resolver.resolve(tid) not in (None, tid)})
+            lineage_tids |= stand_in_taxa.keys()
+        lineages = self.lineages(lineage_tids, rank_schema)
+
+        def lineage_of(tid):
+            return lineages.get(tid, {})
+
+        def stand_in(record, accepted_tid):
+            return biorepo_stand_in(record, accepted_tid, stand_in_taxa.get(accepted_tid), lineage_of,
+                                    taxon_units_data, biorepo_lineage_fields_ordered)
+
+        selector = AcceptedRowSelector(accepted_tids, stand_in=stand_in)
+
+        unfiltered_records = []
+        for neon_taxon_id, is_mapped, biorepo_tid, verbatim_name, in_taxa, sci_name, rank_id_str in records:
+            map_entry = {'tid': biorepo_tid, 'verbatimScientificName': verbatim_name} if is_mapped else None
+            taxa_entry = {'sciName': sci_name, 'rankID': rank_id_str} if in_taxa else None
+            output_record = build_biorepo_record(group_code, neon_taxon_id, map_entry, taxa_entry,
+                                                 lineage_of, taxon_units_data,
+                                                 biorepo_lineage_fields_ordered, selector, keep_unfiltered)
+            if output_record is None:
+                continue
+            if keep_unfiltered:
+                unfiltered_records.append(output_record)
+            selector.add(output_record)
+
+        if not records:
+            print(f"No records processed for group '{group_code}'. Output file will be empty.", file=sys.stderr)
+            if keep_unfiltered:
+                os.makedirs(os.path.dirname(unfiltered_output_path) or '.', exist_ok=True)
+                open(unfiltered_output_path, 'w').close()
+            self._store_accepted('biorepo', group_code, [], [], None)
+            return
+
+        if keep_unfiltered:
+            write_taxonomy_records(unfiltered_output_path, unfiltered_records, fieldnames)
+            print(f"Successfully generated {len(unfiltered_records)} second taxonomy records for '{group_code}' to: {unfiltered_output_path}")
+
+        # Stored as csv.DictWriter writes them: None as '' and everything else as str()
+        tid_index = _last_index(fieldnames, SOURCE_ID_COLUMNS['biorepo'])
+        rows = ([('' if record[field] is None else str(record[field])) for field in fieldnames]
+                for record in selector.rows())
+        self._store_accepted('biorepo', group_code, fieldnames, rows, tid_index)
+        print(f"Selected {len(selector)} unique accepted taxa of {len(records)} NEON records for '{group_code}'.")
+        if synonym_resolver is not None:
+            print(f"Resolved synonyms to {selector.stand_in_count()} accepted taxa that had no row of their own.")
+
+    # --- NEON HQ taxonomy (Step 03) ---
+
+    def build_neonhq_accepted(self, group_code, resolve_synonyms=False):
+        """
+        Selects the accepted NEON HQ taxa of a group from the store, as
+        filter_neonhq_accepted.select_neonhq_accepted would, and stores them
+        for export_accepted and load_lineage_edges.
+        """
+        print(f"--- Selecting accepted taxa from NEON HQ: '{group_code}' in the taxonomy store ---")
+        self._require_sources(f"neonhq:{group_code}")
+        fieldnames = self.source_header(f"neonhq:{group_code}")
+        rows = (json.loads(row) for (row,) in self.connection.execute(
+            "SELECT row FROM neonhq_taxon WHERE taxonTypeCode = ? ORDER BY seq", (group_code,)))
+        selected_rows, processed_count = select_accepted_rows(fieldnames, rows, f"NEON HQ records of '{group_code}'",
+                                                              resolve_synonyms=resolve_synonyms)
+        self._store_accepted('neonhq', group_code, fieldnames, selected_rows,
+                             _last_index(fieldnames, SOURCE_ID_COLUMNS['neonhq']))
+        print(f"Processed {processed_count} records from input.")
+        print(f"Selected {len(selected_rows)} unique accepted taxa.")
+
+    # --- Accepted taxonomies ---
+
+    def _store_accepted(self, source, group_code, fieldnames, rows, id_index):
+        """
+        Replaces the accepted taxonomy of `source` and `group_code` with csv.reader-like `rows`,
+        with their names, ranks and lineages (see compile_lineage_extractor) in columns of their own.
+        """
+        name_rank_indices = [_column_index(fieldnames, column) for column in NAME_RANK_COLUMNS[source]]
+        extract_lineage = compile_lineage_extractor(source, fieldnames, group_code)
+
+        def to_params(seq, row):
+            lineage = dict(extract_lineage(row))
+            return (source, group_code, seq, _csv_field(row, id_index),
+                    *(_csv_field(row, index) for index in name_rank_indices),
+                    *(lineage.get(rank) for rank in STANDARD_RANK_ORDER), json.dumps(row))
+
+        columns = ['source', 'taxonTypeCode', 'seq', 'taxon_id', 'scientificName', 'taxonRank'] + LINEAGE_COLUMNS + ['row']
+        with self.connection:
+            self.connection.execute("DELETE FROM accepted_taxon WHERE source = ? AND taxonTypeCode = ?",
+                                    (source, group_code))
+            self.connection.execute("INSERT OR REPLACE INTO accepted_header (source, taxonTypeCode, header) "
+                                    "VALUES (?, ?, ?)", (source, group_code, json.dumps(fieldnames)))
+            self.connection.executemany(
+                f"INSERT INTO accepted_taxon ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                (to_params(seq, row) for seq, row in enumerate(rows))
+            )
+
+    def accepted_header(self, source, group_code):
+        """Columns of a stored accepted taxonomy, or None if it was not built."""
+        stored = self.connection.execute("SELECT header FROM accepted_header WHERE source = ? AND taxonTypeCode = ?",
+                                         (source, group_code)).fetchone()
+        return json.loads(stored[0]) if stored is not None else None
+
+    def _select_accepted(self, columns, source, group_code, last_per_id=False):
+        """
+        Returns a cursor over `columns` of the rows of a stored accepted taxonomy, in file order.
+        With `last_per_id`, only the last row of each ID is selected (see compare_taxonomies.scan_taxonomy).
+        """
+        query = f"SELECT {', '.join(columns)} FROM accepted_taxon WHERE source = ? AND taxonTypeCode = ?"
+        params = (source, group_code)
+        if last_per_id:
+            query += (" AND seq IN (SELECT MAX(seq) FROM accepted_taxon"
+                      " WHERE source = ? AND taxonTypeCode = ? GROUP BY taxon_id)")
+            params += params
+        return self.connection.execute(query + " ORDER BY seq", params)
+
+    def iter_accepted_rows(self, source, group_code):
+        """Yields the rows of a stored accepted taxonomy as csv.reader lists, in file order."""
+        for (row,) in self._select_accepted(['row'], source, group_code):
+            yield json.loads(row)
+
+    def export_accepted(self, source, group_code, output_path):
+        """
+        Writes a stored accepted taxonomy to `output_path`, byte for byte as
+        Step 02 (source 'biorepo') or Step 03 (source 'neonhq') writes it.
+        """
+        fieldnames = self.accepted_header(source, group_code)
+        if fieldnames is None:
+            print(f"Error: No accepted {source} taxonomy of '{group_code}' in the taxonomy store {self.db_path}.", file=sys.stderr)
+            sys.exit(1)
+        if not fieldnames:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            open(output_path, 'w').close()
+        else:
+            write_accepted_rows(output_path, fieldnames, self.iter_accepted_rows(source, group_code))
+        print(f"Accepted {source} taxa of '{group_code}' exported to: {output_path}")
+
+    def load_lineage_edges(self, label, group_code, id_col, taxonomy_type, edge_index, breakdown=None):
+        """
+        compare_taxonomies.load_lineage_edges for a stored accepted taxonomy, selected by
+        `taxonomy_type` and `group_code`; `label` only names it in messages.
+        Duplicate IDs keep only their last row. Lineages are read from the lineage columns.
+        Returns the edge set and the number of unique records, or (None, None) on error.
+        """
+        fieldnames = self.accepted_header(taxonomy_type, group_code)
+        if fieldnames is None:
+            print(f"Error: Taxonomy for group '{group_code}' not found in the taxonomy store: {label}", file=sys.stderr)
+            return None, None
+        if id_col not in fieldnames:
+            print(f"Error: Required ID column '{id_col}' not found in '{label}'. Found fields: {fieldnames}", file=sys.stderr)
+            return None, None
+        record_count = self.connection.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM accepted_taxon WHERE source = ? AND taxonTypeCode = ? GROUP BY taxon_id)",
+            (taxonomy_type, group_code)).fetchone()[0]
+        lineages = ([(rank, name) for rank, name in zip(STANDARD_RANK_ORDER, names) if name] for names in
+                    self._select_accepted(LINEAGE_COLUMNS, taxonomy_type, group_code, last_per_id=True))
+        edges = collect_lineage_edges(lineages, taxonomy_type, edge_index, breakdown)
+        return edges, record_count
+
+
+def parse_group_codes(parser, groups):
+    group_codes = [g.strip() for g in groups.split(',') if g.strip()]
+    if not group_codes:
+        parser.error("--groups must list at least one group code.")
+    return group_codes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="SQLite store of the NEON HQ and Biorepo taxonomies: ingest the CSV files once, build the "
+                    "accepted taxonomies of Steps 02 and 03 from it, compare them and export them as CSV files."
+    )
+    parser.add_argument(
+        "--db",
+        default=DEFAULT_STORE_PATH,
+        help=f"Path to the SQLite database (default: {DEFAULT_STORE_PATH}). Created if it does not exist."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser(
+        "ingest",
+        help="Load NEON HQ downloads and Biorepo reference CSV files; files whose content is unchanged are skipped."
+    )
+    ingest_parser.add_argument("--groups", help="Comma-separated taxon group codes whose --neonhq files are loaded.")
+    ingest_parser.add_argument("--neonhq", help="Path template of the NEON HQ CSV files, containing '{group}' "
+                                                "(e.g., 'data/01_downloaded_neonhq/{group}.neonhq.csv').")
+    ingest_parser.add_argument("--biorepo-neon-taxonomy", help="Path to biorepo_neon_taxonomy.csv.")
+    ingest_parser.add_argument("--biorepo-taxa", help="Path to biorepo_taxa.csv.")
+    ingest_parser.add_argument("--biorepo-enum-tree", help="Path to biorepo_taxaenumtree.csv.")
+    ingest_parser.add_argument("--biorepo-taxon-units", help="Path to biorepo_taxonunits.csv.")
+    ingest_parser.add_argument("--taxstatus", help="Path to biorepo_taxstatus.csv.")
+    ingest_parser.add_argument("--force", action="store_true", help="Ingest the files even if they are unchanged.")
+
+    build_parser = commands.add_parser(
+        "build",
+        help="Build the accepted NEON HQ and Biorepo taxonomies of each group in the store (Steps 02 and 03)."
+    )
+    build_parser.add_argument("--groups", required=True, help="Comma-separated taxon group codes.")
+    build_parser.add_argument("--resolve-synonyms", action="store_true",
+                              help="Keep synonyms under their accepted taxa, as the filters' --resolve-synonyms.")
+    build_parser.add_argument("--unfiltered-output",
+                              help="Optional: Path template containing '{group}' to also write every generated "
+                                   "Biorepo record to, as generate_biorepo_taxonomy.py --unfiltered-output.")
+
+    compare_parser = commands.add_parser(
+        "compare",
+        help="Compare the accepted taxonomies of each group in the store (Step 04), as compare_taxonomies.py."
+    )
+    compare_parser.add_argument("--groups", required=True, help="Comma-separated taxon group codes.")
+    compare_parser.add_argument("--neonhq", required=True,
+                                help="Path template of the accepted NEON HQ CSV files, containing '{group}'. "
+                                     "Only used to name them in the reports, which then match the CSV comparison.")
+    compare_parser.add_argument("--biorepo", required=True,
+                                help="Path template of the accepted Biorepo CSV files, containing '{group}'; "
+                                     "see --neonhq.")
+    compare_parser.add_argument("--output", required=True,
+                                help="Path template of the comparison reports, containing '{group}'.")
+    compare_parser.add_argument("--edge-format", choices=EDGE_FORMATS, default='txt',
+                                help="Edge files written alongside the report (see compare_taxonomies.py).")
+    compare_parser.add_argument("--breakdown-rank", choices=STANDARD_RANK_ORDER + ['none'],
+                                default=DEFAULT_BREAKDOWN_RANK,
+                                help=f"Rank of the similarity breakdown (default: {DEFAULT_BREAKDOWN_RANK}); "
+                                     "'none' skips it.")
+    compare_parser.add_argument("--summary-output", help="Optional: Path to the summary CSV of all groups.")
+
+    export_parser = commands.add_parser(
+        "export",
+        help="Write the accepted taxonomies of each group in the store as the CSV files of Steps 02 and 03."
+    )
+    export_parser.add_argument("--groups", required=True, help="Comma-separated taxon group codes.")
+    export_parser.add_argument("--neonhq", help="Output path template for the accepted NEON HQ CSV files, "
+                                                "containing '{group}' (e.g., 'data/03_accepted_taxonomies/{group}.neonhq.accepted.csv').")
+    export_parser.add_argument("--biorepo", help="Output path template for the accepted Biorepo CSV files, "
+                                                 "containing '{group}' (e.g., 'data/03_accepted_taxonomies/{group}.biorepo.accepted.csv').")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        if bool(args.groups) != bool(args.neonhq):
+            parser.error("ingest: --groups and --neonhq must be given together.")
+        if args.neonhq and '{group}' not in args.neonhq:
+            parser.error("ingest: --neonhq must contain a '{group}' placeholder.")
+        with TaxonomyStore(args.db) as store:
+            store.ingest_reference_tables(args.biorepo_neon_taxonomy, args.biorepo_taxa, args.biorepo_enum_tree,
+                                          args.biorepo_taxon_units, args.taxstatus, force=args.force)
+            if args.groups:
+                for group_code in parse_group_codes(parser, args.groups):
+                    store.ingest_neonhq(group_code, args.neonhq.replace('{group}', group_code), force=args.force)
+
+    elif args.command == "build":
+        if args.unfiltered_output and '{group}' not in args.unfiltered_output:
+            parser.error("build: --unfiltered-output must contain a '{group}' placeholder.")
+        group_codes = parse_group_codes(parser, args.groups)
+        with TaxonomyStore(args.db) as store:
+            store._require_sources('biorepo_taxstatus')
+            accepted_tids = store.accepted_tids(args.resolve_synonyms)
+            for group_code in group_codes:
+                store.build_biorepo_accepted(group_code, accepted_tids,
+                                             unfiltered_output_path=(args.unfiltered_output.replace('{group}', group_code)
+                                                                     if args.unfiltered_output else None))
+                store.build_neonhq_accepted(group_code, args.resolve_synonyms)
+
+    elif args.command == "compare":
+        if any('{group}' not in path for path in (args.neonhq, args.biorepo, args.output)):
+            parser.error("compare: --neonhq, --biorepo and --output must contain a '{group}' placeholder.")
+        breakdown_rank = None if args.breakdown_rank == 'none' else args.breakdown_rank
+        group_results = []
+        with TaxonomyStore(args.db) as store:
+            for group_code in parse_group_codes(parser, args.groups):
+                group_results.append((group_code, compare_taxonomies(
+                    group_code,
+                    args.neonhq.replace('{group}', group_code),
+                    args.biorepo.replace('{group}', group_code),
+                    args.output.replace('{group}', group_code),
+                    args.edge_format,
+                    breakdown_rank,
+                    edge_loader=store.load_lineage_edges
+                )))
+        if args.summary_output:
+            write_summary(args.summary_output, group_results)
+        failed_groups = [group_code for group_code, results in group_results if results is None]
+        if failed_groups:
+            print(f"Error: Comparison failed for: {', '.join(failed_groups)}", file=sys.stderr)
+            sys.exit(1)
+
+    elif args.command == "export":
+        if not args.neonhq and not args.biorepo:
+            parser.error("export: give --neonhq and/or --biorepo.")
+        for template in (args.neonhq, args.biorepo):
+            if template and '{group}' not in template:
+                parser.error("export: --neonhq and --biorepo must contain a '{group}' placeholder.")
+        with TaxonomyStore(args.db) as store:
+            for group_code in parse_group_codes(parser, args.groups):
+                for source, template in zip(ACCEPTED_SOURCES, (args.neonhq, args.biorepo)):
+                    if template:
+                        store.export_accepted(source, group_code, template.replace('{group}', group_code))
@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from compare_taxonomies import (EdgeComparison, EdgeIndex, EdgeSetBuilder, SimilarityBreakdown, extract_lineage_edges,
+                                load_run_snapshot, save_run_snapshot)
+
+
+def random_edges(rng, count, node_count=200):
+    return [(rng.randrange(node_count) << EdgeIndex.NODE_ID_BITS) | rng.randrange(node_count) for _ in range(count)]
+
+
+def build(edges):
+    builder = EdgeSetBuilder()
+    for edge in edges:
+        builder.add(edge)
+    return builder.build()
+
+
+@pytest.mark.parametrize('flush_size', [3, EdgeSetBuilder.FLUSH_SIZE])
+def test_builder_sorts_and_deduplicates_across_flushes(monkeypatch, flush_size):
+    monkeypatch.setattr(EdgeSetBuilder, 'FLUSH_SIZE', flush_size)
+    rng = random.Random(1)
+    edges = random_edges(rng, 500, node_count=20)
+    new_edges = []
+    builder = EdgeSetBuilder(track_subtrees=True,
+                             count_new_edges=lambda chunk, rank_pairs, subtrees: new_edges.extend(chunk.tolist()))
+    for i, edge in enumerate(edges):
+        builder.add(edge, subtree=i)
+    edge_set = builder.build()
+
+    assert list(edge_set) == sorted(set(edges))
+    assert sorted(new_edges) == list(edge_set)
+    # Each edge keeps the subtree it was first added with
+    assert edge_set.subtrees.tolist() == [edges.index(edge) for edge in edge_set]
+    assert all(edge in edge_set for edge in edges)
+    assert -1 not in edge_set
+
+
+@pytest.mark.parametrize('sizes', [(0, 0), (0, 50), (300, 300), (10, 800), (800, 10)])
+def test_set_operations_match_python_sets(sizes):
+    rng = random.Random(sum(sizes))
+    left, right = (random_edges(rng, size) for size in sizes)
+    left_set, right_set = build(left), build(right)
+
+    assert list(left_set.intersection(right_set)) == sorted(set(left) & set(right))
+    assert list(left_set.difference(right_set)) == sorted(set(left) - set(right))
+    assert list(right_set.difference(left_set)) == sorted(set(right) - set(left))
+    assert list(left_set.union(right_set)) == sorted(set(left) | set(right))
+
+
+def test_edge_comparison_counts_and_decodes_edges():
+    edge_index = EdgeIndex()
+    neonhq = [('family', 'a', 'genus', 'b'), ('genus', 'b', 'species', 'b c'), ('family', 'a', 'genus', 'd')]
+    biorepo = [('family', 'a', 'genus', 'b'), ('genus', 'b', 'species', 'b e')]
+    comparison = EdgeComparison(build(edge_index.encode(*edge) for edge in neonhq),
+                                build(edge_index.encode(*edge) for edge in biorepo), edge_index)
+
+    assert (comparison.neonhq_count, comparison.biorepo_count, comparison.intersection_count) == (3, 2, 1)
+    assert comparison.union_count == 4
+    assert comparison.sorted_intersection == [('family', 'a', 'genus', 'b')]
+    assert comparison.sorted_unique_to_neonhq == sorted(neonhq[1:])
+    assert comparison.sorted_unique_to_biorepo == [('genus', 'b', 'species', 'b e')]
+    assert list(comparison.sorted_union_edges()) == sorted(set(neonhq) | set(biorepo))
+
+
+def test_breakdown_is_counted_during_extraction():
+    neonhq_fieldnames = ['dwc:kingdom', 'dwc:order', 'dwc:family', 'dwc:genus']
+    biorepo_fieldnames = ['biorepo_kingdom', 'biorepo_order', 'biorepo_family', 'biorepo_genus']
+    neonhq_rows = [['Animalia', 'OrdA', 'FamA', 'GenA'], ['Animalia', 'OrdA', 'FamB', 'GenB']]
+    # FamB is filed under OrdB in Biorepo
+    biorepo_rows = [['Animalia', 'OrdA', 'FamA', 'GenA'], ['Animalia', 'OrdB', 'FamB', 'GenB']]
+    edge_index = EdgeIndex()
+    breakdown = SimilarityBreakdown('order')
+    neonhq_edges = extract_lineage_edges(neonhq_rows, neonhq_fieldnames, 'neonhq', edge_index, 'BEETLE', breakdown)
+    breakdown.neonhq_edges = neonhq_edges
+    biorepo_edges = extract_lineage_edges(biorepo_rows, biorepo_fieldnames, 'biorepo', edge_index, 'BEETLE', breakdown)
+
+    assert (len(neonhq_edges), len(biorepo_edges)) == (5, 6)
+    assert breakdown.rank_pairs() == {
+        'kingdom -> order': (1, 2, 1),
+        'order -> family': (2, 2, 1),
+        'family -> genus': (2, 2, 2),
+    }
+    # The common FamB -> GenB edge counts under its NEON HQ order
+    assert breakdown.subtrees() == {'orda': (5, 4, 4), 'ordb': (0, 2, 0)}
+
+
+def test_snapshot_round_trip_drops_unused_nodes(tmp_path):
+    edge_index = EdgeIndex()
+    edge_index.node_id('genus', 'unused') # e.g. a node of an earlier run's snapshot
+    neonhq = [('family', 'a', 'genus', 'b'), ('genus', 'b', 'species', 'b c')]
+    biorepo = [('family', 'a', 'genus', 'b'), ('family', 'a', 'genus', 'd')]
+    neonhq_edges = build(edge_index.encode(*edge) for edge in neonhq)
+    biorepo_edges = build(edge_index.encode(*edge) for edge in biorepo)
+    save_run_snapshot(str(tmp_path), 'run1', 'BIRD', edge_index, neonhq_edges, biorepo_edges, (2, 2, 1))
+
+    loaded_index = EdgeIndex()
+    loaded_neonhq, loaded_biorepo, counts = load_run_snapshot(str(tmp_path), 'run1', 'BIRD', loaded_index)
+    assert ('genus', 'unused') not in loaded_index.node_ids
+    assert loaded_index.decode_sorted(loaded_neonhq) == sorted(neonhq)
+    assert loaded_index.decode_sorted(loaded_biorepo) == sorted(biorepo)
+    assert list(loaded_neonhq) == sorted(loaded_neonhq)
+    assert (counts['neonhq_edges'], counts['biorepo_edges'], counts['common_edges']) == (2, 2, 1)
+
+    # Into an index that already numbers other nodes, the edges are re-encoded and re-sorted
+    other_index = EdgeIndex()
+    other_index.node_id('species', 'b e')
+    other_index.node_id('genus', 'd')
+    reloaded_neonhq, reloaded_biorepo, _ = load_run_snapshot(str(tmp_path), 'run1', 'BIRD', other_index)
+    assert other_index.decode_sorted(reloaded_biorepo) == sorted(biorepo)
+    assert list(reloaded_biorepo) == sorted(reloaded_biorepo)
+    assert all(other_index.encode(*edge) in reloaded_neonhq for edge in neonhq)
+
+
+def test_missing_snapshot(tmp_path, capsys):
+    assert load_run_snapshot(str(tmp_path), 'run1', 'BIRD', EdgeIndex()) == (None, None, None)
+    assert "No snapshot of group 'BIRD'" in capsys.readouterr().err
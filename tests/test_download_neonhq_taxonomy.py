@@ -0,0 +1,327 @@
+import csv
+import hashlib
+import json
+import os
+import threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import pytest
+
+import download_neonhq_taxonomy
+from download_neonhq_taxonomy import (NEONHQ_VERBOSE_FIELDNAMES, checkpoint_csv_path, create_session,
+                                      download_taxonomies, download_taxonomy, fetch_page, load_checkpoint_state,
+                                      save_page_checkpoint)
+
+GROUP_SIZES = {'ALGAE': 23, 'BIRD': 9, 'TICK': 0}
+PAGE_SIZE = 5
+
+
+def make_records(group_code, count):
+    return [{
+        'taxonID': f"{group_code}{i:03d}",
+        'acceptedTaxonID': f"{group_code}{i - i % 3:03d}",
+        'taxonTypeCode': group_code,
+        'dwc:scientificName': f"Genus{i // 4} species{i}",
+        'dwc:taxonRank': 'species',
+        'dwc:family': f"Family{i // 8}",
+    } for i in range(count)]
+
+
+class StubNeonServer(ThreadingHTTPServer):
+    """
+    Serves records like the NEON taxonomy API: paged JSON with 'next' links, at most
+    PAGE_SIZE records per page. `failures` maps a page offset to the statuses returned,
+    in order, before that page is served; every request is counted per offset.
+    With `validator` 'etag' or 'last_modified', pages carry that validator and are
+    answered with 304 (counted in `not_modified`) when the request's matches.
+    """
+    daemon_threads = True
+
+    def __init__(self, records):
+        super().__init__(('127.0.0.1', 0), StubNeonHandler)
+        self.records = records
+        self.failures = defaultdict(list) # {(group, offset): [status, ...]}
+        self.requests = Counter() # {(group, offset): number of requests}
+        self.client_ports = set()
+        self.validator = None
+        self.not_modified = Counter() # {(group, offset): number of 304 responses}
+        self.request_headers = [] # Conditional headers of each request, in order
+        self.lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v0/taxonomy"
+
+
+class StubNeonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, so pooled connections can be reused
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        group_code = query['taxonTypeCode'][0]
+        limit = min(int(query.get('limit', ['100'])[0]), PAGE_SIZE)
+        offset = int(query.get('offset', ['0'])[0])
+        key = (group_code, offset)
+
+        with self.server.lock:
+            self.server.requests[key] += 1
+            self.server.client_ports.add(self.client_address[1])
+            failures = self.server.failures[key]
+            status = failures.pop(0) if failures else 200
+        if status != 200:
+            self.send_body(status, b'{"error": "try again"}', [('Retry-After', '0')] if status == 429 else [])
+            return
+
+        records = self.server.records.get(group_code, [])
+        next_url = None
+        if offset + limit < len(records):
+            next_query = urlencode({'taxonTypeCode': group_code, 'verbose': 'true', 'limit': limit,
+                                    'offset': offset + limit})
+            next_url = f"{self.server.api_url}?{next_query}"
+        page = records[offset:offset + limit]
+        body = json.dumps({'count': len(page), 'next': next_url, 'data': page}).encode('utf-8')
+
+        # Both validators change with the page content
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        validators = {'etag': ('ETag', 'If-None-Match', f'"{digest}"'),
+                      'last_modified': ('Last-Modified', 'If-Modified-Since', f"Thu, 01 Jan 2026 00:00:00 GMT; v={digest}")}
+        with self.server.lock:
+            self.server.request_headers.append({name: self.headers[name] for name in ('If-None-Match', 'If-Modified-Since')
+                                                if self.headers[name] is not None})
+        if self.server.validator is None:
+            self.send_body(200, body)
+            return
+        header, conditional_header, value = validators[self.server.validator]
+        if self.headers[conditional_header] == value:
+            with self.server.lock:
+                self.server.not_modified[key] += 1
+            self.send_body(304, b'', [(header, value)])
+            return
+        self.send_body(200, body, [(header, value)])
+
+
+@pytest.fixture
+def neon_server():
+    server = StubNeonServer({group_code: make_records(group_code, count) for group_code, count in GROUP_SIZES.items()})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def page_offsets(group_code):
+    return range(0, max(GROUP_SIZES[group_code], 1), PAGE_SIZE)
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def download_serially(neon_server, output_dir):
+    """Downloads every group one after the other, without injected failures."""
+    session = create_session(backoff_factor=0, pool_size=1)
+    for group_code in GROUP_SIZES:
+        download_taxonomy(group_code, str(output_dir / f"{group_code}.neonhq.csv"), neon_server.api_url, session)
+    session.close()
+
+
+def test_serial_download_reuses_one_pooled_connection(neon_server, tmp_path):
+    session = create_session(backoff_factor=0, pool_size=1)
+    download_taxonomy('ALGAE', str(tmp_path / 'ALGAE.neonhq.csv'), neon_server.api_url, session)
+    session.close()
+
+    assert sum(neon_server.requests.values()) == len(page_offsets('ALGAE'))
+    assert len(neon_server.client_ports) == 1
+    assert read_bytes(tmp_path / 'ALGAE.neonhq.csv').count(b'\n') == GROUP_SIZES['ALGAE'] + 1
+
+
+def test_retries_429_and_5xx_before_each_success(neon_server, tmp_path):
+    neon_server.failures[('ALGAE', 0)] = [429, 503]
+    neon_server.failures[('ALGAE', 10)] = [500]
+    neon_server.failures[('ALGAE', 20)] = [502, 504, 429]
+
+    session = create_session(max_retries=3, backoff_factor=0, pool_size=1)
+    download_taxonomy('ALGAE', str(tmp_path / 'ALGAE.neonhq.csv'), neon_server.api_url, session)
+    session.close()
+
+    assert neon_server.requests == {('ALGAE', 0): 3, ('ALGAE', 5): 1, ('ALGAE', 10): 2,
+                                    ('ALGAE', 15): 1, ('ALGAE', 20): 4}
+    download_serially(neon_server, tmp_path / 'serial')
+    assert read_bytes(tmp_path / 'ALGAE.neonhq.csv') == read_bytes(tmp_path / 'serial' / 'ALGAE.neonhq.csv')
+
+
+def test_gives_up_after_max_retries(neon_server, tmp_path):
+    neon_server.failures[('BIRD', 5)] = [503, 503, 503]
+
+    session = create_session(max_retries=2, backoff_factor=0, pool_size=1)
+    with pytest.raises(SystemExit):
+        download_taxonomy('BIRD', str(tmp_path / 'BIRD.neonhq.csv'), neon_server.api_url, session)
+    session.close()
+
+    assert neon_server.requests[('BIRD', 5)] == 3 # The first try and 2 retries
+    assert not (tmp_path / 'BIRD.neonhq.csv').exists()
+
+
+def test_parallel_download_matches_serial_download(neon_server, tmp_path):
+    download_serially(neon_server, tmp_path / 'serial')
+    neon_server.requests.clear()
+
+    injected = {('ALGAE', 5): [503], ('ALGAE', 15): [429, 500], ('BIRD', 0): [429], ('TICK', 0): [502]}
+    for key, statuses in injected.items():
+        neon_server.failures[key] = list(statuses)
+    output_template = str(tmp_path / 'parallel' / '{group}.neonhq.csv')
+    results = download_taxonomies(list(GROUP_SIZES), output_template, neon_server.api_url,
+                                  max_workers=3, max_retries=3, backoff_factor=0)
+
+    assert results == {group_code: True for group_code in GROUP_SIZES}
+    expected_requests = Counter({(group_code, offset): 1 for group_code in GROUP_SIZES
+                                 for offset in page_offsets(group_code)})
+    for key, statuses in injected.items():
+        expected_requests[key] += len(statuses)
+    assert neon_server.requests == expected_requests
+    for group_code in GROUP_SIZES:
+        assert (read_bytes(output_template.replace('{group}', group_code)) ==
+                read_bytes(tmp_path / 'serial' / f"{group_code}.neonhq.csv"))
+
+
+def test_parallel_download_reports_only_the_failed_group(neon_server, tmp_path):
+    neon_server.failures[('BIRD', 0)] = [500] * 5
+    results = download_taxonomies(list(GROUP_SIZES), str(tmp_path / '{group}.neonhq.csv'), neon_server.api_url,
+                                  max_workers=3, max_retries=1, backoff_factor=0)
+
+    assert results == {'ALGAE': True, 'BIRD': False, 'TICK': True}
+    assert (tmp_path / 'ALGAE.neonhq.csv').exists()
+    assert not (tmp_path / 'BIRD.neonhq.csv').exists()
+
+
+# --- Conditional requests and the HTTP cache ---
+
+def cache_files(cache_dir):
+    """{name: content} of every cached response."""
+    return {name: read_bytes(cache_dir / name) for name in sorted(os.listdir(cache_dir))}
+
+
+def test_fetch_page_serves_the_cached_body_on_304(neon_server, tmp_path):
+    neon_server.validator = 'etag'
+    cache_dir = tmp_path / 'http_cache'
+    url = f"{neon_server.api_url}?taxonTypeCode=BIRD&verbose=true&limit=1000"
+    session = create_session(backoff_factor=0, pool_size=1)
+
+    first_page, first_changed = fetch_page(session, url, str(cache_dir))
+    cached = cache_files(cache_dir)
+    second_page, second_changed = fetch_page(session, url, str(cache_dir))
+    session.close()
+
+    assert (first_changed, second_changed) == (True, False)
+    assert second_page == first_page
+    assert neon_server.not_modified == {('BIRD', 0): 1}
+    etag = json.loads(next(iter(cached.values())))['etag']
+    assert neon_server.request_headers == [{}, {'If-None-Match': etag}]
+    assert cache_files(cache_dir) == cached
+
+
+@pytest.mark.parametrize('validator', ['etag', 'last_modified'])
+def test_unchanged_download_is_revalidated_and_left_untouched(neon_server, tmp_path, validator):
+    neon_server.validator = validator
+    cache_dir = tmp_path / 'http_cache'
+    output_path = tmp_path / 'ALGAE.neonhq.csv'
+    download_taxonomy('ALGAE', str(output_path), neon_server.api_url, http_cache_dir=str(cache_dir))
+    csv_content, csv_mtime = read_bytes(output_path), os.stat(output_path).st_mtime_ns
+    cached = cache_files(cache_dir)
+    assert len(cached) == len(page_offsets('ALGAE'))
+
+    download_taxonomy('ALGAE', str(output_path), neon_server.api_url, http_cache_dir=str(cache_dir))
+
+    # Every page was asked for again and answered with 304, so nothing was rewritten
+    assert neon_server.not_modified == {('ALGAE', offset): 1 for offset in page_offsets('ALGAE')}
+    assert read_bytes(output_path) == csv_content
+    assert os.stat(output_path).st_mtime_ns == csv_mtime
+    assert cache_files(cache_dir) == cached
+
+
+def test_changed_page_is_downloaded_again(neon_server, tmp_path):
+    neon_server.validator = 'etag'
+    cache_dir = tmp_path / 'http_cache'
+    output_path = tmp_path / 'ALGAE.neonhq.csv'
+    download_taxonomy('ALGAE', str(output_path), neon_server.api_url, http_cache_dir=str(cache_dir))
+    neon_server.records['ALGAE'][12]['dwc:scientificName'] = 'Renamed species'
+
+    download_taxonomy('ALGAE', str(output_path), neon_server.api_url, http_cache_dir=str(cache_dir))
+
+    # Only the page holding the renamed record is served in full
+    assert neon_server.not_modified == {('ALGAE', offset): 1 for offset in page_offsets('ALGAE') if offset != 10}
+    assert b'Renamed species' in read_bytes(output_path)
+    download_serially(neon_server, tmp_path / 'serial')
+    assert read_bytes(output_path) == read_bytes(tmp_path / 'serial' / 'ALGAE.neonhq.csv')
+
+
+def test_pages_without_validators_are_reused_until_the_ttl_expires(neon_server, tmp_path):
+    cache_dir = tmp_path / 'http_cache'
+    output_path = tmp_path / 'ALGAE.neonhq.csv'
+    download_taxonomy('ALGAE', str(output_path), neon_server.api_url, http_cache_dir=str(cache_dir), cache_ttl=3600)
+    csv_content = read_bytes(output_path)
+    neon_server.records['ALGAE'][12]['dwc:scientificName'] = 'Renamed species'
+    neon_server.requests.clear()
+
+    # Within the TTL, the cached pages are used without asking the server
+    download_taxonomy('ALGAE', str(output_path), neon_server.api_url, http_cache_dir=str(cache_dir), cache_ttl=3600)
+    assert not neon_server.requests
+    assert read_bytes(output_path) == csv_content
+
+    # Once they are older than the TTL, every page is fetched again
+    for name in os.listdir(cache_dir):
+        with open(cache_dir / name, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        entry['fetched_at'] -= 3601
+        with open(cache_dir / name, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+    download_taxonomy('ALGAE', str(output_path), neon_server.api_url, http_cache_dir=str(cache_dir), cache_ttl=3600)
+    assert neon_server.requests == {('ALGAE', offset): 1 for offset in page_offsets('ALGAE')}
+    assert all(headers == {} for headers in neon_server.request_headers)
+    assert b'Renamed species' in read_bytes(output_path)
+
+
+def test_crash_while_adding_columns_resumes_from_a_consistent_checkpoint(tmp_path, monkeypatch):
+    checkpoint_dir = str(tmp_path / 'ALGAE.neonhq.csv.partial')
+    records = make_records('ALGAE', 6)
+    state = {'start_url': 'start', 'next_url': 'start', 'pages': 0, 'records': 0, 'changed': False,
+             'fieldnames': list(NEONHQ_VERBOSE_FIELDNAMES), 'csv_bytes': 0}
+    save_page_checkpoint(checkpoint_dir, state, records[:3], 'page2')
+    new_page = [dict(record, newColumn='x') for record in records[3:]]
+
+    # Crash after the CSV was rewritten under the new column, before the state was saved
+    def crash(filepath, data):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as patch:
+        patch.setattr(download_neonhq_taxonomy, '_write_json_atomically', crash)
+        with pytest.raises(KeyboardInterrupt):
+            save_page_checkpoint(checkpoint_dir, dict(state), new_page, None)
+
+    state = load_checkpoint_state(checkpoint_dir, 'start')
+    assert state['next_url'] == 'page2' and 'newColumn' not in state['fieldnames']
+    assert os.path.getsize(checkpoint_csv_path(checkpoint_dir, state)) == state['csv_bytes']
+
+    save_page_checkpoint(checkpoint_dir, state, new_page, None)
+
+    state = load_checkpoint_state(checkpoint_dir, 'start')
+    with open(checkpoint_csv_path(checkpoint_dir, state), 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['taxonID'] for row in rows] == [record['taxonID'] for record in records]
+    assert [row['newColumn'] for row in rows] == ['', '', '', 'x', 'x', 'x']
+    assert sorted(os.listdir(checkpoint_dir)) == sorted(['state.json', state['csv_file']])
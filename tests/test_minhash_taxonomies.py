@@ -0,0 +1,98 @@
+import os
+import random
+
+import pytest
+
+import minhash_taxonomies
+from minhash_taxonomies import (LSH_INDEX_FILENAME, LSHBucketStore, LSHIndex, approximate_jaccard,
+                                minhash_signature, query_similar, save_signature)
+
+
+def edge_set(rng, shared, count):
+    """`count` edges, the first `shared` of which every set built with the same `shared` has in common."""
+    edges = {('genus', f"G{i}", 'species', f"S{i}") for i in range(shared)}
+    while len(edges) < count:
+        edges.add(('genus', f"G{rng.randrange(10 ** 9)}", 'species', f"S{rng.randrange(10 ** 9)}"))
+    return edges
+
+
+def sign(signature_dir, name, edges, num_perm=64, seed=1):
+    signature = minhash_signature(edges, num_perm, seed)
+    save_signature(signature_dir, name, signature, 'neonhq', 'TEST', len(edges), seed=seed)
+    with LSHBucketStore(signature_dir) as lsh_buckets:
+        lsh_buckets.add(name, signature, seed)
+    return signature
+
+
+def forbid_directory_scan(monkeypatch):
+    def load_signatures(signature_dir):
+        raise AssertionError("The query read every signature")
+    monkeypatch.setattr(minhash_taxonomies, 'load_signatures', load_signatures)
+
+
+@pytest.fixture
+def signatures(tmp_path):
+    rng = random.Random(4)
+    signature_dir = str(tmp_path / 'signatures')
+    signatures = {f"S{shared}": sign(signature_dir, f"S{shared}", edge_set(rng, shared, 100))
+                  for shared in (95, 90, 70, 50, 20, 0)}
+    with LSHBucketStore(signature_dir) as lsh_buckets:
+        lsh_buckets.ensure_banding(64, 1, 16)
+    return signature_dir, signatures
+
+
+def expected_matches(signatures, name, bands, threshold=0.0):
+    index = LSHIndex(64, bands)
+    for other, signature in signatures.items():
+        index.add(other, signature)
+    matches = [(other, approximate_jaccard(signatures[name], signatures[other]))
+               for other in index.candidates(signatures[name]) - {name}]
+    return sorted((match for match in matches if match[1] >= threshold), key=lambda match: (-match[1], match[0]))
+
+
+def test_query_reads_only_the_persisted_buckets_and_candidates(signatures, monkeypatch):
+    signature_dir, signatures = signatures
+    forbid_directory_scan(monkeypatch)
+
+    matches = query_similar(signature_dir, 'S95', threshold=0.3, bands=16)
+
+    assert matches == expected_matches(signatures, 'S95', 16, threshold=0.3)
+    assert [name for name, _ in matches][:2] == ['S90', 'S70']
+    assert query_similar(signature_dir, 'missing', bands=16) is None
+
+
+def test_writing_a_signature_updates_its_buckets(signatures, monkeypatch):
+    signature_dir, signatures = signatures
+    assert 'S90' in dict(query_similar(signature_dir, 'S95', bands=16))
+
+    signatures['S90'] = sign(signature_dir, 'S90', edge_set(random.Random(5), 0, 100))
+    signatures['NEW'] = sign(signature_dir, 'NEW', edge_set(random.Random(6), 95, 100))
+    forbid_directory_scan(monkeypatch)
+
+    matches = query_similar(signature_dir, 'S95', bands=16)
+    assert 'S90' not in dict(matches) and 'NEW' in dict(matches)
+    assert matches == expected_matches(signatures, 'S95', 16)
+
+
+def test_a_new_band_count_is_built_once_from_the_signature_files(signatures, monkeypatch):
+    signature_dir, signatures = signatures
+    assert query_similar(signature_dir, 'S95', bands=8) == expected_matches(signatures, 'S95', 8)
+
+    forbid_directory_scan(monkeypatch)
+    assert query_similar(signature_dir, 'S50', bands=8) == expected_matches(signatures, 'S50', 8)
+    with pytest.raises(ValueError):
+        query_similar(signature_dir, 'S95', bands=10)
+
+
+def test_deleted_and_foreign_signatures(signatures):
+    signature_dir, signatures = signatures
+    os.remove(os.path.join(signature_dir, 'S90.minhash.json'))
+    # Signatures of another setting are never candidates
+    sign(signature_dir, 'SEED2', edge_set(random.Random(4), 95, 100), seed=2)
+
+    matches = query_similar(signature_dir, 'S95', bands=16)
+
+    assert 'S90' not in dict(matches) and 'SEED2' not in dict(matches)
+    with LSHBucketStore(signature_dir) as lsh_buckets:
+        assert not lsh_buckets.is_indexed('S90', 64, 1)
+    assert os.path.exists(os.path.join(signature_dir, LSH_INDEX_FILENAME))
@@ -0,0 +1,42 @@
+import pytest
+
+from reference_cache import load_int_index_with_cache
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+CALLS = [] # Paths loaded by load_ints; not a loader argument, which would be part of the cache key
+
+
+def load_ints(filepath):
+    CALLS.append(filepath)
+    with open(filepath, 'r', encoding='utf-8') as f:
+        values = f.read().split()
+    for value in values:
+        if not value.isdigit():
+            raise ValueError(f"'{value}' is not a plain integer")
+    return [int(value) for value in values]
+
+
+def test_values_that_cannot_be_indexed_are_remembered_per_content(tmp_path):
+    source, cache_dir = str(tmp_path / 'values.txt'), str(tmp_path / 'cache')
+    calls = CALLS
+    calls.clear()
+    write(source, "3 1 x2")
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="'x2' is not a plain integer"):
+            load_int_index_with_cache(source, load_ints, cache_dir=cache_dir)
+    assert len(calls) == 1
+
+    # New content gets a new key: indexed, and the remembered failure is removed
+    write(source, "3 1 2")
+    index = load_int_index_with_cache(source, load_ints, cache_dir=cache_dir)
+    assert len(calls) == 2 and len(index) == 3 and 2 in index and 4 not in index
+    assert load_int_index_with_cache(source, load_ints, cache_dir=cache_dir) is not None
+    assert len(calls) == 2
+    assert not list((tmp_path / 'cache').glob('*.unindexable'))
+    index.close()
@@ -0,0 +1,106 @@
+from filter_biorepo_accepted import AcceptedRowSelector
+from filter_neonhq_accepted import select_accepted_rows
+from generate_biorepo_taxonomy import biorepo_stand_in
+from synonym_resolver import SynonymResolver
+
+
+def test_chains_resolve_to_the_accepted_taxon_at_their_end():
+    resolver = SynonymResolver.from_pairs([('a', 'b'), ('b', 'c'), ('c', 'c'), ('d', 'c')])
+
+    assert [resolver.resolve(tid) for tid in 'abcd'] == ['c', 'c', 'c', 'c']
+
+
+def test_chains_ending_outside_the_table_resolve_to_their_last_taxon():
+    resolver = SynonymResolver.from_pairs([('a', 'b'), ('b', 'x')])
+
+    assert resolver.resolve('a') == 'x'
+    assert resolver.resolve('b') == 'x'
+    # 'x' has no entry of its own, like any taxon missing from the table
+    assert resolver.resolve('x') is None
+    assert resolver.resolve('unknown') is None
+
+
+def test_cycles_and_chains_into_them_do_not_resolve():
+    resolver = SynonymResolver.from_pairs([('a', 'b'), ('b', 'c'), ('c', 'a'), ('d', 'a'), ('e', 'e')])
+
+    assert [resolver.resolve(tid) for tid in 'abcd'] == [None, None, None, None]
+    assert resolver.resolve('e') == 'e'
+
+
+def test_resolving_compresses_the_walked_path():
+    resolver = SynonymResolver()
+    for taxon_id, accepted_id in [('a', 'b'), ('b', 'c'), ('c', 'd'), ('d', 'd'), ('x', 'y'), ('y', 'x')]:
+        resolver.add(taxon_id, accepted_id)
+
+    assert resolver.resolve('a') == 'd'
+    assert resolver.accepted_of == {'a': 'd', 'b': 'd', 'c': 'd', 'd': 'd', 'x': 'y', 'y': 'x'}
+    assert resolver.resolve('x') is None
+    assert resolver.accepted_of['x'] is None and resolver.accepted_of['y'] is None
+
+
+def test_accepted_taxa_stay_accepted_and_the_first_accepted_id_wins():
+    resolver = SynonymResolver()
+    for taxon_id, accepted_id in [('a', 'b'), ('a', 'c'), ('b', 'x'), ('b', 'b'), ('b', 'y'), ('', 'b'), ('c', '')]:
+        resolver.add(taxon_id, accepted_id)
+
+    assert resolver.accepted_of == {'a': 'b', 'b': 'b'}
+    assert resolver.compile().resolve('a') == 'b'
+
+
+TAXA = {'10': {'sciName': 'Accepta', 'rankID': '180'}, '20': {'sciName': 'Synonyma', 'rankID': '180'}}
+TAXON_UNITS = {'180': {'rankname': 'Genus'}}
+LINEAGES = {'10': {'family': 'Acceptidae', 'genus': 'Accepta'},
+            '20': {'order': 'Synonymales', 'family': 'Synonymidae', 'genus': 'Synonyma'}}
+LINEAGE_FIELDS = ['biorepo_order', 'biorepo_family', 'biorepo_genus']
+
+
+def biorepo_record(neon_taxon_id, biorepo_tid):
+    record = {'neon_taxonID': neon_taxon_id, 'neon_lookup_group': 'BEETLE', 'is_biorepo_mapped': True,
+              'biorepo_tid': biorepo_tid, 'scientificName_biorepo': TAXA[biorepo_tid]['sciName'],
+              'taxonRank_biorepo': 'Genus', 'verbatimScientificName_biorepo_map': f"{neon_taxon_id} sp."}
+    record.update({f'biorepo_{rank}': name for rank, name in LINEAGES[biorepo_tid].items()})
+    return record
+
+
+def stand_in(record, accepted_tid):
+    return biorepo_stand_in(record, accepted_tid, TAXA.get(accepted_tid), lambda tid: LINEAGES[tid],
+                            TAXON_UNITS, LINEAGE_FIELDS)
+
+
+def test_biorepo_stand_ins_describe_the_accepted_taxon():
+    selector = AcceptedRowSelector(SynonymResolver.from_pairs([('20', '10'), ('10', '10'), ('30', '99')]),
+                                   stand_in=stand_in)
+
+    assert selector.add(biorepo_record('SYNO', '20'))
+    # The accepted taxon '99' of tid '30' is not in biorepo_taxa, so there is nothing to describe it with
+    assert not selector.add(dict(biorepo_record('OTHER', '20'), biorepo_tid='30'))
+
+    assert list(selector.rows()) == [{
+        'neon_taxonID': 'SYNO', 'neon_lookup_group': 'BEETLE', 'is_biorepo_mapped': True, 'biorepo_tid': '10',
+        'scientificName_biorepo': 'Accepta', 'taxonRank_biorepo': 'Genus', 'verbatimScientificName_biorepo_map': 'SYNO sp.',
+        'biorepo_order': None, 'biorepo_family': 'Acceptidae', 'biorepo_genus': 'Accepta',
+    }]
+    assert selector.stand_in_count() == 1
+
+    # The accepted taxon's own record replaces the stand-in
+    own_record = biorepo_record('ACCE', '10')
+    assert selector.add(own_record)
+    assert list(selector.rows()) == [own_record]
+    assert selector.stand_in_count() == 0
+
+
+def test_biorepo_synonyms_are_dropped_without_a_stand_in():
+    selector = AcceptedRowSelector(SynonymResolver.from_pairs([('20', '10'), ('10', '10')]))
+
+    assert not selector.add(biorepo_record('SYNO', '20'))
+    assert len(selector) == 0
+
+
+def test_neonhq_synonym_rows_do_not_stand_in_for_accepted_taxa():
+    fieldnames = ['taxonID', 'acceptedTaxonID', 'dwc:scientificName']
+    rows = [['ACCE', 'ACCE', 'Accepta'], ['SYNO', 'ACCE', 'Synonyma'], ['ORPH', 'GONE', 'Orphana']]
+
+    selected_rows, processed_count = select_accepted_rows(fieldnames, rows, 'test', resolve_synonyms=True)
+
+    assert selected_rows == [['ACCE', 'ACCE', 'Accepta']]
+    assert processed_count == 3
@@ -0,0 +1,86 @@
+import csv
+import os
+
+import pytest
+
+from benchmark_pipeline import SYNTHETIC_GROUP, generate_synthetic_dataset
+from compare_taxonomies import compare_taxonomies
+from filter_neonhq_accepted import select_neonhq_accepted
+from generate_biorepo_taxonomy import generate_second_taxonomies
+from taxonomy_store import TaxonomyStore
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    # About 300 species, with synonyms, SP/SPP forms, unmapped records and disagreeing lineages
+    return generate_synthetic_dataset(str(tmp_path_factory.mktemp('dataset')), scale=0.01, seed=3)
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def run_csv_pipeline(dataset, output_dir, resolve_synonyms):
+    """Steps 02-04 through the CSV scripts; returns the accepted NEON HQ and Biorepo paths."""
+    accepted_dir = os.path.join(output_dir, 'accepted')
+    neonhq_path = os.path.join(accepted_dir, f"{SYNTHETIC_GROUP}.neonhq.accepted.csv")
+    biorepo_path = os.path.join(accepted_dir, f"{SYNTHETIC_GROUP}.biorepo.accepted.csv")
+    generate_second_taxonomies([SYNTHETIC_GROUP], dataset['neonhq'], dataset['biorepo_neon_taxonomy'],
+                               dataset['biorepo_taxa'], dataset['biorepo_enum_tree'], dataset['biorepo_taxon_units'],
+                               biorepo_path, taxstatus_path=dataset['biorepo_taxstatus'],
+                               resolve_synonyms=resolve_synonyms)
+    select_neonhq_accepted(dataset['neonhq'], neonhq_path, resolve_synonyms=resolve_synonyms)
+    compare_taxonomies(SYNTHETIC_GROUP, neonhq_path, biorepo_path,
+                       os.path.join(output_dir, 'comparison', f"{SYNTHETIC_GROUP}.comparison.txt"), edge_format='both')
+    return neonhq_path, biorepo_path
+
+
+def run_store_pipeline(dataset, output_dir, resolve_synonyms, csv_paths):
+    """Steps 02-04 through the taxonomy store, with the reports naming the CSV pipeline's files."""
+    accepted_dir = os.path.join(output_dir, 'accepted')
+    with TaxonomyStore(os.path.join(output_dir, 'taxonomy.sqlite')) as store:
+        store.ingest_reference_tables(dataset['biorepo_neon_taxonomy'], dataset['biorepo_taxa'],
+                                      dataset['biorepo_enum_tree'], dataset['biorepo_taxon_units'],
+                                      dataset['biorepo_taxstatus'])
+        store.ingest_neonhq(SYNTHETIC_GROUP, dataset['neonhq'])
+        store.build_biorepo_accepted(SYNTHETIC_GROUP, store.accepted_tids(resolve_synonyms))
+        store.build_neonhq_accepted(SYNTHETIC_GROUP, resolve_synonyms)
+        for source in ('neonhq', 'biorepo'):
+            store.export_accepted(source, SYNTHETIC_GROUP,
+                                  os.path.join(accepted_dir, f"{SYNTHETIC_GROUP}.{source}.accepted.csv"))
+        compare_taxonomies(SYNTHETIC_GROUP, *csv_paths,
+                           os.path.join(output_dir, 'comparison', f"{SYNTHETIC_GROUP}.comparison.txt"),
+                           edge_format='both', edge_loader=store.load_lineage_edges)
+
+
+@pytest.mark.parametrize('resolve_synonyms', [False, True])
+def test_store_matches_csv_pipeline_byte_for_byte(dataset, tmp_path, resolve_synonyms):
+    csv_dir, store_dir = str(tmp_path / 'csv'), str(tmp_path / 'store')
+    csv_paths = run_csv_pipeline(dataset, csv_dir, resolve_synonyms)
+    run_store_pipeline(dataset, store_dir, resolve_synonyms, csv_paths)
+
+    for subdir in ('accepted', 'comparison'):
+        csv_files = sorted(os.listdir(os.path.join(csv_dir, subdir)))
+        assert csv_files == sorted(os.listdir(os.path.join(store_dir, subdir)))
+        for name in csv_files:
+            assert read_bytes(os.path.join(store_dir, subdir, name)) == read_bytes(os.path.join(csv_dir, subdir, name)), name
+    # The fixture exercises both filters: some taxa were dropped and some edges differ
+    assert read_bytes(csv_paths[0]).count(b'\n') < read_bytes(dataset['neonhq']).count(b'\n')
+    assert os.path.getsize(os.path.join(csv_dir, 'comparison', f"{SYNTHETIC_GROUP}.comparison_unique_to_biorepo_edges.txt"))
+    # Records mapped to outdated Biorepo names are only kept as stand-ins for their accepted taxon
+    with open(dataset['biorepo_neon_taxonomy'], encoding='utf-8', newline='') as f:
+        prior_tids = {row['taxonCode']: row['tid'] for row in csv.DictReader(f) if ' prior' in row['verbatimScientificName']}
+    with open(csv_paths[1], encoding='utf-8', newline='') as f:
+        stand_ins = [row for row in csv.DictReader(f) if row['neon_taxonID'] in prior_tids]
+    assert prior_tids and bool(stand_ins) == resolve_synonyms
+    for row in stand_ins:
+        assert row['biorepo_tid'] != prior_tids[row['neon_taxonID']]
+        assert ' epithet' in row['scientificName_biorepo'] and row['biorepo_species'] == row['scientificName_biorepo']
+
+
+def test_rebuilding_from_unchanged_files_skips_ingest(dataset, tmp_path):
+    with TaxonomyStore(str(tmp_path / 'taxonomy.sqlite')) as store:
+        assert store.ingest_neonhq(SYNTHETIC_GROUP, dataset['neonhq'])
+        assert not store.ingest_neonhq(SYNTHETIC_GROUP, dataset['neonhq'])
+        assert store.ingest_neonhq(SYNTHETIC_GROUP, dataset['neonhq'], force=True)